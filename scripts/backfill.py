@@ -0,0 +1,169 @@
+"""
+Checkpointed backfill of archived scans' detail artifacts (main.py --regenerate).
+
+Every archived scan whose last_scan_time falls in the requested window is re-rendered
+(charts, report.json, details.html) in a pool of worker processes. Each finished scan is
+recorded in archive.db's backfill_checkpoints with the fingerprint of its inputs as soon as
+it finishes (SIGTERM is turned into a normal exit, so the pool is shut down as well), so a
+backfill that is interrupted and started again skips what is already done; --restart
+drops the window's checkpoints first. Throughput is logged in scans/sec while it runs.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+import db
+import migrations
+from render_pool import RENDER_WORKERS, warm_up
+from reports_module import Reports, scan_fingerprint
+
+# Seconds between progress / throughput log lines.
+PROGRESS_INTERVAL = 10.0
+# Scans queued per worker at a time, so memory stays bounded however large the window is.
+QUEUE_PER_WORKER = 4
+
+_worker_reports = None
+_worker_timeline = {}
+
+
+def init_worker(paths, debug):
+    """Worker initializer: one Reports instance and the check-host timelines, reused for every scan."""
+    global _worker_reports, _worker_timeline
+    warm_up()
+    _worker_reports = Reports(**paths, debug=debug)
+    _worker_reports.regenerate_mode = True
+    _worker_timeline = _worker_reports.fetch_timeline_by_host()
+
+
+def backfill_scan(scan):
+    """Regenerate one archived scan's details; returns (scan id, fingerprint, seconds, error or None)."""
+    started = time.perf_counter()
+    fingerprint = scan_fingerprint(scan, None)
+    try:
+        before = _worker_reports.regenerated
+        _worker_reports.store_completed_scan_details(scan, _worker_timeline.get(scan[3]), fingerprint, export=False)
+        _worker_reports.flush_updates()
+        error = None if _worker_reports.regenerated > before else "details were not written"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return scan[0], fingerprint, time.perf_counter() - started, error
+
+
+class Backfill:
+    def __init__(self, reports=None, workers=None, debug=False):
+        """
+        Regenerates archived scans over a date window in parallel, with a checkpoint per scan.
+        `reports` supplies the database / output paths (a default Reports otherwise).
+        """
+        self.debug = debug
+        self.reports = reports if reports else Reports(debug=debug)
+        self.workers = max(1, workers if workers else RENDER_WORKERS)
+
+    def checkpoints(self):
+        """{scan_id: fingerprint} of the scans already backfilled."""
+        return dict(db.query(self.reports.archive_path, "SELECT scan_id, fingerprint FROM backfill_checkpoints"))
+
+    def reset(self, scan_ids):
+        with db.transaction(self.reports.archive_path) as conn:
+            conn.executemany("DELETE FROM backfill_checkpoints WHERE scan_id = ?", [(scan_id,) for scan_id in scan_ids])
+
+    def _record(self, scan_id, fingerprint):
+        # One small WAL commit per finished scan, so an interruption loses only scans still in flight.
+        try:
+            with db.transaction(self.reports.archive_path) as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO backfill_checkpoints (scan_id, fingerprint, completed_at)
+                    VALUES (?, ?, ?)
+                """, (scan_id, fingerprint, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        except Exception as e:
+            logging.error("Failed to record the backfill checkpoint of scan %s: %s", scan_id, e)
+
+    @staticmethod
+    def _terminate(signum, frame):
+        raise SystemExit(128 + signum)
+
+    def _results(self, scans, paths):
+        """Yield backfill_scan results, in-process for one worker, else from a bounded process pool."""
+        if self.workers == 1 or len(scans) == 1:
+            init_worker(paths, self.debug)
+            for scan in scans:
+                yield backfill_scan(scan)
+            return
+        # Spawned, not forked: workers open their own DB connections instead of inheriting ours.
+        pool = ProcessPoolExecutor(max_workers=min(self.workers, len(scans)), initializer=init_worker,
+                                   initargs=(paths, self.debug), mp_context=multiprocessing.get_context("spawn"))
+        try:
+            queue = iter(scans)
+            in_flight = set()
+            while True:
+                for scan in queue:
+                    in_flight.add(pool.submit(backfill_scan, scan))
+                    if len(in_flight) >= self.workers * QUEUE_PER_WORKER:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, since=None, until=None, days=7, restart=False):
+        """
+        Backfill the archived scans in the window (see Reports.fetch_scans_to_regenerate).
+        Returns {"scans", "skipped", "done", "failed", "seconds", "rate"}.
+        """
+        # Migrated here once, rather than by every worker at the same time.
+        migrations.migrate(self.reports.db_path, "data")
+        migrations.migrate(self.reports.archive_path, "data")
+        migrations.migrate(self.reports.checkhost_path, "checkhost")
+        # The backfill's commit_changes force-pushes details_dir, so start from the published details.
+        self.reports.sync_details()
+        scans = [list(row) + [self.reports.calculate_progress(row[1], row[9])]
+                 for row in self.reports.fetch_scans_to_regenerate(days=days, since=since, until=until)]
+        if restart:
+            self.reset([scan[0] for scan in scans])
+        done = self.checkpoints()
+        todo = [scan for scan in scans if done.get(scan[0]) != scan_fingerprint(scan, None)]
+        stats = {"scans": len(scans), "skipped": len(scans) - len(todo), "done": 0, "failed": 0}
+        logging.info("Backfill: %d archived scans in window, %d already checkpointed, %d to regenerate on %d workers.",
+                     len(scans), stats["skipped"], len(todo), min(self.workers, len(todo)) if todo else 0)
+        # Checkpoint and close our connections, so workers read fully folded database files.
+        for path in (self.reports.db_path, self.reports.archive_path, self.reports.checkhost_path):
+            db.close(path)
+        paths = {"db_path": self.reports.db_path, "archive_path": self.reports.archive_path,
+                 "output_path": self.reports.output_path, "details_dir": self.reports.details_dir,
+                 "checkhost_path": self.reports.checkhost_path}
+        started = time.perf_counter()
+        last_report = started
+        # SIGTERM (e.g. a cancelled CI job) unwinds like Ctrl-C, through the pool shutdown below.
+        # Signal handlers can only be installed from the main thread.
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            previous_handler = signal.signal(signal.SIGTERM, self._terminate)
+        try:
+            for scan_id, fingerprint, elapsed, error in self._results(todo, paths) if todo else ():
+                if error:
+                    stats["failed"] += 1
+                    logging.error("Backfill of scan %s failed after %.2fs: %s", scan_id, elapsed, error)
+                else:
+                    stats["done"] += 1
+                    self._record(scan_id, fingerprint)
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    processed = stats["done"] + stats["failed"]
+                    logging.info("Backfill: %d/%d scans (%.1f scans/sec).", processed, len(todo),
+                                 processed / (now - started))
+        finally:
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+            stats["seconds"] = round(time.perf_counter() - started, 2)
+            processed = stats["done"] + stats["failed"]
+            stats["rate"] = round(processed / stats["seconds"], 2) if stats["seconds"] else 0.0
+            logging.info("Backfill finished: %d regenerated, %d failed, %d skipped in %.2fs (%.2f scans/sec).",
+                         stats["done"], stats["failed"], stats["skipped"], stats["seconds"], stats["rate"])
+        return stats
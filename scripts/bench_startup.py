@@ -0,0 +1,69 @@
+"""
+Import-time benchmark for the monitoring entry points.
+
+Runs each module import in a fresh interpreter with `python -X importtime` and reports
+the cumulative import cost, so regressions in startup time (e.g. a heavy plotting
+import creeping back onto the probe path) show up as numbers.
+
+Usage: python bench_startup.py [--runs N] [--max-ms MS] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["monitoring", "probe_engine", "scheduler", "reports_module"]
+HEAVY_MODULES = ["pandas", "plotly", "matplotlib", "cartopy", "kaleido"]
+
+
+def measure(module, script_dir):
+    """Return (cumulative import time in ms, set of heavy modules pulled in) for one fresh import."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=script_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    total_us = 0
+    heavy = set()
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name == module:
+            total_us = int(cumulative)
+        root = name.strip().split(".")[0]
+        if root in HEAVY_MODULES:
+            heavy.add(root)
+    return total_us / 1000.0, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the check-it entry points.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module.")
+    parser.add_argument("--max-ms", type=float, help="Exit non-zero if `monitoring` imports slower than this.")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+    print(f"{'module':<16} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for module in args.modules:
+        try:
+            samples = [measure(module, script_dir) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<16} {'error':>10}  {e}")
+            continue
+        times = [ms for ms, _ in samples]
+        heavy = sorted(set().union(*(h for _, h in samples)))
+        median = statistics.median(times)
+        print(f"{module:<16} {median:>10.1f} {min(times):>8.1f}  {', '.join(heavy) or '-'}")
+        if args.max_ms is not None and module == "monitoring" and median > args.max_ms:
+            failed = True
+    if failed:
+        print(f"monitoring import exceeded {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
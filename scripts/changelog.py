@@ -0,0 +1,316 @@
+"""
+Append-only change-log export for the monitoring databases.
+
+With CHANGELOG_EXPORT=1 every tracked table gets triggers that record each inserted,
+updated or deleted row in a `_changelog` table. export() writes the rows changed since
+the previous export (only the latest version of each row) as one gzip-compressed NDJSON
+segment under data/changelog/<database>/, so what gets published grows with the volume
+of changes rather than with the size of the .db files. The first export after enabling
+starts with a snapshot of every existing row, so the segments alone describe the database.
+Segments also carry the AUTOINCREMENT counters (sqlite_sequence) that changed, which no
+row records: ids of deleted or archived rows must not be handed out again after a rebuild.
+Segment names start with a sequence number and end with a timestamp and run id, so two
+overlapping runs never write the same file.
+
+Once there are more than COMPACT_SEGMENTS segments or they hold more than COMPACT_BYTES,
+export() writes a snapshot segment (every row and counter, starting with a "reset" entry)
+instead of a delta and removes the older segments, so a rebuild replays a bounded history.
+
+rebuild() recreates a .db file from its segments (schema from migrations.py, then every
+segment replayed in order); main.py (and Monitoring) do this for database files that
+are missing on checkout.
+
+Usage: python changelog.py export|rebuild [--data-dir DIR]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+import db
+import migrations
+
+ENABLED = os.getenv("CHANGELOG_EXPORT", "0") == "1"
+SEGMENT_SUFFIX = ".ndjson.gz"
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+DATABASES = (("data.db", "data"), ("archive.db", "data"), ("checkhost.db", "checkhost"))
+SEQUENCE_TABLE = "sqlite_sequence"
+COMPACT_SEGMENTS = int(os.getenv("CHANGELOG_COMPACT_SEGMENTS", "50"))
+COMPACT_BYTES = int(os.getenv("CHANGELOG_COMPACT_BYTES", str(8 * 1024 * 1024)))
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ChangeLog:
+    def __init__(self, db_path, schema, segments_dir=None, debug=False):
+        """Change capture and segment export/replay for one database (`schema` as in migrations.py)."""
+        self.debug = debug
+        self.db_path = db_path
+        self.schema = schema
+        name = os.path.splitext(os.path.basename(db_path))[0]
+        self.segments_dir = segments_dir if segments_dir else os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), "changelog", name)
+
+    @staticmethod
+    def _tables(conn):
+        """{table: (columns, key columns, blob columns)} for every table that is tracked."""
+        tables = {}
+        for (table,) in conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_changelog%' ESCAPE '\\'
+            ORDER BY name
+        """).fetchall():
+            info = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            columns = [row[1] for row in info]
+            key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]] or ["rowid"]
+            if key == ["rowid"]:
+                columns = ["rowid"] + columns
+            blobs = [row[1] for row in info if (row[2] or "").upper() == "BLOB"]
+            tables[table] = (columns, key, blobs)
+        return tables
+
+    @staticmethod
+    def _row_json(columns, blobs, prefix):
+        # JSON cannot hold BLOBs, so BLOB columns travel hex-encoded.
+        parts = []
+        for column in columns:
+            ref = f"{prefix}{_quote(column)}"
+            value = f"CASE WHEN {ref} IS NULL THEN NULL ELSE hex({ref}) END" if column in blobs else ref
+            parts.append(f"'{column}', {value}")
+        return f"json_object({', '.join(parts)})"
+
+    @staticmethod
+    def _key_json(key, prefix):
+        return f"json_array({', '.join(prefix + _quote(column) for column in key)})"
+
+    def enable(self, snapshot=True):
+        """
+        Install the capture triggers (again after a schema migration). With `snapshot`,
+        a freshly enabled database also queues every existing row for the next export.
+        """
+        with db.transaction(self.db_path) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS _changelog (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tbl TEXT,
+                    op TEXT,
+                    pk TEXT,
+                    row TEXT
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS _changelog_meta (name TEXT PRIMARY KEY, value)")
+            row = conn.execute("SELECT value FROM _changelog_meta WHERE name = 'schema_version'").fetchone()
+            if row and row[0] == version:
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            for table, (columns, key, blobs) in self._tables(conn).items():
+                qtable = _quote(table)
+                for event, ref in (("INSERT", "NEW."), ("UPDATE", "NEW."), ("DELETE", "OLD.")):
+                    trigger = _quote(f"_changelog_{table}_{event.lower()}")
+                    op, row_json = ("delete", "NULL") if event == "DELETE" else \
+                        ("upsert", self._row_json(columns, blobs, ref))
+                    conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                    conn.execute(f"""
+                        CREATE TRIGGER {trigger} AFTER {event} ON {qtable} BEGIN
+                            INSERT INTO _changelog (tbl, op, pk, row)
+                            VALUES ('{table}', '{op}', {self._key_json(key, ref)}, {row_json});
+                        END
+                    """)
+                # A new database, or columns added by a migration: queue the full table.
+                if snapshot:
+                    conn.execute(f"""
+                        INSERT INTO _changelog (tbl, op, pk, row)
+                        SELECT '{table}', 'upsert', {self._key_json(key, '')}, {self._row_json(columns, blobs, '')}
+                        FROM {qtable}
+                    """)
+            conn.execute("INSERT OR REPLACE INTO _changelog_meta (name, value) VALUES ('schema_version', ?)",
+                         (version,))
+        logging.info("Change capture enabled for %s (schema version %d).", self.db_path, version)
+
+    @staticmethod
+    def _sequences(conn):
+        """[(table, seq)] of the AUTOINCREMENT counters of the tracked tables."""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SEQUENCE_TABLE,)).fetchone():
+            return []
+        return conn.execute(f"""
+            SELECT name, seq FROM {SEQUENCE_TABLE}
+            WHERE name NOT LIKE '\\_changelog%' ESCAPE '\\' ORDER BY name
+        """).fetchall()
+
+    @staticmethod
+    def _restore_sequence(conn, table, seq):
+        # Counters only move forward: replaying rows may already have raised it.
+        if not conn.execute(f"UPDATE {SEQUENCE_TABLE} SET seq = MAX(seq, ?) WHERE name = ?", (seq, table)).rowcount:
+            conn.execute(f"INSERT INTO {SEQUENCE_TABLE} (name, seq) VALUES (?, ?)", (table, seq))
+
+    def _segments(self):
+        if not os.path.isdir(self.segments_dir):
+            return []
+        return sorted(name for name in os.listdir(self.segments_dir) if name.endswith(SEGMENT_SUFFIX))
+
+    @staticmethod
+    def _segment_number(name):
+        # "000012-20260101T000000-<run id>.ndjson.gz" (or the older "000012.ndjson.gz")
+        return int(name.split(".")[0].split("-")[0])
+
+    def _segment_path(self, number):
+        run_id = os.getenv("GITHUB_RUN_ID") or uuid.uuid4().hex[:8]
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        return os.path.join(self.segments_dir, f"{number:06d}-{stamp}-{run_id}{SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def _write_segment(path, entries):
+        """Write entries (dicts) as one gzip NDJSON segment, atomically."""
+        # mtime=0 keeps the compressed bytes a pure function of the content.
+        with open(path + ".tmp", "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            for entry in entries:
+                f.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _sequence_entry(name, seq):
+        return {"table": SEQUENCE_TABLE, "op": "upsert", "key": [name], "row": {"name": name, "seq": seq}}
+
+    def _changes(self, conn, high, counter):
+        """Entries for the rows changed up to `high` and the counters that moved since the last export."""
+        # Only the latest change per row is kept (MAX() picks the bare columns' row).
+        for seq, table, op, pk, row in conn.execute("""
+            SELECT MAX(seq), tbl, op, pk, row FROM _changelog
+            WHERE seq <= ? GROUP BY tbl, pk ORDER BY 1
+        """, (high,)):
+            entry = {"table": table, "op": op, "key": json.loads(pk)}
+            if row is not None:
+                entry["row"] = json.loads(row)
+            counter[0] += 1
+            yield entry
+        row = conn.execute("SELECT value FROM _changelog_meta WHERE name = 'sequences'").fetchone()
+        exported = json.loads(row[0]) if row else {}
+        for name, seq in self._sequences(conn):
+            if exported.get(name) != seq:
+                yield self._sequence_entry(name, seq)
+
+    def _snapshot(self, conn, counter):
+        """Entries that recreate the whole database: a reset, every row, every counter."""
+        yield {"op": "reset"}
+        for table, (columns, key, blobs) in self._tables(conn).items():
+            for pk, row in conn.execute(f"SELECT {self._key_json(key, '')}, {self._row_json(columns, blobs, '')} "
+                                        f"FROM {_quote(table)}"):
+                counter[0] += 1
+                yield {"table": table, "op": "upsert", "key": json.loads(pk), "row": json.loads(row)}
+        for name, seq in self._sequences(conn):
+            yield self._sequence_entry(name, seq)
+
+    def _compaction_due(self, segments):
+        if len(segments) + 1 > COMPACT_SEGMENTS:
+            return True
+        return sum(os.path.getsize(os.path.join(self.segments_dir, name)) for name in segments) > COMPACT_BYTES
+
+    def export(self):
+        """
+        Write the rows changed since the last export as the next segment and clear them
+        from `_changelog`; past the compaction limits the segment is a full snapshot and the
+        older segments are removed. Returns (segment path, number of rows) or (None, 0) when
+        nothing changed.
+        """
+        with db.transaction(self.db_path) as conn:
+            high = conn.execute("SELECT MAX(seq) FROM _changelog").fetchone()[0]
+            if high is None:
+                return None, 0
+            segments = self._segments()
+            number = self._segment_number(segments[-1]) + 1 if segments else 1
+            os.makedirs(self.segments_dir, exist_ok=True)
+            path = self._segment_path(number)
+            compact = self._compaction_due(segments)
+            counter = [0]
+            self._write_segment(path, self._snapshot(conn, counter) if compact else self._changes(conn, high, counter))
+            conn.execute("DELETE FROM _changelog WHERE seq <= ?", (high,))
+            conn.execute("INSERT OR REPLACE INTO _changelog_meta (name, value) VALUES ('sequences', ?)",
+                         (json.dumps(dict(self._sequences(conn))),))
+        if compact:
+            for name in segments:
+                os.remove(os.path.join(self.segments_dir, name))
+            logging.info("Compacted %d change-log segments of %s into snapshot %s (%d rows, %d bytes).",
+                         len(segments), self.db_path, path, counter[0], os.path.getsize(path))
+        else:
+            logging.info("Exported %d changed rows of %s to %s (%d bytes).",
+                         counter[0], self.db_path, path, os.path.getsize(path))
+        return path, counter[0]
+
+    def rebuild(self):
+        """Recreate the database file from its segments. Returns the number of segments replayed."""
+        segments = self._segments()
+        tmp_path = self.db_path + ".rebuild"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        migrations.forget(tmp_path)
+        migrations.migrate(tmp_path, self.schema)
+        with db.transaction(tmp_path) as conn:
+            tables = self._tables(conn)
+            for name in segments:
+                with gzip.open(os.path.join(self.segments_dir, name), "rt", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        if entry["op"] == "reset":
+                            # A snapshot follows: it replaces whatever earlier segments built.
+                            for table in tables:
+                                conn.execute(f"DELETE FROM {_quote(table)}")
+                            continue
+                        if entry["table"] == SEQUENCE_TABLE:
+                            if entry["row"]["name"] in tables:
+                                self._restore_sequence(conn, entry["row"]["name"], entry["row"]["seq"])
+                            continue
+                        if entry["table"] not in tables:
+                            continue
+                        columns, key, blobs = tables[entry["table"]]
+                        qtable = _quote(entry["table"])
+                        if entry["op"] == "delete":
+                            where = " AND ".join(f"{_quote(column)} = ?" for column in key)
+                            conn.execute(f"DELETE FROM {qtable} WHERE {where}", entry["key"])
+                            continue
+                        row = {column: value for column, value in entry["row"].items() if column in columns}
+                        for column in blobs:
+                            if row.get(column) is not None:
+                                row[column] = bytes.fromhex(row[column])
+                        conn.execute(f"INSERT OR REPLACE INTO {qtable} ({', '.join(map(_quote, row))}) "
+                                     f"VALUES ({', '.join('?' for _ in row)})", list(row.values()))
+        db.close(tmp_path)
+        db.close(self.db_path)
+        os.replace(tmp_path, self.db_path)
+        migrations.forget(self.db_path)
+        # The segments already describe the rebuilt rows; capture only what changes from here on.
+        self.enable(snapshot=False)
+        logging.info("Rebuilt %s from %d change-log segments.", self.db_path, len(segments))
+        return len(segments)
+
+
+def restore_missing(paths):
+    """Rebuild every (db_path, schema) whose file is missing but has change-log segments."""
+    for db_path, schema in paths:
+        changelog = ChangeLog(db_path, schema)
+        if not os.path.exists(db_path) and changelog._segments():
+            changelog.rebuild()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or replay change-log segments of the monitoring databases.")
+    parser.add_argument("command", choices=["export", "rebuild"])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    for name, schema in DATABASES:
+        changelog = ChangeLog(os.path.join(args.data_dir, name), schema)
+        if args.command == "export":
+            migrations.migrate(changelog.db_path, schema)
+            changelog.enable()
+            changelog.export()
+        else:
+            changelog.rebuild()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,208 @@
 # charts_module.py
-# Version 1.0
-import plotly.graph_objects as go
+# Version 1.1
+#
+# Two backends per chart type:
+#   "svg"    - pure-Python SVG written directly (no Plotly/Kaleido; microseconds per chart)
+#   "plotly" - Plotly figures exported to PNG through Kaleido
+# The backend is chosen per chart type with CHART_BACKEND_PIE / CHART_BACKEND_TIMELINE /
+# CHART_BACKEND_SPARKLINE; the output file extension follows the backend (see chart_filename).
+# "plotly" stays the default so the published .png artifact names do not change; set a
+# variable to "svg" to opt in (the details pages then link the .svg file instead).
+import logging
+import math
+import os
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+CHART_BACKENDS = {chart: os.getenv(f"CHART_BACKEND_{chart.upper()}", "plotly").lower()
+                  for chart in ("pie", "timeline", "sparkline")}
+CHART_STEMS = {"pie": "pie_chart", "timeline": "timeline", "sparkline": "sparkline"}
+STATUS_COLORS = {"Up": "#2ca02c", "Down": "#d62728"}
+OTHER_COLOR = "#7f7f7f"
+FONT = "font-family='Consolas,Monaco,monospace'"
+
+
+def chart_filename(chart):
+    """File name of a chart in a details directory for the configured backend, e.g. 'pie_chart.svg'."""
+    return f"{CHART_STEMS[chart]}.{'svg' if CHART_BACKENDS[chart] == 'svg' else 'png'}"
+
+
+def _num(value):
+    # Compact coordinates: at most one decimal, no trailing zeros.
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _write_svg(output_path, width, height, body):
+    svg = (f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' height='{height}' "
+           f"viewBox='0 0 {width} {height}'>{''.join(body)}</svg>")
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(svg)
+
+
+def pie_chart_svg(up_percentage, down_percentage, output_path, size=320):
+    """Two-slice donut chart (Up/Down) as SVG."""
+    center = size / 2
+    radius = size / 2 - 40
+    hole = radius * 0.3
+    total = (up_percentage or 0) + (down_percentage or 0)
+    body = []
+    if total <= 0:
+        body.append(f"<text x='{_num(center)}' y='{_num(center)}' text-anchor='middle' {FONT}>No data</text>")
+        _write_svg(output_path, size, size, body)
+        return
+    angle = -math.pi / 2
+    for label, value in (("Up", up_percentage or 0), ("Down", down_percentage or 0)):
+        if value <= 0:
+            continue
+        share = value / total
+        color = STATUS_COLORS[label]
+        if share >= 1:
+            body.append(f"<circle cx='{_num(center)}' cy='{_num(center)}' r='{_num((radius + hole) / 2)}' "
+                        f"fill='none' stroke='{color}' stroke-width='{_num(radius - hole)}'/>")
+            mid = angle + math.pi
+        else:
+            end = angle + share * 2 * math.pi
+            large = 1 if share > 0.5 else 0
+            points = [(center + r * math.cos(a), center + r * math.sin(a))
+                      for r, a in ((radius, angle), (radius, end), (hole, end), (hole, angle))]
+            (x1, y1), (x2, y2), (x3, y3), (x4, y4) = points
+            body.append(f"<path d='M{_num(x1)} {_num(y1)}A{_num(radius)} {_num(radius)} 0 {large} 1 {_num(x2)} {_num(y2)}"
+                        f"L{_num(x3)} {_num(y3)}A{_num(hole)} {_num(hole)} 0 {large} 0 {_num(x4)} {_num(y4)}Z' "
+                        f"fill='{color}'/>")
+            mid = (angle + end) / 2
+            angle = end
+        label_radius = (radius + hole) / 2
+        body.append(f"<text x='{_num(center + label_radius * math.cos(mid))}' y='{_num(center + label_radius * math.sin(mid))}' "
+                    f"text-anchor='middle' dominant-baseline='middle' fill='#fff' font-size='13' {FONT}>"
+                    f"{label} {_num(share * 100)}%</text>")
+    _write_svg(output_path, size, size, body)
+
+
+def timeline_svg(timeline_data, output_path, width=800):
+    """Gantt-style timeline (one row per host, one bar per segment coloured by status) as SVG."""
+    if isinstance(timeline_data, dict):
+        timeline_data = [timeline_data]
+    segments = [s for s in (timeline_data or []) if s.get("start") is not None and s.get("end") is not None]
+    row_height, left, top, bottom = 26, 160, 10, 40
+    if not segments:
+        _write_svg(output_path, width, 60, [f"<text x='{width // 2}' y='34' text-anchor='middle' {FONT}>No data</text>"])
+        return
+    hosts = list(dict.fromkeys(s.get("host", "") for s in segments))
+    start = min(s["start"] for s in segments)
+    end = max(s["end"] for s in segments)
+    span = max(end - start, 1)
+    plot_width = width - left - 20
+    height = top + row_height * len(hosts) + bottom
+
+    def x_of(ms):
+        return left + (ms - start) / span * plot_width
+
+    body = []
+    for row, host in enumerate(hosts):
+        y = top + row * row_height
+        body.append(f"<text x='{left - 8}' y='{_num(y + row_height / 2)}' text-anchor='end' dominant-baseline='middle' "
+                    f"font-size='12' {FONT}>{escape(str(host))}</text>")
+    for s in segments:
+        y = top + hosts.index(s.get("host", "")) * row_height + 4
+        x = x_of(s["start"])
+        body.append(f"<rect x='{_num(x)}' y='{y}' width='{_num(max(x_of(s['end']) - x, 1))}' height='{row_height - 8}' "
+                    f"fill='{STATUS_COLORS.get(s.get('status'), OTHER_COLOR)}'/>")
+    axis_y = top + row_height * len(hosts)
+    body.append(f"<line x1='{left}' y1='{axis_y}' x2='{left + plot_width}' y2='{axis_y}' stroke='#999'/>")
+    for i in range(5):
+        ms = start + span * i / 4
+        label = datetime.fromtimestamp(ms / 1000).strftime("%m-%d %H:%M")
+        body.append(f"<text x='{_num(x_of(ms))}' y='{axis_y + 16}' text-anchor='middle' font-size='11' {FONT}>{label}</text>")
+    legend_x = left
+    for status, color in STATUS_COLORS.items():
+        body.append(f"<rect x='{legend_x}' y='{axis_y + 24}' width='10' height='10' fill='{color}'/>"
+                    f"<text x='{legend_x + 14}' y='{axis_y + 33}' font-size='11' {FONT}>{status}</text>")
+        legend_x += 60
+    _write_svg(output_path, width, height, body)
+
+
+def sparkline_svg(values, output_path, width=160, height=32, color="#2ca02c"):
+    """Minimal line chart of a numeric series (None values are skipped) as SVG."""
+    points = [(i, v) for i, v in enumerate(values or []) if v is not None]
+    if not points:
+        _write_svg(output_path, width, height, [])
+        return
+    low = min(v for _, v in points)
+    high = max(v for _, v in points)
+    spread = (high - low) or 1
+    step = (width - 4) / max(len(values) - 1, 1)
+    coords = " ".join(f"{_num(2 + i * step)},{_num(height - 2 - (v - low) / spread * (height - 4))}" for i, v in points)
+    _write_svg(output_path, width, height,
+               [f"<polyline points='{coords}' fill='none' stroke='{color}' stroke-width='1.5'/>"])
+
+
+def generate_pie_chart(up_percentage, down_percentage, output_path):
+    """Pie chart through the backend matching the file extension (.svg or Plotly PNG)."""
+    if output_path.endswith(".svg"):
+        pie_chart_svg(up_percentage, down_percentage, output_path)
+    else:
+        generate_pie_chart_plotly(up_percentage, down_percentage, output_path)
+
+
+def generate_timeline(timeline_data, output_path):
+    """Timeline chart through the backend matching the file extension (.svg or Plotly PNG)."""
+    if output_path.endswith(".svg"):
+        timeline_svg(timeline_data, output_path)
+    else:
+        generate_timeline_plotly(timeline_data, output_path)
+    logging.info("Timeline chart generated at %s", output_path)
+
+
+def generate_sparkline(values, output_path):
+    """Sparkline through the backend matching the file extension (.svg or Plotly PNG)."""
+    if output_path.endswith(".svg"):
+        sparkline_svg(values, output_path)
+    else:
+        import plotly.graph_objects as go
+        fig = go.Figure(go.Scatter(y=values, mode="lines", line={"color": "#2ca02c"}))
+        fig.update_layout(width=160, height=32, margin={"l": 0, "r": 0, "t": 0, "b": 0},
+                          xaxis={"visible": False}, yaxis={"visible": False}, showlegend=False)
+        fig.write_image(output_path)
+
+
+def generate_timeline_plotly(timeline_data, output_path):
+    """Generate a timeline chart PNG with Plotly from timeline segments (a dict or a list of dicts, or None)."""
+    import pandas as pd
+    import plotly.express as px
+    if not timeline_data:
+        df = pd.DataFrame([], columns=["host", "status", "start", "end"])
+    else:
+        if isinstance(timeline_data, dict):
+            timeline_data = [timeline_data]
+        df = pd.DataFrame(timeline_data)
+        df['start'] = pd.to_datetime(df['start'], unit='ms')
+        df['end'] = pd.to_datetime(df['end'], unit='ms')
+    fig = px.timeline(df, x_start="start", x_end="end", y="host", color="status")
+    fig.update_yaxes(autorange="reversed")
+    fig.write_image(output_path)
+
 
 def generate_pie_chart_plotly(up_percentage, down_percentage, output_path):
     """
     Generate and save a pie chart image using Plotly.
-    
+
     Args:
         up_percentage (float): Percentage of 'Up' status.
         down_percentage (float): Percentage of 'Down' status.
         output_path (str): File path where the PNG image will be saved.
-    
+
     Note:
         Requires installation of Plotly and Kaleido.
         Install via: pip install plotly kaleido
     """
+    import plotly.graph_objects as go
     labels = ['Up', 'Down']
     values = [up_percentage, down_percentage]
     fig = go.Figure(
         data=[go.Pie(labels=labels, values=values, hole=0.3, textinfo='label+percent')]
     )
     fig.write_image(output_path)
-    print(f"Pie chart image saved at: {output_path}")
+    logging.info("Pie chart image saved at %s", output_path)
 
 if __name__ == "__main__":
     # Example usage: Generate a pie chart with 70% Up and 30% Down.
@@ -1,17 +1,182 @@
-import sqlite3
 import os
 import json
 import logging
+import threading
+import time
+import zlib
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+import db
+import migrations
+import nodes
 
 # Define the default path for the checkhost database
 CHECKHOST_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "checkhost.db")
+# check-host.net API root (CHECKHOST_API)
+CHECKHOST_API = os.getenv("CHECKHOST_API", "https://check-host.net")
+# Batch pipeline settings: parallel API calls, total polling deadline and poll backoff (seconds)
+BATCH_CONCURRENCY = int(os.getenv("CHECKHOST_CONCURRENCY", "8"))
+POLL_DEADLINE = float(os.getenv("CHECKHOST_POLL_DEADLINE", "60"))
+POLL_INITIAL_DELAY = 2.0
+POLL_MAX_DELAY = 10.0
+# Client-side rate limit for API calls: sustained requests/second (0 = unlimited) and burst size
+RATE_LIMIT = float(os.getenv("CHECKHOST_RATE", "5"))
+RATE_BURST = int(os.getenv("CHECKHOST_BURST", "10"))
+# Retries with exponential backoff on throttling and server errors (honours Retry-After)
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Storage mode for API payloads: "raw" keeps the full JSON text in scan_results.response,
+# "normalized" writes one scan_nodes row per node plus (optionally) a zlib-compressed raw blob.
+STORAGE_MODE = os.getenv("CHECKHOST_STORAGE", "raw")
+KEEP_RAW_BLOB = os.getenv("CHECKHOST_KEEP_RAW", "1") == "1"
+NODE_SUFFIX = nodes.NODE_SUFFIX
+
+
+def pack_response(data):
+    """Compress an API payload for scan_results.response_blob."""
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def unpack_response(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def normalize_result(result):
+    """
+    Flatten a check-http result payload into (node, ok, latency, status_code, address) rows.
+    Node names are stored without the common ".node.check-host.net" suffix; nodes that have
+    not answered get ok = NULL.
+    """
+    rows = []
+    for node, values in (result or {}).items():
+        short = node[:-len(NODE_SUFFIX)] if node.endswith(NODE_SUFFIX) else node
+        entry = values[0] if isinstance(values, list) and values and isinstance(values[0], list) else None
+        if entry is None:
+            rows.append((short, None if values is None else 0, None, None, None))
+            continue
+        latency = entry[1] if len(entry) > 1 and isinstance(entry[1], (int, float)) else None
+        status = entry[3] if len(entry) > 3 else None
+        address = entry[4] if len(entry) > 4 else None
+        try:
+            status = int(status) if status is not None else None
+        except (TypeError, ValueError):
+            status = None
+        rows.append((short, 1 if entry[0] == 1 else 0, latency, status, address))
+    return rows
+
+
+def node_country(node, node_countries=None):
+    """Country code for a node: from the initiate response when known, else from the node index."""
+    if node_countries:
+        code = node_countries.get(node) or node_countries.get(node + NODE_SUFFIX)
+        if code:
+            return code.lower()
+    return nodes.get_index().node_country(node)
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def compute_node_stats(rows, node_countries=None):
+    """
+    Per-scan aggregates from normalized node rows in a single pass:
+    latency min/median/p95/max over answering nodes, HTTP status counts and the
+    up ratio per node country.
+    """
+    latencies = []
+    status_counts = {}
+    per_country = {}
+    for node, ok, latency, status, _ in rows:
+        if ok == 1 and latency is not None:
+            latencies.append(latency)
+        if status is not None:
+            status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+        country = node_country(node, node_countries)
+        if country:
+            up, total = per_country.get(country, (0, 0))
+            per_country[country] = (up + (ok == 1), total + 1)
+    latencies.sort()
+    return {
+        "latency_min": latencies[0] if latencies else None,
+        "latency_median": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_max": latencies[-1] if latencies else None,
+        "status_counts": status_counts,
+        "country_up_ratio": {cc: round(up / total, 3) for cc, (up, total) in sorted(per_country.items())},
+    }
+
+
+def denormalize_result(rows):
+    """Rebuild a check-http style payload from scan_nodes rows (used by exports)."""
+    result = {}
+    for node, ok, latency, status, address in rows:
+        full = node if "." in node else node + NODE_SUFFIX
+        if ok is None:
+            result[full] = None
+        else:
+            result[full] = [[ok, latency, None, str(status) if status is not None else None, address]]
+    return result
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`
+        (at least 1). A rate <= 0 disables the limit (CHECKHOST_RATE=0).
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available. Returns the number of seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
 
 class CheckHostClient:
-    def __init__(self, db_path=None, debug=False):
+    def __init__(self, db_path=None, api_base=None, storage_mode=None, debug=False):
         self.debug = debug
+        self.storage_mode = storage_mode if storage_mode else STORAGE_MODE
         self.db_path = db_path if db_path else CHECKHOST_DB_PATH
+        self.api_base = (api_base if api_base else CHECKHOST_API).rstrip("/")
+        # Nodes each initiated scan was dispatched to, keyed by local_scan_id: {node: country code}
+        # (from the initiate response)
+        self.scan_nodes = {}
+        # One pooled keep-alive session for every API call, with retry/backoff on 429/5xx.
+        retry = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=["GET"], respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(BATCH_CONCURRENCY, 1), max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json"})
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+        self.stats = {"requests": 0, "errors": 0, "retries": 0, "throttled": 0,
+                      "throttle_wait_s": 0.0, "latency_total_s": 0.0, "latency_max_s": 0.0}
+        self._stats_lock = threading.Lock()
         
         # If checkhost.db does not exist, log that we are creating one.
         if not os.path.exists(self.db_path):
@@ -19,100 +184,221 @@ class CheckHostClient:
         self._init_db()
 
     def _init_db(self):
-        """Initialize the checkhost.db and create necessary tables if they do not exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Create scan_meta table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scan_meta (
-                local_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                domain TEXT,
-                checkhost_id TEXT,
-                first_scan DATETIME,
-                last_scan DATETIME,
-                summary_up INTEGER DEFAULT 0,
-                summary_down INTEGER DEFAULT 0
-            )
-        """)
-        # Create scan_results table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scan_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                local_scan_id INTEGER,
-                call_type TEXT,
-                response TEXT,
-                timestamp DATETIME,
-                FOREIGN KEY(local_scan_id) REFERENCES scan_meta(local_id)
-            )
-        """)
-        conn.commit()
-        conn.close()
+        """Create or upgrade the checkhost.db schema (see migrations.py)."""
+        migrations.migrate(self.db_path, "checkhost")
+
+    def _response_columns(self, data):
+        """(response, response_blob) values for a scan_results row in the current storage mode."""
+        if self.storage_mode != "normalized":
+            return json.dumps(data), None
+        return None, pack_response(data) if KEEP_RAW_BLOB else None
 
     def initiate_scan(self, host):
         """Initiate a scan via check-host.net API and store meta data."""
-        url = f"https://check-host.net/check-http?host={host}"
-        headers = {"Accept": "application/json"}
+        data = self.request_scan(host)
+        if data is None:
+            return None
+        return self.store_initiated([(host, data)]).get(host)
+
+    def request_scan(self, host):
+        """Submit a check-http request for `host`. Returns the API response or None (nothing is stored)."""
+        # Hosts are submitted even when they fail to resolve locally: check-host resolves the
+        # name on its own nodes, which tells a local resolver problem apart from an outage.
+        url = f"{self.api_base}/check-http?host={host}"
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            data = response.json()
-            checkhost_id = data.get("request_id")
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            if checkhost_id:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO scan_meta (domain, checkhost_id, first_scan, last_scan)
-                    VALUES (?, ?, ?, ?)
-                """, (host, checkhost_id, now, now))
-                local_scan_id = cursor.lastrowid
-                cursor.execute("""
-                    INSERT INTO scan_results (local_scan_id, call_type, response, timestamp)
-                    VALUES (?, 'initiate', ?, ?)
-                """, (local_scan_id, json.dumps(data), now))
-                conn.commit()
-                conn.close()
-                logging.info(f"CheckHost: Initiated scan for {host}, checkhost_id: {checkhost_id}, local_scan_id: {local_scan_id}")
-                return local_scan_id
-            else:
+            data = self._get(url)
+            if not data.get("request_id"):
                 logging.error("CheckHost: No request_id returned on initiating scan.")
                 return None
+            return data
         except Exception as e:
             logging.error(f"CheckHost: Error initiating scan for {host}: {e}")
             return None
 
+    def store_initiated(self, responses):
+        """
+        Store scan_meta and 'initiate' rows for a list of (host, response) pairs in one transaction.
+        Returns {host: local_scan_id}.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        local_ids = {}
+        try:
+            with db.transaction(self.db_path) as conn:
+                cursor = conn.cursor()
+                for host, data in responses:
+                    cursor.execute("""
+                        INSERT INTO scan_meta (domain, checkhost_id, first_scan, last_scan)
+                        VALUES (?, ?, ?, ?)
+                    """, (host, data["request_id"], now, now))
+                    local_ids[host] = cursor.lastrowid
+                cursor.executemany("""
+                    INSERT INTO scan_results (local_scan_id, call_type, response, response_blob, timestamp)
+                    VALUES (?, 'initiate', ?, ?, ?)
+                """, [(local_ids[host], *self._response_columns(data), now) for host, data in responses])
+        except Exception as e:
+            logging.error(f"CheckHost: Error storing initiated scans: {e}")
+            return {}
+        index = nodes.get_index()
+        for host, data in responses:
+            local_scan_id = local_ids[host]
+            node_info = data.get("nodes") or {}
+            self.scan_nodes[local_scan_id] = {node: (info[0] if isinstance(info, list) and info else None)
+                                              for node, info in node_info.items()}
+            # Node info is [country code, country name, city, ...]; feed the node/country index.
+            index.learn(self.scan_nodes[local_scan_id])
+            index.learn_names({info[1]: info[0] for info in node_info.values()
+                               if isinstance(info, list) and len(info) > 1 and info[0] and info[1]})
+            logging.info(f"CheckHost: Initiated scan for {host}, checkhost_id: {data['request_id']}, "
+                         f"local_scan_id: {local_scan_id}")
+        return local_ids
+
     def get_scan_result(self, local_scan_id):
         """Fetch scan result using the checkhost_id and store the API response."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT checkhost_id FROM scan_meta WHERE local_id = ?", (local_scan_id,))
-            row = cursor.fetchone()
-            if not row:
+            rows = db.query(self.db_path, "SELECT checkhost_id FROM scan_meta WHERE local_id = ?", (local_scan_id,))
+            if not rows:
                 logging.error(f"CheckHost: No scan_meta record found for local_scan_id {local_scan_id}")
-                conn.close()
                 return None
-            checkhost_id = row[0]
-            conn.close()
-
-            url = f"https://check-host.net/check-result/{checkhost_id}"
-            headers = {"Accept": "application/json"}
-            response = requests.get(url, headers=headers, timeout=10)
-            data = response.json()
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO scan_results (local_scan_id, call_type, response, timestamp)
-                VALUES (?, 'result', ?, ?)
-            """, (local_scan_id, json.dumps(data), now))
-            conn.commit()
-            conn.close()
+            checkhost_id = rows[0][0]
+
+            data = self.fetch_result(checkhost_id)
+            self.store_result(local_scan_id, data)
             logging.info(f"CheckHost: Retrieved scan result for local_scan_id: {local_scan_id}")
             return data
         except Exception as e:
             logging.error(f"CheckHost: Error retrieving scan result for local_scan_id {local_scan_id}: {e}")
             return None
 
+    def fetch_result(self, checkhost_id):
+        """Fetch the current check-result payload for a check-host request id (not stored)."""
+        return self._get(f"{self.api_base}/check-result/{checkhost_id}")
+
+    def _get(self, url):
+        """Rate-limited GET through the pooled session. Returns the decoded JSON body."""
+        waited = self.rate_limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=10)
+        except Exception:
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            raise
+        latency = time.monotonic() - started
+        retries = getattr(response.raw, "retries", None)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["retries"] += len(retries.history) if retries else 0
+            if waited:
+                self.stats["throttled"] += 1
+                self.stats["throttle_wait_s"] += waited
+            self.stats["latency_total_s"] += latency
+            self.stats["latency_max_s"] = max(self.stats["latency_max_s"], latency)
+            if response.status_code >= 400:
+                self.stats["errors"] += 1
+        response.raise_for_status()
+        return response.json()
+
+    def get_stats(self):
+        """Request-latency and throttle counters for this client."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["latency_avg_s"] = stats["latency_total_s"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def store_result(self, local_scan_id, data):
+        """Store a check-result payload in scan_results (and scan_nodes in normalized mode)."""
+        with db.transaction(self.db_path) as conn:
+            self._insert_result(conn, local_scan_id, data)
+
+    def _insert_result(self, conn, local_scan_id, data):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("""
+            INSERT INTO scan_results (local_scan_id, call_type, response, response_blob, timestamp)
+            VALUES (?, 'result', ?, ?, ?)
+        """, (local_scan_id, *self._response_columns(data), now))
+        if self.storage_mode == "normalized":
+            conn.executemany("""
+                INSERT OR REPLACE INTO scan_nodes (local_scan_id, node, ok, latency, status_code, address)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(local_scan_id, *row) for row in normalize_result(data)])
+
+    @staticmethod
+    def is_complete(result, node_ids):
+        """A result is final once every node it was dispatched to has reported (non-null entry)."""
+        if not isinstance(result, dict):
+            return False
+        expected = list(node_ids) if node_ids else list(result.keys())
+        return bool(expected) and all(result.get(node) is not None for node in expected)
+
+    def run_batch(self, hosts, concurrency=None, deadline=None):
+        """
+        Pipelined check-host stage for a whole run.
+        Initiates scans for all hosts up front (at most `concurrency` API calls in flight),
+        then polls check-result for every pending scan with exponential backoff until all
+        nodes have answered or `deadline` seconds have passed. Only the final result of each
+        scan is written to scan_results (on deadline, the last partial result is kept).
+        Returns {host: local_scan_id} for every scan that was initiated.
+        """
+        concurrency = concurrency if concurrency else BATCH_CONCURRENCY
+        hosts = list(dict.fromkeys(hosts))
+        deadline = time.monotonic() + (deadline if deadline is not None else POLL_DEADLINE)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            responses = [(host, data) for host, data in zip(hosts, pool.map(self.request_scan, hosts)) if data]
+            initiated = self.store_initiated(responses)
+            if not initiated:
+                return {}
+
+            pending = {initiated[host]: data["request_id"] for host, data in responses if host in initiated}
+            latest = {}
+
+            def poll(local_id):
+                try:
+                    return local_id, self.fetch_result(pending[local_id])
+                except Exception as e:
+                    logging.warning(f"CheckHost: Polling local_scan_id {local_id} failed: {e}")
+                    return local_id, None
+
+            delay = POLL_INITIAL_DELAY
+            while pending:
+                time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+                complete = []
+                for local_id, data in pool.map(poll, list(pending)):
+                    if data is None:
+                        continue
+                    latest[local_id] = data
+                    if self.is_complete(data, self.scan_nodes.get(local_id)):
+                        complete.append((local_id, data))
+                        del pending[local_id]
+                self._finalize(complete)
+                if time.monotonic() >= deadline:
+                    break
+                delay = min(delay * 2, POLL_MAX_DELAY)
+
+        for local_id in pending:
+            logging.warning(f"CheckHost: Deadline reached for local_scan_id {local_id}; keeping partial result.")
+        self._finalize([(local_id, latest[local_id]) for local_id in pending if local_id in latest])
+        logging.info(f"CheckHost: Batch finished for {len(initiated)} scans ({len(pending)} incomplete at deadline). "
+                     f"API stats: {self.get_stats()}")
+        return initiated
+
+    def _finalize(self, results):
+        """Store final results, summaries and stats for a list of (local_scan_id, data) in one transaction."""
+        if not results:
+            return
+        try:
+            with db.transaction(self.db_path) as conn:
+                for local_scan_id, data in results:
+                    self._insert_result(conn, local_scan_id, data)
+                    if self.storage_mode == "normalized":
+                        up_count, down_count = self._count_nodes(conn, local_scan_id)
+                    else:
+                        up_count, down_count = self.process_result(data)
+                    self._write_summary(conn, local_scan_id, up_count, down_count)
+                    stats = compute_node_stats(normalize_result(data), self.scan_nodes.pop(local_scan_id, None))
+                    self._write_stats(conn, local_scan_id, stats)
+        except Exception as e:
+            logging.error(f"CheckHost: Error storing {len(results)} final results: {e}")
+
     def process_result(self, result):
         """Process the JSON result to count how many nodes are up versus down."""
         up_count = 0
@@ -134,92 +420,161 @@ class CheckHostClient:
                 down_count += 1
         return up_count, down_count
 
+    def process_scan(self, local_scan_id):
+        """Count up/down nodes for a scan straight from its normalized scan_nodes rows."""
+        return self._count_nodes(db.connect(self.db_path), local_scan_id)
+
+    @staticmethod
+    def _count_nodes(conn, local_scan_id):
+        row = conn.execute("""
+            SELECT COALESCE(SUM(ok = 1), 0), COALESCE(SUM(ok IS NOT 1), 0)
+            FROM scan_nodes WHERE local_scan_id = ?
+        """, (local_scan_id,)).fetchone()
+        return row[0], row[1]
+
     def update_summary(self, local_scan_id, up_count, down_count):
         """Update the scan_meta record with the summary of up/down counts."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute("""
-                UPDATE scan_meta
-                SET summary_up = ?, summary_down = ?, last_scan = ?
-                WHERE local_id = ?
-            """, (up_count, down_count, now, local_scan_id))
-            conn.commit()
-            conn.close()
-            logging.info(f"CheckHost: Updated summary for local_scan_id {local_scan_id}: Up={up_count}, Down={down_count}")
+            with db.transaction(self.db_path) as conn:
+                self._write_summary(conn, local_scan_id, up_count, down_count)
         except Exception as e:
             logging.error(f"CheckHost: Error updating summary for local_scan_id {local_scan_id}: {e}")
 
-    def export_and_remove_domain_data(self, domain, output_file):
+    @staticmethod
+    def _write_summary(conn, local_scan_id, up_count, down_count):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("""
+            UPDATE scan_meta
+            SET summary_up = ?, summary_down = ?, last_scan = ?
+            WHERE local_id = ?
+        """, (up_count, down_count, now, local_scan_id))
+        logging.info(f"CheckHost: Updated summary for local_scan_id {local_scan_id}: Up={up_count}, Down={down_count}")
+
+    def update_stats(self, local_scan_id, stats):
+        """Store per-scan latency, status and per-country aggregates on scan_meta."""
+        try:
+            with db.transaction(self.db_path) as conn:
+                self._write_stats(conn, local_scan_id, stats)
+        except Exception as e:
+            logging.error(f"CheckHost: Error updating stats for local_scan_id {local_scan_id}: {e}")
+
+    @staticmethod
+    def _write_stats(conn, local_scan_id, stats):
+        conn.execute("""
+            UPDATE scan_meta
+            SET latency_min = ?, latency_median = ?, latency_p95 = ?, latency_max = ?,
+                status_counts = ?, country_stats = ?
+            WHERE local_id = ?
+        """, (stats["latency_min"], stats["latency_median"], stats["latency_p95"], stats["latency_max"],
+              json.dumps(stats["status_counts"]), json.dumps(stats["country_up_ratio"]), local_scan_id))
+
+    def export_and_remove_domain_data(self, domain, output_file, fmt="json"):
         """
-        Export all check-host data for the given domain to a JSON file,
-        then remove those rows from checkhost.db (both scan_meta and scan_results).
+        Export all check-host data for the given domain to a file,
+        then remove those rows from checkhost.db (scan_meta, scan_results and scan_nodes).
+        Rows are streamed from one ordered JOIN and written one scan at a time, so memory
+        stays flat however much history the domain has. With fmt="ndjson" the file holds a
+        header line followed by one line per scan; otherwise it is a single JSON document.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Gather all local_ids for this domain
-            cursor.execute("SELECT local_id, checkhost_id, first_scan, last_scan, summary_up, summary_down FROM scan_meta WHERE domain = ?", (domain,))
-            rows_meta = cursor.fetchall()
-            if not rows_meta:
-                logging.info("No checkhost data found for domain %s", domain)
-                conn.close()
-                return None
+            with db.transaction(self.db_path) as conn:
+                cursor = conn.cursor()
+                # Pin the export to the scans that exist now; rows added meanwhile are left alone.
+                cursor.execute("SELECT MAX(local_id) FROM scan_meta WHERE domain = ?", (domain,))
+                max_local_id = cursor.fetchone()[0]
+                if max_local_id is None:
+                    logging.info("No checkhost data found for domain %s", domain)
+                    return None
+
+                results_cursor = conn.execute("""
+                    SELECT m.local_id, m.checkhost_id, m.first_scan, m.last_scan, m.summary_up, m.summary_down,
+                           r.call_type, r.response, r.response_blob, r.timestamp
+                    FROM scan_meta m
+                    LEFT JOIN scan_results r ON r.local_scan_id = m.local_id
+                    WHERE m.domain = ? AND m.local_id <= ?
+                    ORDER BY m.local_id, r.id
+                """, (domain, max_local_id))
+                nodes_cursor = conn.execute("""
+                    SELECT n.local_scan_id, n.node, n.ok, n.latency, n.status_code, n.address
+                    FROM scan_nodes n
+                    JOIN scan_meta m ON m.local_id = n.local_scan_id
+                    WHERE m.domain = ? AND m.local_id <= ?
+                    ORDER BY n.local_scan_id, n.node
+                """, (domain, max_local_id))
+                pending_node = next(nodes_cursor, None)
+
+                def node_rows_for(local_scan_id):
+                    # Merge-join the ordered node rows against the ordered scans.
+                    nonlocal pending_node
+                    rows = []
+                    while pending_node is not None and pending_node[0] <= local_scan_id:
+                        if pending_node[0] == local_scan_id:
+                            rows.append(pending_node[1:])
+                        pending_node = next(nodes_cursor, None)
+                    return rows
+
+                def scans():
+                    entry = None
+                    node_rows = []
+                    for row in results_cursor:
+                        local_scan_id, checkhost_id, first_scan, last_scan, summary_up, summary_down = row[:6]
+                        call_type, response_json, response_blob, ts = row[6:]
+                        if entry is None or entry["local_scan_id"] != local_scan_id:
+                            if entry is not None:
+                                yield entry
+                            node_rows = node_rows_for(local_scan_id)
+                            entry = {
+                                "local_scan_id": local_scan_id,
+                                "checkhost_id": checkhost_id,
+                                "first_scan": first_scan,
+                                "last_scan": last_scan,
+                                "summary_up": summary_up,
+                                "summary_down": summary_down,
+                                "scan_results": [],
+                                "nodes": [dict(zip(("node", "ok", "latency", "status_code", "address"), n)) for n in node_rows]
+                            }
+                        if call_type is None:
+                            continue
+                        if response_json is not None:
+                            try:
+                                parsed_response = json.loads(response_json)
+                            except ValueError:
+                                parsed_response = response_json
+                        elif response_blob is not None:
+                            parsed_response = unpack_response(response_blob)
+                        elif call_type == "result":
+                            parsed_response = denormalize_result(node_rows)
+                        else:
+                            parsed_response = None
+                        entry["scan_results"].append({
+                            "call_type": call_type,
+                            "response": parsed_response,
+                            "timestamp": ts
+                        })
+                    if entry is not None:
+                        yield entry
+
+                header = {"domain": domain, "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+                tmp_file = output_file + ".tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    if fmt == "ndjson":
+                        f.write(json.dumps(header) + "\n")
+                        for entry in scans():
+                            f.write(json.dumps(entry) + "\n")
+                    else:
+                        f.write(json.dumps(header)[:-1] + ', "local_ids": [')
+                        for i, entry in enumerate(scans()):
+                            f.write((", " if i else "") + json.dumps(entry))
+                        f.write("]}")
+                os.replace(tmp_file, output_file)
+                logging.info("Exported check-host data for domain %s to %s", domain, output_file)
 
-            domain_export = {
-                "domain": domain,
-                "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "local_ids": []
-            }
-
-            local_ids = [row[0] for row in rows_meta]
-            for row in rows_meta:
-                local_scan_id = row[0]
-                checkhost_id = row[1]
-                first_scan = row[2]
-                last_scan = row[3]
-                summary_up = row[4]
-                summary_down = row[5]
-                
-                # Gather results for this local_id
-                cursor.execute("SELECT call_type, response, timestamp FROM scan_results WHERE local_scan_id = ?", (local_scan_id,))
-                rows_results = cursor.fetchall()
-                results_list = []
-                for r in rows_results:
-                    call_type, response_json, ts = r
-                    try:
-                        parsed_response = json.loads(response_json)
-                    except:
-                        parsed_response = response_json
-                    results_list.append({
-                        "call_type": call_type,
-                        "response": parsed_response,
-                        "timestamp": ts
-                    })
-                    
-                domain_export["local_ids"].append({
-                    "local_scan_id": local_scan_id,
-                    "checkhost_id": checkhost_id,
-                    "first_scan": first_scan,
-                    "last_scan": last_scan,
-                    "summary_up": summary_up,
-                    "summary_down": summary_down,
-                    "scan_results": results_list
-                })
-
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(domain_export, f, indent=4)
-            logging.info("Exported check-host data for domain %s to %s", domain, output_file)
-
-            # Remove rows from scan_results and scan_meta
-            for local_id in local_ids:
-                cursor.execute("DELETE FROM scan_results WHERE local_scan_id = ?", (local_id,))
-                cursor.execute("DELETE FROM scan_meta WHERE local_id = ?", (local_id,))
-            conn.commit()
-            conn.close()
-            return output_file
+                # Remove the exported rows in the same transaction the export read from
+                exported = "SELECT local_id FROM scan_meta WHERE domain = ? AND local_id <= ?"
+                conn.execute(f"DELETE FROM scan_results WHERE local_scan_id IN ({exported})", (domain, max_local_id))
+                conn.execute(f"DELETE FROM scan_nodes WHERE local_scan_id IN ({exported})", (domain, max_local_id))
+                conn.execute("DELETE FROM scan_meta WHERE domain = ? AND local_id <= ?", (domain, max_local_id))
+                return output_file
         except Exception as e:
             logging.error("Failed to export/remove checkhost data for domain %s: %s", domain, e)
             return None
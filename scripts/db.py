@@ -0,0 +1,137 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied to every shared connection. WAL lets readers (reports, the daemon's change
+# watcher) run alongside the probe writer; NORMAL sync is durable enough in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+_connections = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _key(path):
+    return os.path.realpath(path)
+
+
+def connect(path):
+    """
+    Return the shared connection for a database file, opening it on first use.
+    One connection per database per process; callers must not close it (see close_all).
+    """
+    key = _key(path)
+    with _registry_lock:
+        conn = _connections.get(key)
+        if conn is None:
+            conn = sqlite3.connect(key, timeout=30, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            _connections[key] = conn
+            _locks[key] = threading.RLock()
+            logging.debug("Opened shared DB connection for %s", key)
+        return conn
+
+
+@contextmanager
+def transaction(path):
+    """
+    Run a block in one transaction on the shared connection, serialized across threads.
+    Commits on success and rolls back on error.
+    """
+    conn = connect(path)
+    with _locks[_key(path)]:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def attached(path, other_path, alias):
+    """
+    Like transaction(), with `other_path` attached as schema `alias` for the duration,
+    so one statement can read one file and write the other.
+    The two files are not committed atomically: in WAL mode SQLite makes no cross-file
+    guarantee, so after a crash either file may hold its change without the other.
+    Moves between files must be written so that running them again repairs that
+    (see Monitoring._archive_scans).
+    """
+    conn = connect(path)
+    with _locks[_key(path)]:
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (_key(other_path),))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+
+def query(path, sql, params=()):
+    """Fetch all rows for a read-only query on the shared connection."""
+    conn = connect(path)
+    with _locks[_key(path)]:
+        return conn.execute(sql, params).fetchall()
+
+
+def checkpoint(path):
+    """Fold the WAL back into the main database file (before it is read as a plain file)."""
+    key = _key(path)
+    if key not in _connections:
+        return
+    with _locks[key]:
+        conn = _connections[key]
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def close(path):
+    """Checkpoint the WAL back into the main file and close the shared connection."""
+    key = _key(path)
+    with _registry_lock:
+        conn = _connections.pop(key, None)
+        _locks.pop(key, None)
+    if conn is None:
+        return
+    try:
+        conn.commit()
+        # The .db files are committed to git, so fold the WAL back into them.
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.Error as e:
+        logging.warning("WAL checkpoint failed for %s: %s", key, e)
+    conn.close()
+
+
+def close_all():
+    for key in list(_connections):
+        close(key)
+
+
+def _forget_after_fork():
+    # A sqlite handle must not be used across fork(); a forked child drops the parent's
+    # connections (without closing them, which would touch the parent's WAL state) and
+    # opens its own on first use.
+    global _registry_lock
+    _connections.clear()
+    _locks.clear()
+    _registry_lock = threading.Lock()
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
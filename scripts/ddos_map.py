@@ -0,0 +1,199 @@
+"""
+DDoS availability map rendering with on-disk caches.
+
+The cartopy base map (land, ocean, borders, coastlines) depends only on the projection's
+central longitude and the dpi, so each one is rasterized once into MAP_CACHE_DIR and
+reused. Markers, title and legend are composited onto the cached frame with PIL. Finished
+animated GIFs are cached too, keyed by (node-country set, attacked country, frames, dpi,
+interval), so an unchanged map is copied instead of drawn again.
+The cache is least-recently-used: hits refresh a file's mtime, and after each new entry
+the oldest files are removed until the directory fits in MAP_CACHE_MAX_BYTES.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+MAP_CACHE_DIR = os.getenv("MAP_CACHE_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", ".map_cache"))
+MAP_CACHE_MAX_BYTES = int(os.getenv("MAP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# 12x6 inches, like the original figures; a global PlateCarree map is exactly 2:1.
+FIG_SIZE = (12, 6)
+DEFAULT_DPI = 150
+RED = (255, 0, 0, 255)
+BLACK = (0, 0, 0, 255)
+TITLE = "DDOS Availability Map"
+
+
+def _atomic_path(path):
+    # Render workers may build the same cache entry at the same time; write then rename.
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def _touch(path):
+    # Marks a cache hit as recently used; the file may just have been pruned by another worker.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache(keep=None, max_bytes=None):
+    """
+    Remove the least recently used cache files (oldest mtime first) until the cache fits in
+    `max_bytes` (MAP_CACHE_MAX_BYTES by default); `keep` is never removed. Returns the number removed.
+    """
+    max_bytes = MAP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    try:
+        names = os.listdir(MAP_CACHE_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(MAP_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logging.info("Map cache: removed %d least recently used files (%d bytes left).", removed, total)
+    return removed
+
+
+def base_frame_path(central_longitude, dpi=DEFAULT_DPI):
+    return os.path.join(MAP_CACHE_DIR, f"base_{central_longitude:+08.2f}_{dpi}.png")
+
+
+def base_frame(central_longitude=0.0, dpi=DEFAULT_DPI):
+    """The base map for one central longitude as a PIL RGBA image, rendered with cartopy on a cache miss."""
+    from PIL import Image
+    path = base_frame_path(central_longitude, dpi)
+    if not os.path.exists(path):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import cartopy.crs as ccrs
+        import cartopy.feature as cfeature
+        os.makedirs(MAP_CACHE_DIR, exist_ok=True)
+        fig = plt.figure(figsize=FIG_SIZE)
+        # The map fills the whole figure, so lon/lat map linearly onto pixels.
+        ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree(central_longitude=central_longitude))
+        ax.set_global()
+        ax.add_feature(cfeature.LAND, facecolor='lightgray')
+        ax.add_feature(cfeature.OCEAN, facecolor='aliceblue')
+        ax.add_feature(cfeature.BORDERS, linestyle='-', edgecolor='gray')
+        ax.coastlines()
+        tmp_path = _atomic_path(path)
+        fig.savefig(tmp_path, dpi=dpi, format="png")
+        plt.close(fig)
+        os.replace(tmp_path, path)
+        logging.info("Base map rendered for central longitude %.1f at %d dpi", central_longitude, dpi)
+        prune_cache(keep=path)
+    else:
+        _touch(path)
+    with Image.open(path) as image:
+        return image.convert("RGBA")
+
+
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size default font.
+        return ImageFont.load_default()
+
+
+def _project(lat, lon, central_longitude, width, height):
+    x = ((lon - central_longitude + 180.0) % 360.0) / 360.0 * width
+    y = (90.0 - lat) / 180.0 * height
+    return x, y
+
+
+def compose(base, red_coords, black_coords, central_longitude, dpi, title):
+    """Draw markers, title and legend onto a copy of a base frame."""
+    from PIL import ImageDraw
+    image = base.copy()
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    # Marker sizes match the former scatter(s=100) / scatter(s=150) points.
+    red_radius = 5.0 * dpi / 72
+    black_radius = 6.1 * dpi / 72
+    for lat, lon in sorted(red_coords):
+        x, y = _project(lat, lon, central_longitude, width, height)
+        draw.ellipse((x - red_radius, y - red_radius, x + red_radius, y + red_radius), fill=RED)
+    if black_coords:
+        x, y = _project(black_coords[0], black_coords[1], central_longitude, width, height)
+        draw.ellipse((x - black_radius, y - black_radius, x + black_radius, y + black_radius), fill=BLACK)
+    scale = dpi / 72
+    title_font = _font(int(16 * scale))
+    legend_font = _font(int(9 * scale))
+    y = 6 * scale
+    for line in title.split("\n"):
+        text_width = draw.textlength(line, font=title_font)
+        draw.text(((width - text_width) / 2, y), line, fill=BLACK, font=title_font)
+        y += 20 * scale
+    box = int(8 * scale)
+    legend_y = height - int(30 * scale)
+    for color, label in ((BLACK, "Targeted server"), (RED, "Inaccessible locations")):
+        x0 = int(8 * scale)
+        draw.rectangle((x0, legend_y, x0 + box, legend_y + box), fill=color)
+        draw.text((x0 + box + 4 * scale, legend_y - scale), label, fill=BLACK, font=legend_font)
+        legend_y += int(12 * scale)
+    return image
+
+
+def render_static(red_coords, black_coords, output_filename, dpi=DEFAULT_DPI):
+    """Static map (central longitude 0) with the markers, saved to output_filename."""
+    image = compose(base_frame(0.0, dpi), red_coords, black_coords, 0.0, dpi, TITLE)
+    image.convert("RGB").save(output_filename)
+
+
+def gif_cache_key(node_countries, attacked_country, frames, dpi, interval):
+    payload = json.dumps([sorted(node_countries), attacked_country or "", frames, dpi, interval])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def render_animated(node_coords, attacked, output_filename, frames=20, interval=200, dpi=DEFAULT_DPI):
+    """
+    Rotating map GIF. `node_coords` maps node country codes to (lat, lon); `attacked` is
+    (country code, (lat, lon)) or None. Returns True when the GIF came from the cache.
+    """
+    attacked_code, black_coords = attacked if attacked else (None, None)
+    key = gif_cache_key(node_coords, attacked_code, frames, dpi, interval)
+    cached = os.path.join(MAP_CACHE_DIR, f"ddos_{key}.gif")
+    if os.path.exists(cached):
+        _touch(cached)
+        shutil.copyfile(cached, output_filename)
+        logging.debug("DDOS map GIF reused from cache for %s", output_filename)
+        return True
+    red_coords = set(node_coords.values())
+    images = []
+    for frame in range(frames):
+        angle = -180 + (360.0 / frames) * frame
+        title = f"{TITLE}\nCentral Longitude: {angle:.0f}°"
+        images.append(compose(base_frame(angle, dpi), red_coords, black_coords, angle, dpi, title).convert("RGB"))
+    os.makedirs(MAP_CACHE_DIR, exist_ok=True)
+    tmp_path = _atomic_path(cached)
+    images[0].save(tmp_path, format="GIF", save_all=True, append_images=images[1:], duration=interval, loop=0)
+    os.replace(tmp_path, cached)
+    shutil.copyfile(cached, output_filename)
+    prune_cache(keep=cached)
+    return False
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import logging
+import os
+import platform
+import socket
+import struct
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def _checksum(data):
+    """Standard internet checksum (RFC 1071)."""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpProber:
+    """
+    In-process ICMP echo prober.
+    Uses an unprivileged datagram ICMP socket where the kernel allows it
+    (net.ipv4.ping_group_range on Linux, always on macOS), or a raw socket when
+    running privileged. Many echo requests share one socket and replies are
+    matched back to their request by id/sequence. Replies are read through the event
+    loop's add_reader, which Windows' Proactor loop lacks; there open() returns None
+    and pings go through the ping binary.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.raw = sock.type == socket.SOCK_RAW
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = itertools.count(1)
+        self._pending = {}
+        self._loop = None
+
+    @classmethod
+    def open(cls):
+        """
+        Return a prober bound to a fresh ICMP socket and the running event loop, or None if
+        the kernel refuses a socket or the loop cannot watch one.
+        """
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except OSError as e:
+                logging.debug("ICMP socket type %s unavailable: %s", sock_type, e)
+                continue
+            sock.setblocking(False)
+            prober = cls(sock)
+            loop = asyncio.get_running_loop()
+            try:
+                loop.add_reader(sock.fileno(), prober._on_readable)
+            except NotImplementedError:
+                sock.close()
+                logging.info("Event loop cannot watch ICMP sockets; falling back to the ping binary.")
+                return None
+            prober._loop = loop
+            return prober
+        logging.info("ICMP sockets unavailable; falling back to the ping binary.")
+        return None
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.sock.fileno())
+            self._loop = None
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        self.sock.close()
+
+    def _reply_ident(self):
+        # Linux datagram ICMP sockets rewrite the echo id to the socket's local "port".
+        if not self.raw and platform.system() == "Linux":
+            return self.sock.getsockname()[1]
+        return self.ident
+
+    async def ping(self, address, timeout=2):
+        """Send one echo request to an IPv4 address. Returns the RTT in ms, or None on timeout."""
+        loop = asyncio.get_running_loop()
+        seq = next(self._seq) & 0xFFFF
+        payload = struct.pack("!d", time.perf_counter()) + b"check-it"
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        checksum = _checksum(header + payload)
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, self.ident, seq) + payload
+
+        future = loop.create_future()
+        started = time.perf_counter()
+        try:
+            self.sock.sendto(packet, (address, 0))
+        except OSError as e:
+            logging.debug("ICMP send to %s failed: %s", address, e)
+            return None
+        self._pending[(self._reply_ident(), seq, address)] = future
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending.pop((self._reply_ident(), seq, address), None)
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    @staticmethod
+    def parse_reply(data):
+        """(ident, seq) of an echo reply packet, or None for anything else."""
+        # Raw sockets (and datagram sockets on macOS) include the IPv4 header.
+        if data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return None
+        icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return None
+        return ident, seq
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, (source, _) = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.debug("ICMP receive failed: %s", e)
+                return
+            reply = self.parse_reply(data)
+            if reply is None:
+                continue
+            future = self._pending.get((*reply, source))
+            if future is not None and not future.done():
+                future.set_result(True)
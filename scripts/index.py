@@ -1,13 +1,13 @@
 import logging
 
 class Index:
-    def __init__(self, debug=False):
+    def __init__(self, index_file=None, debug=False):
         """
         Updates the index page for displaying results.
         If debug is True, logging level should be set to DEBUG for verbose output.
         """
         self.debug = debug
-        self.index_file = "index.html"
+        self.index_file = index_file if index_file else "index.html"
     
     def update(self, report_filename, summary):
         """
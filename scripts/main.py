@@ -1,30 +1,84 @@
 import argparse
 import logging
+import os
+import changelog
 from monitoring import Monitoring
-from reports_module import Reports
-from index import Index
+from scheduler import Scheduler, DEFAULT_PROBE_INTERVAL, DEFAULT_REPORT_INTERVAL, DEFAULT_JITTER
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Monitor remote computers and generate HTML reports.")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging.")
-    parser.add_argument("--regenerate", action="store_true", help="Regenerate files for archived scans from last 7 days.")
+    parser.add_argument("--regenerate", action="store_true", help="Backfill: regenerate files for archived scans (last 7 days unless --since/--until), then exit.")
+    parser.add_argument("--since", help="Backfill window start, YYYY-MM-DD[ HH:MM:SS] (default: 7 days ago).")
+    parser.add_argument("--until", help="Backfill window end, YYYY-MM-DD[ HH:MM:SS] (default: now; a bare date includes the whole day).")
+    parser.add_argument("--workers", type=int, default=None, help="Backfill worker processes (default: available cores).")
+    parser.add_argument("--restart", action="store_true", help="Backfill: ignore checkpoints of earlier runs over the same window.")
+    parser.add_argument("--probe-only", action="store_true", help="Only probe hosts; skip report and index generation.")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and probe hosts on a schedule instead of once (templates are reloaded when edited).")
+    parser.add_argument("--interval", type=int, default=DEFAULT_PROBE_INTERVAL, help="Daemon mode: seconds between probes of each host.")
+    parser.add_argument("--report-interval", type=int, default=DEFAULT_REPORT_INTERVAL, help="Daemon mode: seconds between report regenerations.")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER, help="Daemon mode: random spread of each probe interval, as a fraction.")
     args = parser.parse_args()
     
     # ...
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    if changelog.ENABLED:
+        # The .db files are not committed in change-log mode; every mode below (including
+        # --regenerate, which never creates a Monitoring) needs them rebuilt from the segments.
+        changelog.restore_missing([(os.path.join(changelog.DATA_DIR, name), schema)
+                                   for name, schema in changelog.DATABASES])
     
+    if args.regenerate:
+        # Bounded, restartable backfill of archived scans; no probing or report run.
+        from reports_module import Reports
+        from backfill import Backfill
+        report_gen = Reports(debug=args.debug)
+        stats = Backfill(report_gen, workers=args.workers, debug=args.debug).run(
+            since=args.since, until=args.until, restart=args.restart)
+        if stats["done"]:
+            report_gen.commit_changes(f"Regenerate details for {stats['done']} archived scans")
+        raise SystemExit(1 if stats["failed"] else 0)
+
+    if args.daemon:
+        logging.info("Starting monitoring daemon...")
+        report_gen, index_page = None, None
+        if not args.probe_only:
+            # Imported lazily: the reporting stack is only needed when reports are generated.
+            from reports_module import Reports
+            from index import Index
+            import templating
+            # Pick up edited templates without restarting the daemon.
+            templating.enable_auto_reload()
+            report_gen = Reports(debug=args.debug)
+            index_page = Index(os.path.join(report_gen.details_dir, "index.html"), debug=args.debug)
+        scheduler = Scheduler(Monitoring(debug=args.debug), report_gen, index_page,
+                              probe_interval=args.interval, report_interval=args.report_interval,
+                              jitter=args.jitter, debug=args.debug)
+        scheduler.run_forever()
+        raise SystemExit(0)
+
     logging.info("Starting monitoring sequence...")
     
     monitor = Monitoring(debug=args.debug)
     results = monitor.run()
+    monitor.close()
+    if args.probe_only:
+        monitor.publish()
+        logging.info("Probe-only run completed.")
+        raise SystemExit(0)
+
+    from reports_module import Reports
+    from index import Index
 
     report_gen = Reports(debug=args.debug)
-    # Pass the regenerate flag to the Reports instance
-    report_gen.regenerate_mode = args.regenerate
     report_file = report_gen.generate()
+    report_gen.close()
+    # One commit for the databases and the report; unchanged files are skipped.
+    monitor.publish([report_gen.output_path], "Update site data and report after monitoring")
 
     # ...
-    index_page = Index(debug=args.debug)
+    index_page = Index(os.path.join(report_gen.details_dir, "index.html"), debug=args.debug)
     index_page.update(report_file, {"display_time": "N/A"})
     
     logging.info("Monitoring sequence completed.")
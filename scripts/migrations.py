@@ -0,0 +1,213 @@
+"""
+Versioned schema migrations for data.db / archive.db ("data") and checkhost.db ("checkhost").
+
+Each schema is an ordered list of steps; PRAGMA user_version stores how many have been
+applied to a file. Opening a database that is already current costs one PRAGMA read,
+and each file is checked at most once per process. Steps run in one transaction
+together with the version bump, so a failed upgrade leaves the file untouched.
+Append new steps to the end of a list; never edit or reorder applied ones.
+"""
+import logging
+import os
+import db
+
+
+def add_column(conn, table, column, column_type):
+    """ALTER TABLE ... ADD COLUMN unless the column exists (databases created before versioning)."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _data_base_tables(conn):
+    # Tables formerly created by setup_db.py
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT,
+            protocol TEXT,
+            duration INTEGER,  -- monitoring duration in hours
+            finished INTEGER DEFAULT 0,  -- 0 = not finished, 1 = finished
+            successful_runs INTEGER DEFAULT 0,
+            failed_runs INTEGER DEFAULT 0,
+            start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_scan_time TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scan_id INTEGER,
+            result TEXT,
+            response_time REAL,
+            check_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(scan_id) REFERENCES scans(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT,
+            protocol TEXT,
+            duration INTEGER,
+            successful_runs INTEGER,
+            failed_runs INTEGER,
+            start_time TIMESTAMP,
+            last_scan_time TIMESTAMP,
+            finished INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS duplicates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT,
+            protocol TEXT,
+            duration INTEGER,
+            start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_scan_time TIMESTAMP
+        )
+    """)
+
+
+def _data_scan_columns(conn):
+    # Columns written by Monitoring and Reports
+    for column, column_type in (("status", "TEXT DEFAULT 'Unknown'"), ("details", "TEXT DEFAULT ''"),
+                                ("total_scans", "INTEGER DEFAULT 0"), ("successful_scans", "INTEGER DEFAULT 0"),
+                                ("failed_scans", "INTEGER DEFAULT 0"), ("unique_id", "TEXT"),
+                                ("original_url", "TEXT"), ("checkhost_id", "TEXT"), ("details_path", "TEXT"),
+                                ("generated_report", "TEXT DEFAULT 'no'"), ("archived", "INTEGER DEFAULT 0")):
+        add_column(conn, "scans", column, column_type)
+    add_column(conn, "duplicates", "unique_id", "TEXT")
+
+
+def _data_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scans_domain ON scans(domain)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scans_finished_last_scan ON scans(finished, last_scan_time)")
+
+
+def _data_timeseries(conn):
+    # Probe history rollups (see timeseries.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS check_rollups (
+            scan_id INTEGER,
+            resolution TEXT,
+            bucket TEXT,
+            up_count INTEGER DEFAULT 0,
+            down_count INTEGER DEFAULT 0,
+            latency_sum REAL DEFAULT 0,
+            latency_count INTEGER DEFAULT 0,
+            latency_min REAL,
+            latency_max REAL,
+            PRIMARY KEY(scan_id, resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, last_check_id INTEGER)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_checks_check_time ON checks(check_time)")
+
+
+def _data_details_fingerprint(conn):
+    # Fingerprint of the inputs the detail artifacts were last rendered from (see Reports.generate)
+    add_column(conn, "scans", "details_fingerprint", "TEXT")
+
+
+def _data_backfill(conn):
+    # Per-scan checkpoints of --regenerate backfills (see backfill.py) and the window lookup they use
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            scan_id INTEGER PRIMARY KEY,
+            fingerprint TEXT,
+            completed_at DATETIME
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scans_last_scan_time ON scans(last_scan_time)")
+
+
+def _checkhost_base_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scan_meta (
+            local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT,
+            checkhost_id TEXT,
+            first_scan DATETIME,
+            last_scan DATETIME,
+            summary_up INTEGER DEFAULT 0,
+            summary_down INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scan_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            local_scan_id INTEGER,
+            call_type TEXT,
+            response TEXT,
+            timestamp DATETIME,
+            FOREIGN KEY(local_scan_id) REFERENCES scan_meta(local_id)
+        )
+    """)
+
+
+def _checkhost_storage(conn):
+    add_column(conn, "scan_results", "response_blob", "BLOB")
+    # Per-scan latency / status / per-country aggregates
+    for column, column_type in (("latency_min", "REAL"), ("latency_median", "REAL"), ("latency_p95", "REAL"),
+                                ("latency_max", "REAL"), ("status_counts", "TEXT"), ("country_stats", "TEXT")):
+        add_column(conn, "scan_meta", column, column_type)
+    # Normalized per-node results (normalized storage mode)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scan_nodes (
+            local_scan_id INTEGER,
+            node TEXT,
+            ok INTEGER,
+            latency REAL,
+            status_code INTEGER,
+            address TEXT,
+            PRIMARY KEY(local_scan_id, node)
+        ) WITHOUT ROWID
+    """)
+
+
+def _checkhost_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_meta_domain ON scan_meta(domain)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_results_local_scan_id ON scan_results(local_scan_id)")
+
+
+def _checkhost_timeline_index(conn):
+    # Covers the per-domain timeline aggregation (Reports.fetch_timeline_by_host) without a sort.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_meta_domain_span ON scan_meta(domain, first_scan, last_scan)")
+
+
+SCHEMAS = {
+    "data": [_data_base_tables, _data_scan_columns, _data_indexes, _data_timeseries,
+             _data_details_fingerprint, _data_backfill],
+    "checkhost": [_checkhost_base_tables, _checkhost_storage, _checkhost_indexes, _checkhost_timeline_index],
+}
+
+_current = set()
+
+
+def forget(path):
+    """Drop the per-process "already current" mark for `path` (e.g. after the file was replaced)."""
+    _current.discard(os.path.realpath(path))
+
+
+def migrate(path, schema):
+    """Bring the database at `path` up to the latest version of `schema`. Returns the version."""
+    steps = SCHEMAS[schema]
+    key = os.path.realpath(path)
+    if key in _current:
+        return len(steps)
+    with db.transaction(path) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < len(steps):
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated between the read above and taking the write lock.
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, step in enumerate(steps[version:], start=version + 1):
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+            if version < len(steps):
+                logging.info("Migrated %s (%s schema) from version %d to %d", path, schema, version, len(steps))
+        elif version > len(steps):
+            logging.warning("%s is at schema version %d, newer than this code (%d)", path, version, len(steps))
+    _current.add(key)
+    return len(steps)
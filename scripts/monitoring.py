@@ -1,54 +1,83 @@
-import sqlite3
 import subprocess
 import platform
 import socket
 import logging
 import os
-import base64
-import requests
-from datetime import datetime, timedelta
+import queue
+import threading
+from datetime import datetime
+import changelog
+import db
+import migrations
 from checkhost import CheckHostClient  # Integration with check-host.net
+from probe_engine import ProbeEngine, DEFAULT_CONCURRENCY
+from probes import parse_target
+from publisher import GitHubPublisher
+from resolver import Resolver, ResolveError
+from timeseries import TimeSeries
 
-# GitHub Configuration
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REPO_OWNER = "unit500"
-REPO_NAME = "check-it"
 ARCHIVE_DB_PATH = "data/archive.db"
 CHECKHOST_DB_PATH = "data/checkhost.db"
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", DEFAULT_CONCURRENCY))
+# When a scan expires (NULL without a start time or duration); start_time is stored in local time.
+EXPIRES_AT = "CASE WHEN duration THEN datetime(start_time, '+' || duration || ' hours') END"
 
 class Monitoring:
-    def __init__(self, db_path=None, archive_path=None, hosts=None, debug=False):
+    def __init__(self, db_path=None, archive_path=None, hosts=None, concurrency=None, debug=False):
         """Initialize the monitoring class with database paths and load active hosts."""
         self.debug = debug
+        self.concurrency = concurrency if concurrency else PROBE_CONCURRENCY
+        self.resolver = Resolver()
+        self.engine = ProbeEngine(concurrency=self.concurrency, resolver=self.resolver, debug=debug)
+        # Per-host probe targets (protocol, port, path) built from scans.protocol and the URL.
+        self.targets = {}
+        # Earliest moment one of the loaded scans expires; the daemon reloads hosts then.
+        self.next_expiry = None
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_path = db_path if db_path else os.path.join(script_dir, "..", "data", "data.db")
         self.archive_path = archive_path if archive_path else os.path.join(script_dir, "..", ARCHIVE_DB_PATH)
         self.checkhost_path = os.path.join(script_dir, "..", CHECKHOST_DB_PATH)
+        databases = [(self.db_path, "data"), (self.archive_path, "data"), (self.checkhost_path, "checkhost")]
+        if changelog.ENABLED:
+            # Database files are not committed in change-log mode; rebuild them from the segments.
+            changelog.restore_missing(databases)
+        migrations.migrate(self.db_path, "data")
+        migrations.migrate(self.archive_path, "data")
+        self.timeseries = TimeSeries(self.db_path, debug=debug)
+        self.publisher = GitHubPublisher(debug=debug)
+        self.checkhost_client = CheckHostClient(db_path=self.checkhost_path, debug=debug)
+        # Background check-host worker (daemon mode), started on the first submit_checkhost().
+        self._checkhost_queue = None
+        self._checkhost_thread = None
+        self.changelogs = []
+        if changelog.ENABLED:
+            self.changelogs = [changelog.ChangeLog(path, schema, debug=debug) for path, schema in databases]
+            for log in self.changelogs:
+                log.enable()
         self.hosts = hosts if hosts is not None else self.load_active_hosts()
 
     def load_active_hosts(self):
-        """Load active hosts from data.db where finished = 0 and the scan has not expired."""
+        """
+        Archive expired scans, then load active hosts from data.db (finished = 0).
+        Expiry (start_time + duration hours) is computed in SQL.
+        """
         hosts = []
+        self.next_expiry = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT domain, start_time, duration FROM scans WHERE finished = 0")
-            rows = cursor.fetchall()
-            now = datetime.now()
-            for row in rows:
-                domain, start_time, duration = row
-                if duration and start_time:
-                    start_dt = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
-                    time_limit = start_dt + timedelta(hours=duration)
-                    if now < time_limit:
-                        hosts.append(domain)
-                    else:
-                        logging.info("Marking scan as finished for %s: exceeded %d hours.", domain, duration)
-                        self.mark_scan_finished(domain)
-                else:
+            self.archive_expired()
+            rows = db.query(self.db_path, f"""
+                SELECT domain, protocol, original_url, {EXPIRES_AT}
+                FROM scans WHERE finished = 0
+            """)
+            for domain, protocol, original_url, expires_at in rows:
+                self.targets[domain] = parse_target(domain, protocol, original_url)
+                hosts.append(domain)
+                if expires_at is None:
                     logging.warning("Missing duration or start time for %s. Using default behavior.", domain)
-                    hosts.append(domain)
-            conn.close()
+                    continue
+                expires_dt = datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S")
+                if self.next_expiry is None or expires_dt < self.next_expiry:
+                    self.next_expiry = expires_dt
             logging.debug("Loaded active hosts: %s", hosts)
         except Exception as e:
             logging.error("Error loading active hosts from DB: %s", e)
@@ -56,43 +85,113 @@ class Monitoring:
 
     def run(self):
         """Run monitoring checks for all active hosts and integrate with check-host.net."""
-        logging.debug("Starting monitoring checks for hosts: %s", self.hosts)
-        results = []
-        checkhost_client = CheckHostClient(debug=self.debug)
-        for host in self.hosts:
-            status, details = self.check_host(host)
-            results.append({"host": host, "status": status, "details": details})
-            self.update_host_status(host, status, details)
-            logging.debug("Host %s status: %s, Details: %s", host, status, details)
-
-            local_scan_id = checkhost_client.initiate_scan(host)
-            if local_scan_id:
-                self.update_checkhost_reference(host, local_scan_id)
-                result_data = checkhost_client.get_scan_result(local_scan_id)
-                if result_data:
-                    up_count, down_count = checkhost_client.process_result(result_data)
-                    checkhost_client.update_summary(local_scan_id, up_count, down_count)
-        self.upload_to_github(self.checkhost_path, "Update checkhost.db after monitoring")
+        results = self.probe_hosts(self.hosts)
+        self.timeseries.maintain()
         return results
 
+    def publish(self, extra_paths=(), message="Update site data after monitoring"):
+        """
+        Commit the databases (and e.g. report.html) to GitHub in one commit; unchanged files are skipped.
+        In change-log mode only the new change-log segments are published instead of the .db files;
+        they are written even when publishing is disabled (GITHUB_PUBLISH=0), for the caller to commit.
+        """
+        if self.changelogs:
+            paths = [segment for segment, _ in (log.export() for log in self.changelogs) if segment]
+        else:
+            paths = [self.db_path, self.checkhost_path, self.archive_path]
+        return self.publisher.publish([*paths, *extra_paths], message)
+
+    def probe_hosts(self, hosts, background=False):
+        """
+        Probe the given hosts, record their status and submit them to check-host.net.
+        With background=True the check-host batch is queued for the worker thread
+        (see submit_checkhost) instead of being waited for.
+        """
+        logging.debug("Starting monitoring checks for hosts: %s", hosts)
+        results = self.engine.run(hosts, self.targets)
+        self.record_results(results)
+        if background:
+            self.submit_checkhost(hosts)
+        else:
+            self.run_checkhost(hosts)
+        logging.info("DNS cache stats: %s", self.resolver.stats)
+        return results
+
+    def run_checkhost(self, hosts):
+        """Submit hosts to check-host.net, poll their results and store the linking IDs."""
+        try:
+            local_scan_ids = self.checkhost_client.run_batch(hosts)
+            self.update_checkhost_references(local_scan_ids)
+        except Exception as e:
+            logging.error("check-host batch for %d hosts failed: %s", len(hosts), e)
+
+    def submit_checkhost(self, hosts):
+        """Queue hosts for the background check-host worker, starting it on first use."""
+        if self._checkhost_thread is None:
+            self._checkhost_queue = queue.Queue()
+            self._checkhost_thread = threading.Thread(target=self._checkhost_worker, name="checkhost", daemon=True)
+            self._checkhost_thread.start()
+        self._checkhost_queue.put(list(hosts))
+
+    def _checkhost_worker(self):
+        # Batches queued while one is polling are merged into the next run_batch call.
+        stopping = False
+        while not stopping:
+            hosts = self._checkhost_queue.get()
+            if hosts is None:
+                return
+            while True:
+                try:
+                    more = self._checkhost_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stopping = True
+                    break
+                hosts.extend(more)
+            self.run_checkhost(list(dict.fromkeys(hosts)))
+
+    def close(self):
+        """
+        Finish the queued check-host batches, release the probe engine's pooled connections
+        and event loop, and checkpoint the DBs.
+        """
+        if self._checkhost_thread is not None:
+            self._checkhost_queue.put(None)
+            self._checkhost_thread.join()
+            self._checkhost_thread = None
+        self.engine.close()
+        for path in (self.db_path, self.archive_path, self.checkhost_path):
+            db.close(path)
+
     def update_checkhost_reference(self, host, local_scan_id):
         """Update the scans record in data.db with the checkhost linking ID."""
+        self.update_checkhost_references({host: local_scan_id})
+
+    def update_checkhost_references(self, local_scan_ids):
+        """Store the checkhost linking IDs ({host: local_scan_id}) for many hosts in one transaction."""
+        if not local_scan_ids:
+            return
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE scans SET checkhost_id = ? WHERE domain = ?", (local_scan_id, host))
-            conn.commit()
-            conn.close()
+            with db.transaction(self.db_path) as conn:
+                conn.executemany("UPDATE scans SET checkhost_id = ? WHERE domain = ?",
+                                 [(local_scan_id, host) for host, local_scan_id in local_scan_ids.items()])
         except Exception as e:
-            logging.error("Failed to update checkhost reference for %s: %s", host, e)
+            logging.error("Failed to update checkhost references: %s", e)
 
     def check_host(self, host, port=80):
         """Check if a host is reachable via ping and TCP connection."""
+        try:
+            address = self.resolver.resolve(host)[0]
+        except ResolveError as e:
+            logging.error("Connection error for %s: %s", host, e)
+            return "Down", f"Ping failed, Connection error: {e}"
+
         ping_status = "Ping failed"
         try:
-            cmd = (["ping", "-c", "1", "-W", "2", host]
+            cmd = (["ping", "-c", "1", "-W", "2", address]
                    if platform.system().lower() != 'windows'
-                   else ["ping", "-n", "1", "-w", "2000", host])
+                   else ["ping", "-n", "1", "-w", "2000", address])
             result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             if result.returncode == 0:
                 ping_status = "Ping successful"
@@ -101,7 +200,7 @@ class Monitoring:
 
         connection_status = "Connection failed"
         try:
-            with socket.create_connection((host, port), timeout=3):
+            with socket.create_connection((address, port), timeout=3):
                 connection_status = "Connection successful"
         except Exception as e:
             connection_status = f"Connection error: {e}"
@@ -113,106 +212,95 @@ class Monitoring:
 
     def update_host_status(self, host, status, details):
         """Update the scan record in data.db with the latest result for a host."""
+        self.record_results([{"host": host, "status": status, "details": details}])
+
+    def record_results(self, results):
+        """
+        Write the latest result for many hosts in one transaction and append them to
+        the `checks` history. Counters are incremented in SQL, so there is no
+        read-modify-write per host.
+        """
+        if not results:
+            return
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [(r["status"], r["details"], now,
+                 1 if r["status"] == "Up" else 0, 0 if r["status"] == "Up" else 1, r["host"])
+                for r in results]
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT total_scans, successful_scans, failed_scans FROM scans WHERE domain = ?", (host,))
-            row = cursor.fetchone()
-            if row:
-                total_scans, successful_scans, failed_scans = row
-                total_scans += 1
-                if status == "Up":
-                    successful_scans += 1
-                else:
-                    failed_scans += 1
-            else:
-                total_scans, successful_scans, failed_scans = 1, 1 if status == "Up" else 0, 1 if status == "Down" else 0
-
-            cursor.execute("""
-                UPDATE scans SET 
-                    status = ?, 
-                    details = ?, 
-                    last_scan_time = ?, 
-                    total_scans = ?, 
-                    successful_scans = ?, 
-                    failed_scans = ? 
-                WHERE domain = ?""",
-                (status, details, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                 total_scans, successful_scans, failed_scans, host)
-            )
-            conn.commit()
-            conn.close()
+            with db.transaction(self.db_path) as conn:
+                conn.executemany("""
+                    UPDATE scans SET 
+                        status = ?, 
+                        details = ?, 
+                        last_scan_time = ?, 
+                        total_scans = COALESCE(total_scans, 0) + 1, 
+                        successful_scans = COALESCE(successful_scans, 0) + ?, 
+                        failed_scans = COALESCE(failed_scans, 0) + ? 
+                    WHERE domain = ?""", rows)
+                TimeSeries.append(conn, results, now)
         except Exception as e:
-            logging.error("Failed to update status for %s: %s", host, e)
+            logging.error("Failed to update status for %d hosts: %s", len(results), e)
+
+    def archive_expired(self, now=None):
+        """Move every scan whose duration has elapsed to archive.db. Returns the number of scans moved."""
+        now = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        return self._archive_scans(f"finished = 0 AND {EXPIRES_AT} <= ?", (now,))
 
     def mark_scan_finished(self, host):
+        """Mark the scan for `host` finished and move it to archive.db."""
+        if not self._archive_scans("domain = ?", (host,)):
+            logging.warning(f"No scan found for {host} to archive.")
+
+    def _archive_scans(self, condition, params):
         """
-        When a scan expires, update finished = 1 in data.db,
-        re-read the updated row, archive it into archive.db,
-        and then delete it from data.db.
+        Copy the scans matching `condition` into archive.db with finished = 1, commit, and
+        only then delete from data.db the scans whose archived copy is in place.
         (Since rows in archive.db are considered completed, we do not need to further mark them.)
+        The two files are not committed atomically, so the move is idempotent instead: a scan
+        left in both files by an interrupted run keeps its archived copy and is deleted from
+        data.db by the next run. An archived row is never overwritten; a scan whose id is
+        taken by a different archived scan is moved to the duplicates table of data.db instead
+        (in the same transaction as its delete), so it is resolved and reported once.
+        """
+        # The archived copy is the same scan (not just the same id).
+        same_scan = """
+            SELECT 1 FROM archive.scans AS a WHERE a.id = main.scans.id
+            AND a.domain IS main.scans.domain AND a.start_time IS main.scans.start_time
         """
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            cursor = conn.cursor()
-            # Get table columns (assumes the table already has a 'finished' column)
-            cursor.execute("PRAGMA table_info(scans)")
-            columns = [row[1] for row in cursor.fetchall()]
-            column_names = ", ".join(columns)
-            placeholders = ", ".join(["?" for _ in columns])
-            
-            # Update the record's finished field to 1
-            cursor.execute("UPDATE scans SET finished = 1 WHERE domain = ?", (host,))
-            conn.commit()
-            # Re-read the updated row so that finished now equals 1
-            cursor.execute(f"SELECT {column_names} FROM scans WHERE domain = ?", (host,))
-            row = cursor.fetchone()
-            if row:
-                # Archive the updated record into archive.db (no need to check finished here)
-                archive_conn = sqlite3.connect(self.archive_path, timeout=30)
-                archive_cursor = archive_conn.cursor()
-                archive_cursor.execute(f"CREATE TABLE IF NOT EXISTS scans ({column_names})")
-                archive_cursor.execute(f"INSERT OR REPLACE INTO scans ({column_names}) VALUES ({placeholders})", row)
-                archive_conn.commit()
-                archive_conn.close()
-
-                # Delete the record from data.db
-                cursor.execute("DELETE FROM scans WHERE domain = ?", (host,))
-                conn.commit()
-                conn.close()
-
-                logging.info(f"✅ Finished scan for {host} archived and removed from active scans.")
-                self.upload_to_github(self.archive_path, "Update archive.db after monitoring")
-            else:
-                logging.warning(f"No scan found for {host} to archive.")
+            with db.attached(self.db_path, self.archive_path, "archive") as conn:
+                archive_columns = {row[1] for row in conn.execute("PRAGMA archive.table_info(scans)")}
+                columns = [row[1] for row in conn.execute("PRAGMA main.table_info(scans)")
+                           if row[1] in archive_columns]
+                values = ", ".join("1" if column == "finished" else column for column in columns)
+                if not conn.execute(f"SELECT 1 FROM main.scans WHERE {condition} LIMIT 1", params).fetchone():
+                    return 0
+                conn.execute(f"""
+                    INSERT INTO archive.scans ({", ".join(columns)})
+                    SELECT {values} FROM main.scans
+                    WHERE {condition} AND id NOT IN (SELECT id FROM archive.scans)
+                """, params)
+            with db.attached(self.db_path, self.archive_path, "archive") as conn:
+                colliding = f"{condition} AND id IN (SELECT id FROM archive.scans) AND NOT EXISTS ({same_scan})"
+                collisions = [row[0] for row in conn.execute(
+                    f"SELECT domain FROM main.scans WHERE {colliding}", params)]
+                if collisions:
+                    conn.execute(f"""
+                        INSERT INTO main.duplicates (domain, protocol, duration, start_time, last_scan_time, unique_id)
+                        SELECT domain, protocol, duration, start_time, last_scan_time, unique_id
+                        FROM main.scans WHERE {colliding}
+                    """, params)
+                    conn.execute(f"DELETE FROM main.scans WHERE {colliding}", params)
+                domains = [row[0] for row in conn.execute(
+                    f"SELECT domain FROM main.scans WHERE {condition} AND EXISTS ({same_scan})", params)]
+                conn.execute(f"DELETE FROM main.scans WHERE {condition} AND EXISTS ({same_scan})", params)
+            if collisions:
+                logging.warning(f"⚠️ Moved scans whose id is already used by another archived scan to duplicates: "
+                                f"{', '.join(collisions)}")
+            if domains:
+                logging.info(f"✅ Archived {len(domains)} finished scans and removed them from active scans: "
+                             f"{', '.join(domains)}")
+            return len(domains)
         except Exception as e:
-            logging.error(f"❌ Failed to archive scan for {host}: {e}")
-
-    def upload_to_github(self, file_path, commit_message):
-        """Upload the specified file to GitHub using the API."""
-        if not GITHUB_TOKEN:
-            logging.error("GitHub token is missing. Cannot upload.")
-            return
-        repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
-        repo_file_path = os.path.relpath(file_path, repo_root)
-        base_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/contents/{repo_file_path}"
-        headers = {
-            "Authorization": f"token {GITHUB_TOKEN}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        with open(file_path, "rb") as f:
-            content = base64.b64encode(f.read()).decode()
-        get_response = requests.get(f"{base_url}?ref=main", headers=headers)
-        file_sha = get_response.json().get("sha") if get_response.status_code == 200 else None
-        data = {
-            "message": commit_message,
-            "content": content,
-            "branch": "main"
-        }
-        if file_sha:
-            data["sha"] = file_sha
-        response = requests.put(base_url, json=data, headers=headers)
-        if response.status_code in [200, 201]:
-            logging.info(f"✅ GitHub Commit Successful: {repo_file_path} updated.")
-        else:
-            logging.error(f"❌ GitHub Commit Failed for {repo_file_path}: {response.text}")
+            logging.error(f"❌ Failed to archive finished scans: {e}")
+            return 0
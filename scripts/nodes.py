@@ -0,0 +1,168 @@
+"""
+Check-host node / country index.
+
+Maps node ids ("de1", "de1.node.check-host.net") to ISO alpha-2 country codes, country
+codes to map coordinates, and free-form country names ("Germany", "Russian Federation")
+to country codes. Node countries reported by check-host initiate responses are learned
+as they arrive, and fuzzy name resolution (pycountry) runs once per distinct name. New
+entries are persisted to NODE_INDEX_PATH, so every lookup after the first is a dict hit.
+"""
+import json
+import logging
+import os
+import threading
+
+NODE_INDEX_PATH = os.getenv("NODE_INDEX_PATH", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", ".node_index.json"))
+NODE_SUFFIX = ".node.check-host.net"
+
+# --- Coordinates for country codes (ISO alpha-2 -> (lat, lon)) ---
+# check-host names its UK nodes "uk*", so "uk" is kept next to the ISO code "gb".
+COUNTRY_COORDS = {
+    "bg": (42.7339, 25.4858),
+    "br": (-14.2350, -51.9253),
+    "ch": (46.8182, 8.2275),
+    "cz": (49.8175, 15.4730),
+    "de": (51.1657, 10.4515),
+    "es": (40.4637, -3.7492),
+    "fi": (61.9241, 25.7482),
+    "fr": (46.2276, 2.2137),
+    "gb": (55.3781, -3.4360),
+    "hk": (22.3964, 114.1095),
+    "hu": (47.1625, 19.5033),
+    "id": (-0.7893, 113.9213),
+    "il": (31.0461, 34.8516),
+    "in": (20.5937, 78.9629),
+    "ir": (32.4279, 53.6880),
+    "it": (41.8719, 12.5674),
+    "jp": (36.2048, 138.2529),
+    "kz": (48.0196, 66.9237),
+    "lt": (55.1694, 23.8813),
+    "md": (47.4116, 28.3699),
+    "nl": (52.1326, 5.2913),
+    "pl": (51.9194, 19.1451),
+    "pt": (39.3999, -8.2245),
+    "rs": (44.0165, 21.0059),
+    "ru": (61.5240, 105.3188),
+    "se": (60.1282, 18.6435),
+    "tr": (38.9637, 35.2433),
+    "ua": (48.3794, 31.1656),
+    "uk": (55.3781, -3.4360),
+    "us": (37.0902, -95.7129),
+    "vn": (14.0583, 108.2772)
+}
+
+
+def short_node(node):
+    return node[:-len(NODE_SUFFIX)] if node.endswith(NODE_SUFFIX) else node
+
+
+def _prefix_country(node):
+    # "de1" -> "de": the alphabetic prefix of the node's host name.
+    return "".join(ch for ch in node.split(".")[0] if ch.isalpha()).lower()[:2] or None
+
+
+class NodeIndex:
+    def __init__(self, path=None, debug=False):
+        """Persisted node -> country -> coordinates index with memoized country-name resolution."""
+        self.debug = debug
+        self.path = path if path else NODE_INDEX_PATH
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.names = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.nodes = data.get("nodes", {})
+            self.names = data.get("names", {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        with self.lock:
+            data = {"nodes": dict(sorted(self.nodes.items())), "names": dict(sorted(self.names.items()))}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error("Failed to save node index %s: %s", self.path, e)
+
+    def learn(self, node_countries):
+        """Record {node: country code} from a check-host initiate response; persists new entries."""
+        changed = False
+        with self.lock:
+            for node, code in (node_countries or {}).items():
+                node = short_node(node)
+                if code and self.nodes.get(node) != code.lower():
+                    self.nodes[node] = code.lower()
+                    changed = True
+        if changed:
+            self.save()
+
+    def learn_names(self, names):
+        """Record {country name: country code} pairs (e.g. from node location info)."""
+        changed = False
+        with self.lock:
+            for name, code in (names or {}).items():
+                key = name.strip().lower()
+                if key and code and self.names.get(key) != code.lower():
+                    self.names[key] = code.lower()
+                    changed = True
+        if changed:
+            self.save()
+
+    def node_country(self, node):
+        """Country code of a node id: learned from check-host, else its name prefix."""
+        node = short_node(node)
+        code = self.nodes.get(node)
+        return code if code else _prefix_country(node)
+
+    @staticmethod
+    def coords(country_code):
+        return COUNTRY_COORDS.get(country_code) if country_code else None
+
+    def node_coords(self, node):
+        return self.coords(self.node_country(node))
+
+    def resolve_country(self, name):
+        """ISO alpha-2 code (lower case) for a country name or code, or None; each distinct name is resolved once."""
+        if not name:
+            return None
+        key = name.strip().lower()
+        if key in self.names:
+            return self.names[key] or None
+        if len(key) == 2 and key.isalpha():
+            code = key
+        else:
+            code = ""
+            try:
+                import pycountry
+                matches = pycountry.countries.search_fuzzy(name)
+                if matches:
+                    code = matches[0].alpha_2.lower()
+            except LookupError:
+                pass
+            except Exception as e:
+                logging.error(f"Error resolving country name '{name}': {e}")
+                return None
+        # Misses are memoized too (as ""), so an unknown name is not searched again.
+        with self.lock:
+            self.names[key] = code
+        self.save()
+        return code or None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide NodeIndex (loaded on first use)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NodeIndex()
+        return _index
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import platform
+import time
+from icmp import IcmpProber
+from resolver import Resolver, ResolveError
+from probes import HttpConnectionPool, get_probe, open_first, parse_target
+
+DEFAULT_CONCURRENCY = 50
+PING_TIMEOUT = 2
+CONNECT_TIMEOUT = 3
+
+
+class ProbeEngine:
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, port=80, ping_timeout=PING_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, use_icmp_socket=True, resolver=None, debug=False):
+        """
+        Probe many hosts concurrently. At most `concurrency` hosts are probed at once.
+        Each host is checked by the probe registered for its protocol (see probes.py);
+        hosts without a protocol keep the original check_host semantics (ping + TCP connect).
+        Pings go through an in-process ICMP socket when available and fall back to
+        the system `ping` binary otherwise. All hosts are resolved up front through
+        `resolver` and every probe works on the pre-resolved addresses.
+        """
+        self.debug = debug
+        self.concurrency = max(1, int(concurrency))
+        self.port = port
+        self.ping_timeout = ping_timeout
+        self.connect_timeout = connect_timeout
+        self.use_icmp_socket = use_icmp_socket
+        self.icmp = None
+        self.resolver = resolver if resolver else Resolver()
+        self.http_pool = HttpConnectionPool()
+        # One loop for the engine's lifetime so pooled keep-alive connections survive between runs.
+        self._loop = None
+
+    def run(self, hosts, targets=None):
+        """
+        Probe all hosts and return the result list in the same order as `hosts`.
+        `targets` optionally maps a host to the probes.Target describing how to check it.
+        """
+        if not hosts:
+            return []
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        started = time.perf_counter()
+        results = self._loop.run_until_complete(self.probe_all(hosts, targets or {}))
+        logging.info("Probed %d hosts in %.2fs (concurrency=%d, http pool=%s)",
+                     len(hosts), time.perf_counter() - started, self.concurrency, self.http_pool.stats)
+        return results
+
+    def close(self):
+        """Close pooled connections and the engine's event loop."""
+        self.http_pool.close()
+        if self._loop is not None:
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+            self._loop = None
+
+    async def probe_all(self, hosts, targets):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(host):
+            async with semaphore:
+                return await self.probe(host, targets.get(host))
+
+        await self.resolver.resolve_all(targets[host].host if host in targets else host for host in hosts)
+        self.icmp = IcmpProber.open() if self.use_icmp_socket else None
+        try:
+            return await asyncio.gather(*(bounded(host) for host in hosts))
+        finally:
+            if self.icmp:
+                self.icmp.close()
+                self.icmp = None
+
+    async def probe(self, host, target=None):
+        """
+        Check a single host. Returns {"host", "status", "details", "protocol", "timings"}.
+        Any unexpected error becomes a "Down" result for this host only, so it cannot
+        discard the results of the rest of the batch.
+        """
+        started = time.perf_counter()
+        protocol = target.protocol if target else None
+        try:
+            target = target if target else parse_target(host)
+            protocol = target.protocol
+            addresses = await self.resolver.resolve_async(target.host)
+        except ResolveError as e:
+            logging.error("Connection error for %s: %s", host, e)
+            status, details, timings = "Down", f"Ping failed, Connection error: {e}", {}
+        except Exception as e:
+            logging.error("Probe error for %s: %s", host, e)
+            status, details, timings = "Down", str(e), {}
+        else:
+            try:
+                status, details, timings = await get_probe(protocol)(self).probe(target, addresses)
+            except Exception as e:
+                logging.error("Probe error for %s (%s): %s", host, protocol, e)
+                status, details, timings = "Down", str(e), {}
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logging.debug("Host %s (%s) status: %s, Details: %s, Timings: %s",
+                      host, protocol, status, details, timings)
+        return {"host": host, "status": status, "details": details,
+                "protocol": protocol, "timings": timings}
+
+    async def ping(self, host, addresses):
+        """
+        Send a single echo request. Returns (ok, elapsed_ms); with the in-process
+        prober elapsed_ms is the measured round-trip time.
+        """
+        address = Resolver.first_ipv4(addresses)
+        if self.icmp and address:
+            rtt = await self.icmp.ping(address, timeout=self.ping_timeout)
+            return rtt is not None, rtt
+        return await self.ping_subprocess(host, addresses[0])
+
+    async def ping_subprocess(self, host, address):
+        """Send a single ping via the system `ping` binary. Returns (ok, elapsed_ms)."""
+        cmd = (["ping", "-c", "1", "-W", str(self.ping_timeout), address]
+               if platform.system().lower() != 'windows'
+               else ["ping", "-n", "1", "-w", str(self.ping_timeout * 1000), address])
+        started = time.perf_counter()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+            try:
+                returncode = await asyncio.wait_for(proc.wait(), timeout=self.ping_timeout + 1)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                returncode = -1
+        except Exception as e:
+            logging.error("Ping error for %s: %s", host, e)
+            returncode = -1
+        return returncode == 0, round((time.perf_counter() - started) * 1000, 2)
+
+    async def connect(self, host, addresses, port=None):
+        """Open and close a TCP connection. Returns (connection_status, elapsed_ms)."""
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                open_first(addresses, port or self.port), timeout=self.connect_timeout)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            connection_status = "Connection successful"
+        except asyncio.TimeoutError:
+            connection_status = "Connection error: timed out"
+            logging.error("Connection error for %s: timed out", host)
+        except Exception as e:
+            connection_status = f"Connection error: {e}"
+            logging.error("Connection error for %s: %s", host, e)
+        return connection_status, round((time.perf_counter() - started) * 1000, 2)
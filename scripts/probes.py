@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import ssl
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+# Probe classes register themselves here by protocol name (see register_probe).
+PROBES = {}
+DEFAULT_PROTOCOL = "tcp"
+DEFAULT_PORTS = {"http": 80, "https": 443, "tcp": 80}
+HTTP_TIMEOUT = 10
+MAX_DRAIN_BYTES = 1024 * 1024
+# HTTP responses with a status code at or above this count as Down (4xx included by default;
+# HTTP_DOWN_STATUS=500 only treats server errors as Down).
+HTTP_DOWN_STATUS = int(os.getenv("HTTP_DOWN_STATUS", "400"))
+
+Target = namedtuple("Target", ["host", "protocol", "port", "path"])
+
+
+def _ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def parse_target(domain, protocol=None, url=None):
+    """
+    Build a Target from a scans row. The protocol column wins, then the URL scheme,
+    then plain TCP. `url` (scans.original_url) may be a full URL or a bare host name.
+    """
+    raw = url or domain
+    parts = urlsplit(raw if "://" in raw else f"//{raw}")
+    scheme = parts.scheme.lower() or None
+    protocol = (protocol or scheme or DEFAULT_PROTOCOL).lower()
+    if protocol not in PROBES:
+        logging.warning("Unknown probe protocol %r for %s; using %s.", protocol, domain, DEFAULT_PROTOCOL)
+        protocol = DEFAULT_PROTOCOL
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    port = port or DEFAULT_PORTS.get(protocol)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return Target(parts.hostname or domain, protocol, port, path)
+
+
+async def open_first(addresses, port):
+    """Connect to the first address that accepts, mirroring socket.create_connection."""
+    last_error = None
+    for address in addresses:
+        try:
+            return await asyncio.open_connection(address, port)
+        except OSError as e:
+            last_error = e
+    raise last_error
+
+
+def register_probe(name):
+    def decorator(cls):
+        PROBES[name] = cls
+        return cls
+    return decorator
+
+
+def get_probe(name):
+    return PROBES.get(name, PROBES[DEFAULT_PROTOCOL])
+
+
+@register_probe("tcp")
+class TcpProbe:
+    """The original check_host probe: one ping plus one TCP connect."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def probe(self, target, addresses):
+        (ping_ok, ping_ms), (connection_status, connect_ms) = await asyncio.gather(
+            self.engine.ping(target.host, addresses),
+            self.engine.connect(target.host, addresses, target.port))
+        if ping_ok:
+            ping_status = f"Ping successful ({ping_ms} ms)" if self.engine.icmp else "Ping successful"
+        else:
+            ping_status = "Ping failed"
+        status = "Up" if "successful" in connection_status else "Down"
+        return status, f"{ping_status}, {connection_status}", {"ping_ms": ping_ms, "connect_ms": connect_ms}
+
+
+@register_probe("icmp")
+class IcmpProbe:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def probe(self, target, addresses):
+        ping_ok, ping_ms = await self.engine.ping(target.host, addresses)
+        if ping_ok:
+            return "Up", f"Ping successful ({ping_ms} ms)", {"ping_ms": ping_ms}
+        return "Down", "Ping failed", {"ping_ms": ping_ms}
+
+
+@register_probe("dns")
+class DnsProbe:
+    """Times a fresh (uncached) lookup of the host name."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def probe(self, target, addresses):
+        started = time.perf_counter()
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(target.host, None),
+                timeout=self.engine.connect_timeout)
+        except Exception as e:
+            return "Down", f"DNS lookup failed: {e or 'timed out'}", {"dns_ms": _ms(started)}
+        dns_ms = _ms(started)
+        count = len({info[4][0] for info in infos})
+        return "Up", f"DNS lookup successful ({count} addresses, {dns_ms} ms)", {"dns_ms": dns_ms}
+
+
+class HttpConnectionPool:
+    """Idle keep-alive connections keyed by (protocol, host, port)."""
+
+    def __init__(self):
+        self._idle = {}
+        self.ssl_context = ssl.create_default_context()
+        self.stats = {"opened": 0, "reused": 0}
+
+    def take(self, key):
+        connections = self._idle.get(key, [])
+        while connections:
+            reader, writer = connections.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.stats["reused"] += 1
+                return reader, writer
+            writer.close()
+        return None
+
+    def give(self, key, connection):
+        self._idle.setdefault(key, []).append(connection)
+
+    async def open(self, target, addresses, connect_timeout):
+        """Open a new connection, timing TCP connect and TLS handshake separately."""
+        timings = {}
+        started = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            open_first(addresses, target.port), timeout=connect_timeout)
+        timings["connect_ms"] = _ms(started)
+        if target.protocol == "https":
+            started = time.perf_counter()
+            await asyncio.wait_for(
+                writer.start_tls(self.ssl_context, server_hostname=target.host), timeout=connect_timeout)
+            timings["tls_ms"] = _ms(started)
+        self.stats["opened"] += 1
+        return (reader, writer), timings
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+@register_probe("http")
+class HttpProbe:
+    """
+    GET the target URL over a pooled keep-alive connection and report
+    DNS, connect, TLS and time-to-first-byte phases.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def probe(self, target, addresses):
+        # A missing timing must never fail the probe.
+        timings = {"dns_ms": getattr(self.engine.resolver, "lookup_ms", {}).get(target.host, 0.0)}
+        key = (target.protocol, target.host, target.port)
+        pool = self.engine.http_pool
+        try:
+            connection = pool.take(key)
+            if connection is not None:
+                try:
+                    return await self._request(target, key, connection, timings)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    # The server dropped the idle connection; retry on a fresh one.
+                    connection[1].close()
+            connection, open_timings = await pool.open(target, addresses, self.engine.connect_timeout)
+            timings.update(open_timings)
+            return await self._request(target, key, connection, timings)
+        except asyncio.TimeoutError:
+            return "Down", "HTTP error: timed out", timings
+        except Exception as e:
+            logging.error("HTTP probe error for %s: %s", target.host, e)
+            return "Down", f"HTTP error: {e}", timings
+
+    async def _request(self, target, key, connection, timings):
+        reader, writer = connection
+        default_port = DEFAULT_PORTS[target.protocol]
+        host_header = target.host if target.port == default_port else f"{target.host}:{target.port}"
+        request = (f"GET {target.path} HTTP/1.1\r\n"
+                   f"Host: {host_header}\r\n"
+                   "User-Agent: check-it-monitor\r\n"
+                   "Accept: */*\r\n"
+                   "Connection: keep-alive\r\n\r\n")
+        started = time.perf_counter()
+        writer.write(request.encode("ascii"))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout=HTTP_TIMEOUT)
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        timings["ttfb_ms"] = _ms(started)
+        parts = status_line.decode("latin-1").split(" ", 2)
+        status_code = int(parts[1])
+        reason = parts[2].strip() if len(parts) > 2 else ""
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=HTTP_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if status_code in (204, 304) or status_code < 200:
+            reusable = True
+        else:
+            reusable = await self._drain_body(reader, headers)
+        if reusable and headers.get("connection", "").lower() != "close":
+            self.engine.http_pool.give(key, connection)
+        else:
+            writer.close()
+        timings["total_ms"] = _ms(started)
+
+        status = "Up" if status_code < HTTP_DOWN_STATUS else "Down"
+        return status, f"HTTP {status_code} {reason}, TTFB {timings['ttfb_ms']} ms".rstrip(), timings
+
+    @staticmethod
+    async def _drain_body(reader, headers):
+        """Read the response body so the connection can be reused. Returns False if it can't be."""
+        if "content-length" in headers:
+            length = int(headers["content-length"])
+            if length > MAX_DRAIN_BYTES:
+                return False
+            await asyncio.wait_for(reader.readexactly(length), timeout=HTTP_TIMEOUT)
+            return True
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            drained = 0
+            while True:
+                size_line = await asyncio.wait_for(reader.readline(), timeout=HTTP_TIMEOUT)
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line.
+                    while (await asyncio.wait_for(reader.readline(), timeout=HTTP_TIMEOUT)) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return True
+                drained += size
+                if drained > MAX_DRAIN_BYTES:
+                    return False
+                await asyncio.wait_for(reader.readexactly(size + 2), timeout=HTTP_TIMEOUT)
+        # No framing: the body runs until the server closes the connection.
+        return False
+
+
+@register_probe("https")
+class HttpsProbe(HttpProbe):
+    pass
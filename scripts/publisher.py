@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import requests
+import db
+
+# GitHub Configuration
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+REPO_OWNER = "unit500"
+REPO_NAME = "check-it"
+BRANCH = "main"
+# GitHub REST API root; set GITHUB_API for GitHub Enterprise hosts
+GITHUB_API = os.getenv("GITHUB_API", "https://api.github.com")
+# GITHUB_PUBLISH=0 leaves committing to the caller (the CI workflow commits with git itself).
+ENABLED = os.getenv("GITHUB_PUBLISH", "1") == "1"
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# sha256 of every file as last published, so unchanged files are never re-uploaded.
+MANIFEST_PATH = os.path.join(REPO_ROOT, "data", ".publish_manifest.json")
+
+
+class GitHubPublisher:
+    def __init__(self, token=None, owner=REPO_OWNER, repo=REPO_NAME, branch=BRANCH, api_base=None,
+                 repo_root=None, manifest_path=None, debug=False):
+        """
+        Publish files to a GitHub branch through the Git Data API.
+        Files whose sha256 matches the local manifest, or whose content already matches the
+        branch, are skipped; all changed files go into a single commit
+        (blobs -> tree on top of the branch head -> commit -> ref update).
+        """
+        self.debug = debug
+        self.token = token if token else GITHUB_TOKEN
+        self.owner = owner
+        self.repo = repo
+        self.branch = branch
+        self.api_base = (api_base if api_base else GITHUB_API).rstrip("/")
+        self.repo_root = repo_root if repo_root else REPO_ROOT
+        self.manifest_path = manifest_path if manifest_path else MANIFEST_PATH
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if self.token:
+            self.session.headers["Authorization"] = f"token {self.token}"
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def file_digest(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def blob_id(content):
+        """Git blob id of `content` (what the API reports as a tree entry's sha)."""
+        return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+    def changed_files(self, paths, manifest=None):
+        """Return [(repo_path, file_path, sha256)] for the existing files that differ from the manifest."""
+        manifest = manifest if manifest is not None else self.load_manifest()
+        changed = []
+        for file_path in paths:
+            if not os.path.exists(file_path):
+                logging.warning("Publisher: %s does not exist; skipping.", file_path)
+                continue
+            # SQLite files may still have committed pages in their WAL; fold them in first.
+            if file_path.endswith(".db"):
+                db.checkpoint(file_path)
+            repo_path = os.path.relpath(file_path, self.repo_root).replace(os.sep, "/")
+            digest = self.file_digest(file_path)
+            if manifest.get(repo_path) != digest:
+                changed.append((repo_path, file_path, digest))
+        return changed
+
+    def _api(self, method, path, payload=None):
+        response = self.session.request(method, f"{self.api_base}/repos/{self.owner}/{self.repo}/{path}",
+                                        json=payload, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def publish(self, paths, message):
+        """
+        Commit every changed file in `paths` to the branch as one commit.
+        Returns {"files", "bytes", "commit"} ("commit" is None when nothing changed), or None on failure.
+        """
+        if not ENABLED:
+            logging.info("Publisher: disabled (GITHUB_PUBLISH=0); not publishing %d files.", len(paths))
+            return {"files": 0, "bytes": 0, "commit": None}
+        manifest = self.load_manifest()
+        changed = self.changed_files(paths, manifest)
+        if not changed:
+            logging.info("Publisher: no changes in %d files; nothing to publish.", len(paths))
+            return {"files": 0, "bytes": 0, "commit": None}
+        if not self.token:
+            logging.error("GitHub token is missing. Cannot upload.")
+            return None
+        try:
+            head = self._api("GET", f"git/ref/heads/{self.branch}")["object"]["sha"]
+            base_tree = self._api("GET", f"git/commits/{head}")["tree"]["sha"]
+            # The manifest is local (absent on a fresh checkout); files whose git blob id already
+            # matches the branch are recorded without being uploaded again.
+            remote = {entry["path"]: entry["sha"]
+                      for entry in self._api("GET", f"git/trees/{base_tree}?recursive=1").get("tree", [])
+                      if entry.get("type") == "blob"}
+            tree = []
+            uploaded = 0
+            for repo_path, file_path, _ in changed:
+                with open(file_path, "rb") as f:
+                    content = f.read()
+                if remote.get(repo_path) == self.blob_id(content):
+                    continue
+                blob = self._api("POST", "git/blobs", {"content": base64.b64encode(content).decode(),
+                                                       "encoding": "base64"})
+                uploaded += len(content)
+                tree.append({"path": repo_path, "mode": "100644", "type": "blob", "sha": blob["sha"]})
+            commit = None
+            if tree:
+                new_tree = self._api("POST", "git/trees", {"base_tree": base_tree, "tree": tree})["sha"]
+                commit = self._api("POST", "git/commits",
+                                   {"message": message, "tree": new_tree, "parents": [head]})["sha"]
+                self._api("PATCH", f"git/refs/heads/{self.branch}", {"sha": commit})
+        except Exception as e:
+            logging.error(f"❌ GitHub Commit Failed for {', '.join(p for p, _, _ in changed)}: {e}")
+            return None
+        for repo_path, _, digest in changed:
+            manifest[repo_path] = digest
+        self.save_manifest(manifest)
+        if commit is None:
+            logging.info("Publisher: %d files not in the manifest already match %s; nothing to publish.", len(changed), self.branch)
+            return {"files": 0, "bytes": 0, "commit": None}
+        logging.info(f"✅ GitHub Commit Successful: {commit[:7]} updated {len(tree)} files "
+                     f"({uploaded} bytes uploaded): {', '.join(entry['path'] for entry in tree)}")
+        return {"files": len(tree), "bytes": uploaded, "commit": commit}
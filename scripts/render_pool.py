@@ -0,0 +1,122 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import charts_module
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Worker processes for chart rendering (defaults to the available cores; 1 renders in-process).
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or available_cores()
+
+
+def warm_up():
+    """
+    Worker initializer: import the plotting stack, so the worker's matplotlib backend (and,
+    when a chart type uses the plotly backend, its Kaleido engine) is started once and
+    reused by every job.
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot  # noqa: F401
+    except Exception as e:
+        logging.debug("Render worker: matplotlib not available: %s", e)
+    if "plotly" not in charts_module.CHART_BACKENDS.values():
+        return
+    try:
+        import plotly.graph_objects as go
+        go.Figure().to_image(format="png", width=10, height=10)
+    except Exception as e:
+        logging.debug("Render worker: plotly/kaleido not available: %s", e)
+
+
+def run_job(func, args, kwargs):
+    """Run one render job; returns (elapsed seconds, error message or None)."""
+    started = time.perf_counter()
+    try:
+        func(*args, **kwargs)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return time.perf_counter() - started, error
+
+
+class RenderPool:
+    def __init__(self, workers=None, debug=False):
+        """
+        Collects the chart jobs of a report run and renders them in parallel worker processes.
+        Jobs are module-level functions (so they can be pickled) plus their arguments.
+        Per-job timings are kept in `timings` as (label, seconds, error).
+        The worker processes are started on the first run() and kept (warm) until close().
+        """
+        self.debug = debug
+        self.workers = max(1, workers if workers else RENDER_WORKERS)
+        self.jobs = []
+        self.timings = []
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # Spawned, not forked: the parent may hold sqlite connections and a check-host
+            # worker thread, neither of which may be carried into a forked child.
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, label, func, *args, **kwargs):
+        self.jobs.append((label, func, args, kwargs))
+
+    def run_inline(self, label, func, *args, **kwargs):
+        """Render a cheap job (e.g. an SVG chart) in this process right away; timed like pool jobs."""
+        elapsed, error = run_job(func, args, kwargs)
+        self.timings.append((label, elapsed, error))
+        if error:
+            logging.error("Render job %s failed after %.2fs: %s", label, elapsed, error)
+        return error is None
+
+    def run(self):
+        """Render every queued job and clear the queue. Returns the number of jobs that failed."""
+        jobs, self.jobs = self.jobs, []
+        if not jobs:
+            return 0
+        started = time.perf_counter()
+        workers = min(self.workers, len(jobs))
+        if workers == 1:
+            results = [run_job(func, args, kwargs) for _, func, args, kwargs in jobs]
+        else:
+            futures = [self._pool().submit(run_job, func, args, kwargs) for _, func, args, kwargs in jobs]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool as e:
+                    results.append((0.0, f"{type(e).__name__}: {e}"))
+            if any(error and error.startswith("BrokenProcessPool") for _, error in results):
+                # A worker died; start fresh processes on the next run.
+                self.close()
+        failed = 0
+        for (label, _, _, _), (elapsed, error) in zip(jobs, results):
+            self.timings.append((label, elapsed, error))
+            if error:
+                failed += 1
+                logging.error("Render job %s failed after %.2fs: %s", label, elapsed, error)
+            else:
+                logging.debug("Render job %s took %.3fs", label, elapsed)
+        busy = sum(elapsed for elapsed, _ in results)
+        logging.info("Rendered %d charts in %.2fs on %d workers (%.2fs of render time, %d failed).",
+                     len(jobs), time.perf_counter() - started, workers, busy, failed)
+        return failed
@@ -1,170 +1,77 @@
 # reports_module.py (version 1.6)
-import sqlite3
+import hashlib
 import logging
 import os
 import json
 import subprocess
 import shutil
 from datetime import datetime, timedelta
-from jinja2 import Template
-import plotly.express as px
-import pandas as pd
-
-# --- New Imports for DDOS Map Animation and Timeline Generation from JSON ---
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-import matplotlib.patches as mpatches
-import matplotlib.animation as animation
-import re
-
-# Import our Plotly pie chart function from charts_module.py
+
+# The plotting stack (pandas, plotly, matplotlib, cartopy, PIL) is imported inside the
+# functions that draw, so importing this module stays cheap for probe-only runs.
+
+# Chart rendering (SVG or Plotly backend per chart type) from charts_module.py
 import charts_module
+import db
+import ddos_map
+import migrations
+import nodes
+import templating
+from render_pool import RenderPool
+from timeseries import TimeSeries
+
+def node_country_coords(check_details):
+    """{country code: (lat, lon)} for the check-host nodes in check_details (e.g. 'de1.node.check-host.net' -> 'de')."""
+    index = nodes.get_index()
+    coords = {}
+    for node in check_details.get("check_results", {}).keys():
+        code = index.node_country(node)
+        if index.coords(code):
+            coords[code] = index.coords(code)
+    return coords
 
-# --- Fallback coordinates for country codes (ISO alpha-2 -> (lat, lon)) ---
-fallback_coords = {
-"bg": (42.7339, 25.4858),
-    "br": (-14.2350, -51.9253),
-    "ch": (46.8182, 8.2275),
-    "cz": (49.8175, 15.4730),
-    "de": (51.1657, 10.4515),
-    "es": (40.4637, -3.7492),
-    "fi": (61.9241, 25.7482),
-    "fr": (46.2276, 2.2137),
-    "hk": (22.3964, 114.1095),
-    "hu": (47.1625, 19.5033),
-    "id": (-0.7893, 113.9213),
-    "il": (31.0461, 34.8516),
-    "in": (20.5937, 78.9629),
-    "ir": (32.4279, 53.6880),
-    "it": (41.8719, 12.5674),
-    "jp": (36.2048, 138.2529),
-    "kz": (48.0196, 66.9237),
-    "lt": (55.1694, 23.8813),
-    "md": (47.4116, 28.3699),
-    "nl": (52.1326, 5.2913),
-    "pl": (51.9194, 19.1451),
-    "pt": (39.3999, -8.2245),
-    "rs": (44.0165, 21.0059),
-    "ru": (61.5240, 105.3188),
-    "se": (60.1282, 18.6435),
-    "tr": (38.9637, 35.2433),
-    "ua": (48.3794, 31.1656),
-    "uk": (55.3781, -3.4360),
-    "us": (37.0902, -95.7129),
-    "vn": (14.0583, 108.2772)
-}
+def attacked_country_coords(attacked_country):
+    """(country code, (lat, lon)) of the attacked country, or None when it cannot be placed."""
+    index = nodes.get_index()
+    country_code = index.resolve_country(attacked_country)
+    if index.coords(country_code):
+        return country_code, index.coords(country_code)
+    return None
 
 def generate_ddos_map(check_details, attacked_country, output_filename):
     """
-    Generate a static world map image using Cartopy:
+    Generate a static world map image:
       - Red circles for each unique country derived from check_details keys.
       - A black circle for the attacked country.
-    Saves the image to output_filename.
+    The base map comes from ddos_map's cache. Saves the image to output_filename.
     """
-    results = check_details.get("check_results", {})
-    red_coords = set()
-    for node in results.keys():
-        match = re.match(r"([a-zA-Z]+)", node)
-        if match:
-            code = match.group(1).lower()[:2]
-            coords = fallback_coords.get(code)
-            if coords:
-                red_coords.add(coords)
-    black_coords = None
-    if attacked_country:
-        try:
-            import pycountry
-            matches = pycountry.countries.search_fuzzy(attacked_country)
-            if matches:
-                country_code = matches[0].alpha_2.lower()
-                black_coords = fallback_coords.get(country_code)
-        except Exception as e:
-            logging.error(f"Error getting coordinates for attacked country '{attacked_country}': {e}")
-    fig = plt.figure(figsize=(12, 6))
-    ax = plt.axes(projection=ccrs.PlateCarree())
-    ax.set_global()
-    ax.add_feature(cfeature.LAND, facecolor='lightgray')
-    ax.add_feature(cfeature.OCEAN, facecolor='aliceblue')
-    ax.add_feature(cfeature.BORDERS, linestyle='-', edgecolor='gray')
-    ax.coastlines()
-    if red_coords:
-        lats, lons = zip(*red_coords)
-        ax.scatter(lons, lats, color='red', s=100, transform=ccrs.PlateCarree(), zorder=5)
-    if black_coords:
-        ax.scatter([black_coords[1]], [black_coords[0]], color='black', s=150, transform=ccrs.PlateCarree(), zorder=6)
-    ax.set_title("DDOS Availability Map", fontsize=16)
-    red_patch = mpatches.Patch(color='red', label='Inaccessible locations')
-    black_patch = mpatches.Patch(color='black', label='Targeted server')
-    ax.legend(handles=[black_patch, red_patch], loc='lower left', fontsize='small')
-    plt.savefig(output_filename, bbox_inches='tight', dpi=150)
-    plt.close()
+    attacked = attacked_country_coords(attacked_country)
+    ddos_map.render_static(set(node_country_coords(check_details).values()),
+                           attacked[1] if attacked else None, output_filename)
 
 def generate_ddos_map_animated(check_details, attacked_country, output_filename, frames=20, interval=200):
     """
     Generate an animated DDOS map as a GIF.
-    Rotates the world map by updating the central_longitude.
+    Rotates the world map by updating the central_longitude; the rotated base maps and
+    finished GIFs are cached by ddos_map.
     """
-    results = check_details.get("check_results", {})
-    red_coords = set()
-    for node in results.keys():
-        match = re.match(r"([a-zA-Z]+)", node)
-        if match:
-            code = match.group(1).lower()[:2]
-            coords = fallback_coords.get(code)
-            if coords:
-                red_coords.add(coords)
-    black_coords = None
-    if attacked_country:
-        try:
-            import pycountry
-            matches = pycountry.countries.search_fuzzy(attacked_country)
-            if matches:
-                country_code = matches[0].alpha_2.lower()
-                black_coords = fallback_coords.get(country_code)
-        except Exception as e:
-            logging.error(f"Error getting coordinates for attacked country '{attacked_country}': {e}")
-    fig = plt.figure(figsize=(12, 6))
-    ax = plt.axes(projection=ccrs.PlateCarree(central_longitude=0))
-    ax.set_global()
-    ax.add_feature(cfeature.LAND, facecolor='lightgray')
-    ax.add_feature(cfeature.OCEAN, facecolor='aliceblue')
-    ax.add_feature(cfeature.BORDERS, linestyle='-', edgecolor='gray')
-    ax.coastlines()
-    title = ax.set_title("DDOS Availability Map", fontsize=16)
-
-    def update(frame):
-        angle = -180 + (360.0/frames)*frame
-        ax.clear()
-        proj = ccrs.PlateCarree(central_longitude=angle)
-        ax.set_global()
-        ax.set_projection(proj)
-        ax.add_feature(cfeature.LAND, facecolor='lightgray')
-        ax.add_feature(cfeature.OCEAN, facecolor='aliceblue')
-        ax.add_feature(cfeature.BORDERS, linestyle='-', edgecolor='gray')
-        ax.coastlines()
-        if red_coords:
-            ax.scatter(*zip(*red_coords), color='red', s=100, transform=ccrs.PlateCarree(), zorder=5)
-        if black_coords:
-            ax.scatter([black_coords[1]], [black_coords[0]], color='black', s=150, transform=ccrs.PlateCarree(), zorder=6)
-        ax.set_title(f"DDOS Availability Map\nCentral Longitude: {angle:.0f}°", fontsize=16)
-        red_patch = mpatches.Patch(color='red', label='Inaccessible locations')
-        black_patch = mpatches.Patch(color='black', label='Targeted server')
-        ax.legend(handles=[black_patch, red_patch], loc='lower left', fontsize='small')
-
-    anim = animation.FuncAnimation(fig, update, frames=frames, interval=interval)
-    anim.save(output_filename, writer='pillow', dpi=150)
-    plt.close()
+    ddos_map.render_animated(node_country_coords(check_details), attacked_country_coords(attacked_country),
+                             output_filename, frames=frames, interval=interval)
 
 def generate_timeline_png_from_json(json_file, output_path):
     """
     Generate a timeline chart PNG from a check-host JSON export.
     Reads the JSON file, extracts each object's first_scan and last_scan,
     and uses that to build a timeline DataFrame for plotting.
+    NDJSON exports (header line, then one scan per line) are read line by line.
     """
     try:
         with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+            if json_file.endswith(".ndjson"):
+                data = json.loads(f.readline())
+                data["local_ids"] = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
     except Exception as e:
         logging.error(f"Error loading JSON file {json_file}: {e}")
         return
@@ -191,22 +98,39 @@ def generate_timeline_png_from_json(json_file, output_path):
                 "start": int(start_dt.timestamp() * 1000),
                 "end": int(end_dt.timestamp() * 1000)
             })
-    
-    import pandas as pd
-    if not timeline_data:
-        df = pd.DataFrame([], columns=["host", "status", "start", "end"])
-    else:
-        df = pd.DataFrame(timeline_data)
-        df['start'] = pd.to_datetime(df['start'], unit='ms')
-        df['end'] = pd.to_datetime(df['end'], unit='ms')
-    
-    fig = px.timeline(df, x_start="start", x_end="end", y="host", color="status")
-    fig.update_yaxes(autorange="reversed")
-    fig.write_image(output_path)
-    logging.info(f"Timeline PNG generated from JSON at {output_path}")
+
+    charts_module.generate_timeline(timeline_data, output_path)
+
+# Seconds between two check-host scans of a host that still count as one timeline segment.
+# Scans are point-in-time (first_scan == last_scan) and minutes apart (scheduled CI runs drift
+# well past their 5-minute cron), so a longer gap means monitoring actually stopped.
+TIMELINE_MERGE_GAP = int(os.getenv("TIMELINE_MERGE_GAP", "3600"))
+
+# Files a scan's details directory must contain for it to count as generated
+# (chart extensions follow the configured chart backends).
+DETAIL_ARTIFACTS = (charts_module.chart_filename("timeline"), charts_module.chart_filename("pie"),
+                    "report.json", "details.html")
+
+
+def scan_fingerprint(scan_record, timeline_data):
+    """
+    Fingerprint of the inputs a scan's detail artifacts are rendered from: the scan row
+    (counters, status, last_scan_time, ...) and its timeline segments. The progress
+    column is left out because it moves with the clock alone.
+    """
+    payload = json.dumps([list(scan_record[:10]), timeline_data], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def generate_timeline_png(timeline_data, output_path):
+    """Generate a timeline chart from timeline segments (a dict or a list of dicts, or None);
+    SVG or Plotly PNG depending on the extension of output_path."""
+    charts_module.generate_timeline(timeline_data, output_path)
+
 
 class Reports:
-    def __init__(self, db_path=None, archive_path=None, output_path=None, details_dir=None, debug=False):
+    def __init__(self, db_path=None, archive_path=None, output_path=None, details_dir=None, checkhost_path=None,
+                 debug=False):
         """Initialize the report generation class with database paths.
         By default, the details directory is set to '/tmp/details'.
         """
@@ -216,74 +140,74 @@ class Reports:
         self.archive_path = archive_path if archive_path else os.path.join(script_dir, "..", "data", "archive.db")
         self.output_path = output_path if output_path else os.path.join(script_dir, "..", "report.html")
         self.details_dir = details_dir if details_dir else os.path.join("/tmp", "details")
+        self.checkhost_path = checkhost_path if checkhost_path else os.path.join(script_dir, "..", "data", "checkhost.db")
+        # Row updates queued while details are generated; written in one transaction per DB by flush_updates().
+        self._details_updates = {}
+        self._archived_ids = []
+        # Detail directories (re)generated by the current generate() call.
+        self.regenerated = 0
+        # Chart jobs of the current generate() call; None renders immediately. The pool (and its
+        # warm worker processes) is kept across generate() calls until close().
+        self._render_pool = None
+        self._pool = None
+        self.render_timings = []
+        # (db_file, scan id) of the scan whose details are being written, the scans behind each
+        # render job label, and the scans with a failed job (their fingerprint is not recorded).
+        self._current_scan = None
+        self._job_scans = {}
+        self._failed_scans = set()
+        # Set in backfill workers (main.py --regenerate): re-render every artifact of a scan.
+        self.regenerate_mode = False
         logging.info("Reports initialized with db_path=%s, archive_path=%s, output_path=%s, details_dir=%s",
                      self.db_path, self.archive_path, self.output_path, self.details_dir)
 
-    def fetch_scans_to_regenerate(self, days=7):
+    def fetch_scans_to_regenerate(self, days=7, since=None, until=None):
+        """
+        Archived scans whose last_scan_time falls in [since, until] ("YYYY-MM-DD[ HH:MM:SS]";
+        a bare `until` date includes that whole day). Without `since`, the last `days` days.
+        """
         results = []
         try:
-            conn = sqlite3.connect(self.archive_path)
-            cursor = conn.cursor()
-            cutoff = datetime.now() - timedelta(days=days)
-            cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute(f"""
+            since = since if since else (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            until = until if until else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if len(until) == 10:
+                until += " 23:59:59"
+            results = db.query(self.archive_path, """
                 SELECT id, start_time, status, domain, total_scans, successful_scans, failed_scans,
                        last_scan_time, details, duration, details_path
                 FROM scans
-                WHERE last_scan_time >= ?
-                ORDER BY last_scan_time DESC
-            """, (cutoff_str,))
-            results = cursor.fetchall()
-            conn.close()
-            logging.info("Fetched %d archived scans to regenerate (last %d days).", len(results), days)
+                WHERE last_scan_time >= ? AND last_scan_time <= ?
+                ORDER BY last_scan_time DESC, id
+            """, (since, until))
+            logging.info("Fetched %d archived scans to regenerate (%s .. %s).", len(results), since, until)
         except Exception as e:
             logging.error("Failed to fetch scans to regenerate: %s", e)
         return results
 
     def load_template(self, template_name="report_template.html"):
-        template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates", template_name)
+        """Compiled template from templates/ via the shared environment (compiled once per process)."""
         try:
-            with open(template_path, "r", encoding="utf-8") as f:
-                template_content = f.read()
-            return Template(template_content)
+            return templating.get_template(template_name)
         except Exception as e:
-            logging.error("Failed to load template from %s: %s", template_path, e)
+            logging.error("Failed to load template %s from %s: %s", template_name, templating.TEMPLATE_DIR, e)
             raise
 
     def check_and_update_schema(self, db_file):
         try:
-            conn = sqlite3.connect(db_file)
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(scans)")
-            columns = [row[1] for row in cursor.fetchall()]
-            if 'details_path' not in columns:
-                cursor.execute("ALTER TABLE scans ADD COLUMN details_path TEXT")
-                logging.info("Added 'details_path' column to %s", db_file)
-            if 'generated_report' not in columns:
-                cursor.execute("ALTER TABLE scans ADD COLUMN generated_report TEXT DEFAULT 'no'")
-                logging.info("Added 'generated_report' column to %s", db_file)
-            if 'archived' not in columns:
-                cursor.execute("ALTER TABLE scans ADD COLUMN archived INTEGER DEFAULT 0")
-                logging.info("Added 'archived' column to %s", db_file)
-            conn.commit()
-            conn.close()
+            migrations.migrate(db_file, "data")
         except Exception as e:
             logging.error("Failed to update schema for %s: %s", db_file, e)
 
     def fetch_latest_results(self):
         results = []
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
+            results = db.query(self.db_path, """
                 SELECT id, start_time, status, domain, total_scans, successful_scans, failed_scans, 
                        last_scan_time, details, duration, details_path
                 FROM scans
                 WHERE finished = 0
                 ORDER BY last_scan_time DESC
             """)
-            results = cursor.fetchall()
-            conn.close()
         except Exception as e:
             logging.error("Failed to fetch latest results: %s", e)
         return results
@@ -291,17 +215,13 @@ class Reports:
     def fetch_latest_completed_scans(self):
         results = []
         try:
-            conn = sqlite3.connect(self.archive_path)
-            cursor = conn.cursor()
-            cursor.execute("""
+            results = db.query(self.archive_path, """
                 SELECT id, start_time, status, domain, total_scans, successful_scans, failed_scans, 
                        last_scan_time, details, duration, details_path
                 FROM scans                
                 ORDER BY last_scan_time DESC
                 LIMIT 10
             """)
-            results = cursor.fetchall()
-            conn.close()
         except Exception as e:
             logging.error("Failed to fetch latest completed scans: %s", e)
         return results
@@ -316,44 +236,74 @@ class Reports:
         except Exception:
             return "N/A"
 
-    def fetch_timeline_data_from_checkhost(self):
-        timeline_data = []
+    def fetch_timeline_by_host(self):
+        """
+        Timeline segments per domain from checkhost.db scan_meta, aggregated in SQL:
+        {domain: [{"host", "status", "start", "end"}, ...]} ordered by start (ms since epoch).
+        Consecutive scans with the same status are merged into one segment (gaps-and-islands)
+        unless more than TIMELINE_MERGE_GAP seconds lie between them; a longer gap or a
+        status change starts a new segment.
+        """
+        timeline = {}
         try:
-            checkhost_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "checkhost.db")
-            conn = sqlite3.connect(checkhost_db)
-            cursor = conn.cursor()
-            cursor.execute("SELECT domain, first_scan, last_scan, summary_up, summary_down FROM scan_meta")
-            rows = cursor.fetchall()
-            conn.close()
-            for row in rows:
-                domain, first_scan, last_scan, summary_up, summary_down = row
-                if first_scan and last_scan:
-                    start_dt = datetime.strptime(first_scan, "%Y-%m-%d %H:%M:%S")
-                    end_dt = datetime.strptime(last_scan, "%Y-%m-%d %H:%M:%S")
-                    status = "Up" if summary_up >= summary_down else "Down"
-                    timeline_data.append({
-                        "host": domain,
-                        "status": status,
-                        "start": int(start_dt.timestamp() * 1000),
-                        "end": int(end_dt.timestamp() * 1000)
-                    })
+            migrations.migrate(self.checkhost_path, "checkhost")
+            rows = db.query(self.checkhost_path, """
+                WITH spans AS (
+                    SELECT domain, first_scan, last_scan,
+                           CASE WHEN summary_up >= summary_down THEN 'Up' ELSE 'Down' END AS status
+                    FROM scan_meta
+                    WHERE first_scan IS NOT NULL AND last_scan IS NOT NULL
+                ), neighbours AS (
+                    SELECT *,
+                           MAX(last_scan) OVER (PARTITION BY domain ORDER BY first_scan, last_scan
+                                                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS prev_end,
+                           LAG(status) OVER (PARTITION BY domain ORDER BY first_scan, last_scan) AS prev_status
+                    FROM spans
+                ), islands AS (
+                    SELECT *,
+                           SUM(CASE WHEN prev_end IS NULL OR first_scan > datetime(prev_end, ?) OR status <> prev_status
+                                    THEN 1 ELSE 0 END)
+                               OVER (PARTITION BY domain ORDER BY first_scan, last_scan ROWS UNBOUNDED PRECEDING) AS island
+                    FROM neighbours
+                )
+                -- scan_meta times are local time, like the former datetime.strptime(...).timestamp().
+                SELECT domain, status,
+                       CAST(strftime('%s', MIN(first_scan), 'utc') AS INTEGER) * 1000,
+                       CAST(strftime('%s', MAX(last_scan), 'utc') AS INTEGER) * 1000
+                FROM islands
+                GROUP BY domain, island
+                ORDER BY domain, MIN(first_scan)
+            """, (f"+{TIMELINE_MERGE_GAP} seconds",))
+            for domain, status, start, end in rows:
+                if start is None or end is None:
+                    continue
+                timeline.setdefault(domain, []).append({"host": domain, "status": status, "start": start, "end": end})
         except Exception as e:
             logging.error("Failed to fetch timeline data from checkhost.db: %s", e)
-        return timeline_data
+        return timeline
+
+    def fetch_timeline_data_from_checkhost(self):
+        """All timeline segments as one flat list (see fetch_timeline_by_host)."""
+        return [segment for segments in self.fetch_timeline_by_host().values() for segment in segments]
 
     def generate_timeline_png(self, domain, timeline_data, output_path):
-        if timeline_data is None:
-            df = pd.DataFrame([], columns=["host", "status", "start", "end"])
+        generate_timeline_png(timeline_data, output_path)
+
+    def render(self, chart, key, func, *args):
+        """
+        Queue a chart job (labelled "chart:key") on this run's render pool, or render it right
+        away outside generate(). Chart types whose backend is "svg" in charts_module.CHART_BACKENDS
+        take microseconds and are always rendered inline; Plotly PNGs and maps go to worker processes.
+        """
+        if self._render_pool is None:
+            func(*args)
+            return
+        label = f"{chart}:{key}"
+        self._job_scans.setdefault(label, set()).add(self._current_scan)
+        if charts_module.CHART_BACKENDS.get(chart) == "svg":
+            self._render_pool.run_inline(label, func, *args)
         else:
-            if isinstance(timeline_data, dict):
-                timeline_data = [timeline_data]
-            df = pd.DataFrame(timeline_data)
-            df['start'] = pd.to_datetime(df['start'], unit='ms')
-            df['end'] = pd.to_datetime(df['end'], unit='ms')
-        fig = px.timeline(df, x_start="start", x_end="end", y="host", color="status")
-        fig.update_yaxes(autorange="reversed")
-        fig.write_image(output_path)
-        logging.info("Timeline PNG generated at %s", output_path)
+            self._render_pool.submit(label, func, *args)
 
     def generate_details_html(self, dir_path, report_summary):
         try:
@@ -369,6 +319,9 @@ class Reports:
                 last_scan_time=report_summary.get("last_scan_time"),
                 duration=report_summary.get("duration"),
                 progress=report_summary.get("progress"),
+                timeline_chart=report_summary.get("timeline_chart"),
+                pie_chart=report_summary.get("pie_chart"),
+                sparkline_chart=report_summary.get("sparkline_chart"),
                 extra_json_files=report_summary.get("extra_json_files")
             )
             details_html_path = os.path.join(dir_path, "details.html")
@@ -378,30 +331,97 @@ class Reports:
         except Exception as e:
             logging.error("Failed to generate details HTML: %s", e)
     
-    def update_details_path_in_db(self, record_id, relative_path, db_file):
+    def fetch_fingerprints(self, db_file):
+        """{scan id: details_fingerprint} for the scans in `db_file`."""
         try:
-            conn = sqlite3.connect(db_file)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE scans SET details_path = ?, generated_report = 'yes' WHERE id = ?", (relative_path, record_id))
-            conn.commit()
-            conn.close()
-            logging.info("Updated details_path and generated_report for record %s in %s", record_id, db_file)
+            return dict(db.query(db_file, "SELECT id, details_fingerprint FROM scans WHERE details_fingerprint IS NOT NULL"))
         except Exception as e:
-            logging.error("Failed to update details_path for record %s in %s: %s", record_id, db_file, e)
-    
-    def mark_completed_as_archived(self, record_id):
+            logging.error("Failed to fetch detail fingerprints from %s: %s", db_file, e)
+            return {}
+
+    def details_dir_for(self, scan_record):
+        """Details directory of a scan (details/YYYY/MM/DD/domain), or None if start_time is unparsable."""
         try:
-            conn = sqlite3.connect(self.archive_path)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE scans SET archived = 1 WHERE id = ?", (record_id,))
-            conn.commit()
-            conn.close()
-            logging.info("Marked completed scan record %s as archived", record_id)
+            start_dt = datetime.strptime(scan_record[1], "%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None
+        return os.path.join(self.details_dir, start_dt.strftime("%Y"), start_dt.strftime("%m"),
+                            start_dt.strftime("%d"), scan_record[3])
+
+    def is_up_to_date(self, scan_record, fingerprint, known):
+        """True if the scan's artifacts were generated from the same inputs and are all still on disk."""
+        if self.regenerate_mode or known.get(scan_record[0]) != fingerprint:
+            return False
+        dir_path = self.details_dir_for(scan_record)
+        return dir_path is not None and all(os.path.exists(os.path.join(dir_path, name)) for name in DETAIL_ARTIFACTS)
+
+    def update_details_path_in_db(self, record_id, relative_path, db_file, fingerprint=None):
+        """Queue a details_path update; it is written by flush_updates()."""
+        self._details_updates.setdefault(db_file, []).append((relative_path, fingerprint, record_id))
+
+    def mark_completed_as_archived(self, record_id, fingerprint=None):
+        """Queue an archived flag update; it is written by flush_updates()."""
+        self._archived_ids.append((fingerprint, record_id))
+
+    def flush_updates(self):
+        """
+        Write all queued details_path / archived updates, one transaction per database.
+        Scans with a failed render job get no fingerprint, so the next run renders them again.
+        """
+        for db_file, rows in self._details_updates.items():
+            rows = [(path, (db_file, record_id) in self._failed_scans, fingerprint, record_id)
+                    for path, fingerprint, record_id in rows]
+            try:
+                with db.transaction(db_file) as conn:
+                    conn.executemany("""
+                        UPDATE scans SET details_path = ?,
+                                         details_fingerprint = CASE WHEN ? THEN NULL
+                                                               ELSE COALESCE(?, details_fingerprint) END,
+                                         generated_report = 'yes'
+                        WHERE id = ?""", rows)
+                logging.info("Updated details_path and generated_report for %d records in %s", len(rows), db_file)
+            except Exception as e:
+                logging.error("Failed to update details_path in %s: %s", db_file, e)
+        self._details_updates = {}
+        if self._archived_ids:
+            rows = [((self.archive_path, record_id) in self._failed_scans, fingerprint, record_id)
+                    for fingerprint, record_id in self._archived_ids]
+            try:
+                with db.transaction(self.archive_path) as conn:
+                    conn.executemany("""
+                        UPDATE scans SET archived = 1,
+                                         details_fingerprint = CASE WHEN ? THEN NULL
+                                                               ELSE COALESCE(?, details_fingerprint) END
+                        WHERE id = ?""", rows)
+                logging.info("Marked %d completed scan records as archived", len(self._archived_ids))
+            except Exception as e:
+                logging.error("Failed to mark records as archived: %s", e)
+            self._archived_ids = []
+        self._failed_scans = set()
+
+    def write_history(self, scan_id, dir_path, resolution="1h"):
+        """
+        Write the scan's rolled-up probe history (check_rollups) as history.json and queue a
+        sparkline of its up ratio. Returns (history file name, sparkline file name), or (None, None).
+        """
+        try:
+            buckets = TimeSeries(self.db_path, debug=self.debug).buckets(scan_id, resolution)
         except Exception as e:
-            logging.error("Failed to mark record %s as archived: %s", record_id, e)
+            logging.error("Failed to read probe history for scan %s: %s", scan_id, e)
+            return None, None
+        if not buckets:
+            return None, None
+        with open(os.path.join(dir_path, "history.json"), "w", encoding="utf-8") as f:
+            json.dump({"scan_id": scan_id, "resolution": resolution, "buckets": buckets}, f)
+        logging.info("Probe history (%d %s buckets) written for scan %s", len(buckets), resolution, scan_id)
+        up_ratio = [round(b["up"] / (b["up"] + b["down"]), 4) if b["up"] + b["down"] else None for b in buckets]
+        sparkline = charts_module.chart_filename("sparkline")
+        self.render("sparkline", scan_id, charts_module.generate_sparkline, up_ratio, os.path.join(dir_path, sparkline))
+        return "history.json", sparkline
 
-    def store_scan_details(self, scan_record, timeline_data):
+    def store_scan_details(self, scan_record, timeline_data, fingerprint=None):
         unique_id = scan_record[0]
+        self._current_scan = (self.db_path, unique_id)
         start_time_str = scan_record[1]
         domain = scan_record[3]
         try:
@@ -413,13 +433,13 @@ class Reports:
         dir_path = os.path.join(self.details_dir, start_dt.strftime("%Y"), start_dt.strftime("%m"), start_dt.strftime("%d"), domain)
         os.makedirs(dir_path, exist_ok=True)
         
-        timeline_png_path = os.path.join(dir_path, "timeline.png")
-        pie_chart_path = os.path.join(dir_path, "pie_chart.png")
+        timeline_png_path = os.path.join(dir_path, charts_module.chart_filename("timeline"))
+        pie_chart_path = os.path.join(dir_path, charts_module.chart_filename("pie"))
         json_path = os.path.join(dir_path, "report.json")
         uniq_id_path = os.path.join(dir_path, "uniq_id.txt")
         
         # For active scans we use the DB timeline data.
-        self.generate_timeline_png(domain, timeline_data, timeline_png_path)
+        self.render("timeline", domain, generate_timeline_png, timeline_data, timeline_png_path)
         
         total = scan_record[4]
         successful = scan_record[5]
@@ -431,9 +451,10 @@ class Reports:
             up_percentage = 0
             down_percentage = 0
         
-        charts_module.generate_pie_chart_plotly(up_percentage, down_percentage, pie_chart_path)
+        self.render("pie", domain, charts_module.generate_pie_chart, up_percentage, down_percentage, pie_chart_path)
         
         relative_path = os.path.relpath(dir_path, self.details_dir)
+        history_file, sparkline_file = self.write_history(unique_id, dir_path)
         
         report_summary = {
             "unique_id": unique_id,
@@ -447,7 +468,10 @@ class Reports:
             "details": scan_record[8],
             "duration": scan_record[9],
             "progress": scan_record[10],
-            "extra_json_files": []
+            "timeline_chart": os.path.basename(timeline_png_path),
+            "pie_chart": os.path.basename(pie_chart_path),
+            "sparkline_chart": sparkline_file,
+            "extra_json_files": [history_file] if history_file else []
         }
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(report_summary, f, indent=4)
@@ -461,12 +485,19 @@ class Reports:
             logging.info("Unique ID file already exists for %s", domain)
         
         self.generate_details_html(dir_path, report_summary)
-        self.update_details_path_in_db(unique_id, relative_path, self.db_path)
+        self.update_details_path_in_db(unique_id, relative_path, self.db_path, fingerprint)
+        self.regenerated += 1
 
-    def store_completed_scan_details(self, scan_record, timeline_data):
+    def store_completed_scan_details(self, scan_record, timeline_data, fingerprint=None, export=True):
+        """
+        Write a completed scan's details directory. With export=False (backfills) the scan's
+        check-host rows are left alone; either way an earlier export in the directory is reused
+        when there is nothing (left) to export.
+        """
         from checkhost import CheckHostClient
 
         unique_id = scan_record[0]
+        self._current_scan = (self.archive_path, unique_id)
         start_time_str = scan_record[1]
         domain = scan_record[3]
         try:
@@ -479,21 +510,27 @@ class Reports:
         os.makedirs(dir_path, exist_ok=True)
         
         # Instead of using DB timeline data, we now want to use the exported JSON.
-        timeline_png_path = os.path.join(dir_path, "timeline.png")
-        pie_chart_path = os.path.join(dir_path, "pie_chart.png")
+        timeline_png_path = os.path.join(dir_path, charts_module.chart_filename("timeline"))
+        pie_chart_path = os.path.join(dir_path, charts_module.chart_filename("pie"))
         json_path = os.path.join(dir_path, "report.json")
         uniq_id_path = os.path.join(dir_path, "uniq_id.txt")
 
         # For completed scans, generate timeline PNG from the exported JSON.
+        # The export also removes the rows from checkhost.db, so it runs once per scan.
         checkhost_json_path = os.path.join(dir_path, f"{domain}-checkhost.json")
-        exported_file = None
-        checkhost_client = CheckHostClient(debug=self.debug)
-        exported_file = checkhost_client.export_and_remove_domain_data(domain, checkhost_json_path)
+        if export:
+            checkhost_client = CheckHostClient(db_path=self.checkhost_path, debug=self.debug)
+            exported_file = checkhost_client.export_and_remove_domain_data(domain, checkhost_json_path)
+        else:
+            exported_file = None
+        if exported_file is None and os.path.exists(checkhost_json_path):
+            # Already exported by an earlier run (the rows are gone from checkhost.db).
+            exported_file = checkhost_json_path
         if exported_file:
-            generate_timeline_png_from_json(exported_file, timeline_png_path)
+            self.render("timeline", domain, generate_timeline_png_from_json, exported_file, timeline_png_path)
         else:
             # Fallback: use the DB timeline data
-            self.generate_timeline_png(domain, timeline_data, timeline_png_path)
+            self.render("timeline", domain, generate_timeline_png, timeline_data, timeline_png_path)
         
         total = scan_record[4]
         successful = scan_record[5]
@@ -505,8 +542,8 @@ class Reports:
             up_percentage = 0
             down_percentage = 0
         
-        if not os.path.exists(pie_chart_path):
-            charts_module.generate_pie_chart_plotly(up_percentage, down_percentage, pie_chart_path)
+        if self.regenerate_mode or not os.path.exists(pie_chart_path):
+            self.render("pie", domain, charts_module.generate_pie_chart, up_percentage, down_percentage, pie_chart_path)
         else:
             logging.info("Pie chart already exists for completed scan %s", domain)
         
@@ -528,10 +565,12 @@ class Reports:
         else:
             logging.warning("Source exports folder %s does not exist.", source_exports)
 
-        # Attempt to export check-host data; if found, append to extra_files.
-        exported_file = checkhost_client.export_and_remove_domain_data(domain, checkhost_json_path)
+        # If check-host data was exported above, list it with the extra files.
         if exported_file:
             extra_files.append(os.path.basename(exported_file))
+        history_file, sparkline_file = self.write_history(unique_id, dir_path)
+        if history_file:
+            extra_files.append(history_file)
         
         report_summary = {
             "unique_id": unique_id,
@@ -545,6 +584,9 @@ class Reports:
             "details": scan_record[8],
             "duration": scan_record[9],
             "progress": scan_record[10],
+            "timeline_chart": os.path.basename(timeline_png_path),
+            "pie_chart": os.path.basename(pie_chart_path),
+            "sparkline_chart": sparkline_file,
             "extra_json_files": extra_files,
             "check_details": scan_record[8] if isinstance(scan_record[8], dict) else None,
             "attacked_country": scan_record[8].get("attacked_country") if isinstance(scan_record[8], dict) and "attacked_country" in scan_record[8] else ""
@@ -563,19 +605,59 @@ class Reports:
         # --- DDOS Animated Map Generation Integration ---
         ddos_map_gif_path = os.path.join(dir_path, "ddos_map.gif")
         if report_summary.get("check_details"):
-            generate_ddos_map_animated(report_summary["check_details"],
-                                       report_summary.get("attacked_country", ""),
-                                       ddos_map_gif_path)
-            logging.info("Animated DDOS map generated at %s", ddos_map_gif_path)
+            self.render("ddos_map", domain, generate_ddos_map_animated, report_summary["check_details"],
+                        report_summary.get("attacked_country", ""), ddos_map_gif_path)
         else:
             logging.info("No check_details available; skipping animated DDOS map generation for %s", domain)
         
-        if not os.path.exists(os.path.join(dir_path, "details.html")):
+        if self.regenerate_mode or not os.path.exists(os.path.join(dir_path, "details.html")):
             self.generate_details_html(dir_path, report_summary)
         else:
             logging.info("Details HTML already exists for completed scan %s", domain)
         
-        self.mark_completed_as_archived(unique_id)
+        self.mark_completed_as_archived(unique_id, fingerprint)
+        self.regenerated += 1
+
+    def details_remote(self):
+        """Push / fetch URL of the details repo (OWNER / REPO2 with TOKEN), or None without credentials."""
+        owner = os.environ.get("OWNER")
+        token = os.environ.get("TOKEN")
+        repo2 = os.environ.get("REPO2")
+        if not owner or not token or not repo2:
+            return None
+        return f"https://{token}@github.com/{owner}/{repo2}.git"
+
+    def sync_details(self):
+        """
+        Check out the published details repo (branch master) into details_dir when the directory
+        has no history yet, as with the fresh /tmp/details of every CI run. A scan is only skipped
+        when its artifacts are on disk, so without this every run would regenerate (and
+        commit_changes would force-push) all of them. Returns True if details_dir has history.
+        """
+        details_dir = os.path.abspath(self.details_dir)
+        git = ["git", "-C", details_dir]
+        if os.path.exists(os.path.join(details_dir, ".git")) and subprocess.run(
+                [*git, "rev-parse", "--verify", "-q", "HEAD"], capture_output=True).returncode == 0:
+            return True
+        repo_url = self.details_remote()
+        if not repo_url:
+            logging.warning("Missing OWNER, TOKEN or REPO2; details in %s are regenerated from scratch.", details_dir)
+            return False
+        try:
+            os.makedirs(details_dir, exist_ok=True)
+            if not os.path.exists(os.path.join(details_dir, ".git")):
+                subprocess.run([*git, "init"], check=True)
+                subprocess.run([*git, "config", "user.name", "github-actions"], check=True)
+                subprocess.run([*git, "config", "user.email", "github-actions@github.com"], check=True)
+            remotes = subprocess.run([*git, "remote"], capture_output=True, text=True, check=True).stdout.split()
+            subprocess.run([*git, "remote", "set-url" if "origin" in remotes else "add", "origin", repo_url], check=True)
+            subprocess.run([*git, "fetch", "--depth", "1", "origin", "master"], check=True)
+            subprocess.run([*git, "checkout", "-B", "master", "FETCH_HEAD"], check=True)
+            logging.info("Checked out the published details into %s", details_dir)
+            return True
+        except subprocess.CalledProcessError as e:
+            logging.error("Failed to check out the published details into %s: %s", details_dir, e)
+            return False
 
     def commit_changes(self, commit_message="Update generated reports and details"):
         logging.info("Attempting to commit changes with commit_message='%s'", commit_message)
@@ -590,75 +672,112 @@ class Reports:
         if not repo2:
             logging.warning("Environment variable REPO2 is missing.")
         
-        if not os.path.exists(self.details_dir):
-            logging.warning("Details directory %s does not exist; creating it now.", self.details_dir)
+        details_dir = os.path.abspath(self.details_dir)
+        if not os.path.exists(details_dir):
+            logging.warning("Details directory %s does not exist; creating it now.", details_dir)
             try:
-                os.makedirs(self.details_dir, exist_ok=True)
+                os.makedirs(details_dir, exist_ok=True)
             except Exception as e:
-                logging.error("Failed to create details directory %s: %s", self.details_dir, e)
+                logging.error("Failed to create details directory %s: %s", details_dir, e)
                 return
         
         try:
-            os.chdir(self.details_dir)
-            logging.info("Changed directory to %s", self.details_dir)
-            if not os.path.exists(os.path.join(self.details_dir, ".git")):
-                logging.info("Initializing a new git repository in %s", self.details_dir)
-                subprocess.run(["git", "init"], check=True)
-                subprocess.run(["git", "config", "user.name", "github-actions"], check=True)
-                subprocess.run(["git", "config", "user.email", "github-actions@github.com"], check=True)
+            # git runs inside details_dir; the process working directory is left alone.
+            git = ["git", "-C", details_dir]
+            if not os.path.exists(os.path.join(details_dir, ".git")):
+                logging.info("Initializing a new git repository in %s", details_dir)
+                subprocess.run([*git, "init"], check=True)
+                subprocess.run([*git, "config", "user.name", "github-actions"], check=True)
+                subprocess.run([*git, "config", "user.email", "github-actions@github.com"], check=True)
     
-            result = subprocess.run(["git", "remote"], capture_output=True, text=True, check=True)
+            result = subprocess.run([*git, "remote"], capture_output=True, text=True, check=True)
             remotes = result.stdout.split()
             logging.info("Existing remotes in details repo: %s", remotes)
             
-            if not owner or not token:
-                logging.error("Missing OWNER or TOKEN environment variables. Aborting commit.")
+            repo_url = self.details_remote()
+            if not repo_url:
+                logging.error("Missing OWNER, TOKEN or REPO2 environment variables. Aborting commit.")
                 return
             
-            repo_url = f"https://{token}@github.com/{owner}/{repo2}.git"
             if "origin" in remotes:
                 logging.info("Setting remote origin URL to %s", repo_url)
-                subprocess.run(["git", "remote", "set-url", "origin", repo_url], check=True)
+                subprocess.run([*git, "remote", "set-url", "origin", repo_url], check=True)
             else:
                 logging.info("Adding remote origin with URL %s", repo_url)
-                subprocess.run(["git", "remote", "add", "origin", repo_url], check=True)
+                subprocess.run([*git, "remote", "add", "origin", repo_url], check=True)
             
-            if os.path.exists(os.path.join(self.details_dir, ".github")):
+            if os.path.exists(os.path.join(details_dir, ".github")):
                 logging.info(".github directory found, resetting it.")
-                subprocess.run(["git", "reset", ".github"], check=True)
+                subprocess.run([*git, "reset", ".github"], check=True)
             else:
-                logging.info(".github directory not found in %s; skipping reset.", self.details_dir)
+                logging.info(".github directory not found in %s; skipping reset.", details_dir)
             
-            subprocess.run(["git", "add", "."], check=True)
-            logging.info("Staged all files in %s", self.details_dir)
-            subprocess.run(["git", "commit", "-m", commit_message], check=True)
+            subprocess.run([*git, "add", "."], check=True)
+            logging.info("Staged all files in %s", details_dir)
+            subprocess.run([*git, "commit", "-m", commit_message], check=True)
             logging.info("Committed changes with message '%s'", commit_message)
-            subprocess.run(["git", "push", "--force", "origin", "master"], check=True)
+            subprocess.run([*git, "push", "--force", "origin", "master"], check=True)
             logging.info("Force-pushed changes to origin/master.")
         except subprocess.CalledProcessError as e:
             logging.error("Failed to commit changes: %s", e)
 
+    def close(self):
+        """Stop the render pool's worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
     def generate(self):
         self.check_and_update_schema(self.db_path)
         self.check_and_update_schema(self.archive_path)
+        self.sync_details()
         
         active_scans = self.fetch_latest_results()
         completed_scans = self.fetch_latest_completed_scans()
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        timeline_data_all = self.fetch_timeline_data_from_checkhost()
-        timeline_data_json = json.dumps(timeline_data_all)
+        # {domain: [segments]}: one dict lookup per scan below.
+        timeline_by_host = self.fetch_timeline_by_host()
+        timeline_data_json = json.dumps([segment for segments in timeline_by_host.values() for segment in segments])
         
         active_scans_with_progress = [list(row) + [self.calculate_progress(row[1], row[9])] for row in active_scans]
         completed_scans_with_progress = [list(row) + [self.calculate_progress(row[1], row[9])] for row in completed_scans]
         
+        # Only scans whose inputs changed since their artifacts were rendered are regenerated.
+        # Their charts are collected and rendered together in a process pool below.
+        self.regenerated = 0
+        if self._pool is None:
+            self._pool = RenderPool(debug=self.debug)
+        self._pool.timings = []
+        self._render_pool = self._pool
+        self._job_scans = {}
+        active_fingerprints = self.fetch_fingerprints(self.db_path)
         for scan in active_scans_with_progress:
-            td = next((item for item in timeline_data_all if item["host"] == scan[3]), None)
-            self.store_scan_details(scan, td)
-        
+            td = timeline_by_host.get(scan[3])
+            fingerprint = scan_fingerprint(scan, td)
+            if not self.is_up_to_date(scan, fingerprint, active_fingerprints):
+                self.store_scan_details(scan, td, fingerprint)
+
+        # Completed scans no longer change; their timeline comes from the one-time check-host export.
+        completed_fingerprints = self.fetch_fingerprints(self.archive_path)
         for scan in completed_scans_with_progress:
-            td = next((item for item in timeline_data_all if item["host"] == scan[3]), None)
-            self.store_completed_scan_details(scan, td)
+            fingerprint = scan_fingerprint(scan, None)
+            if not self.is_up_to_date(scan, fingerprint, completed_fingerprints):
+                self.store_completed_scan_details(scan, timeline_by_host.get(scan[3]), fingerprint)
+        try:
+            self._render_pool.run()
+        finally:
+            self.render_timings = self._render_pool.timings
+            self._render_pool = None
+            self._current_scan = None
+        self._failed_scans = {scan for label, _, error in self.render_timings if error
+                              for scan in self._job_scans.get(label, ())}
+        if self._failed_scans:
+            logging.warning("Render jobs failed for %d scans; they will be regenerated on the next run.",
+                            len(self._failed_scans))
+        logging.info("Detail artifacts regenerated for %d of %d scans.", self.regenerated,
+                     len(active_scans_with_progress) + len(completed_scans_with_progress))
+        self.flush_updates()
         
         template = self.load_template()  # loads report_template.html by default
         html_content = template.render(
@@ -670,4 +789,7 @@ class Reports:
         with open(self.output_path, "w", encoding="utf-8") as f:
             f.write(html_content)
         logging.info("Main HTML report generated at %s", self.output_path)
-        self.commit_changes()
+        if self.regenerated:
+            self.commit_changes()
+        else:
+            logging.info("No detail artifacts changed; skipping details commit.")
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import socket
+import time
+
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 60
+
+
+class ResolveError(Exception):
+    """Raised when a host name does not resolve (possibly served from the negative cache)."""
+
+
+class Resolver:
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        """
+        Shared DNS cache for the probes (ProbeEngine) and Monitoring.check_host.
+        Successful lookups are kept for `ttl` seconds, failures for `negative_ttl` seconds.
+        getaddrinfo does not expose record TTLs, so both are fixed per resolver.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = {}
+        # Duration of the last uncached lookup per host, reported as the DNS phase of probes.
+        self.lookup_ms = {}
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0}
+
+    def _cached(self, host):
+        entry = self._cache.get(host)
+        if entry is None:
+            return None
+        expires_at, addresses, error = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[host]
+            return None
+        if addresses is None:
+            self.stats["negative_hits"] += 1
+            raise ResolveError(error)
+        self.stats["hits"] += 1
+        return addresses
+
+    def _store(self, host, infos=None, error=None):
+        now = time.monotonic()
+        if infos is None:
+            self._cache[host] = (now + self.negative_ttl, None, str(error))
+            return
+        addresses = []
+        for info in infos:
+            address = info[4][0]
+            if address not in addresses:
+                addresses.append(address)
+        self._cache[host] = (now + self.ttl, addresses, None)
+        return addresses
+
+    def resolve(self, host):
+        """Resolve a host synchronously. Returns a list of addresses or raises ResolveError."""
+        addresses = self._cached(host)
+        if addresses is not None:
+            return addresses
+        self.stats["misses"] += 1
+        started = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self._store(host, error=e)
+            raise ResolveError(str(e)) from e
+        finally:
+            self.lookup_ms[host] = round((time.perf_counter() - started) * 1000, 2)
+        return self._store(host, infos)
+
+    async def resolve_async(self, host):
+        """Resolve a host on the running event loop. Returns a list of addresses or raises ResolveError."""
+        addresses = self._cached(host)
+        if addresses is not None:
+            return addresses
+        self.stats["misses"] += 1
+        started = time.perf_counter()
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self._store(host, error=e)
+            raise ResolveError(str(e)) from e
+        finally:
+            self.lookup_ms[host] = round((time.perf_counter() - started) * 1000, 2)
+        return self._store(host, infos)
+
+    async def resolve_all(self, hosts):
+        """Resolve every host in parallel and warm the cache. Returns {host: addresses or None}."""
+        unique_hosts = list(dict.fromkeys(hosts))
+
+        async def one(host):
+            try:
+                return await self.resolve_async(host)
+            except ResolveError as e:
+                logging.warning("DNS resolution failed for %s: %s", host, e)
+                return None
+
+        started = time.perf_counter()
+        resolved = await asyncio.gather(*(one(host) for host in unique_hosts))
+        logging.info("Resolved %d hosts in %.2fs (%s)", len(unique_hosts),
+                     time.perf_counter() - started, self.stats)
+        return dict(zip(unique_hosts, resolved))
+
+    @staticmethod
+    def first_ipv4(addresses):
+        return next((address for address in addresses if ":" not in address), None)
@@ -0,0 +1,156 @@
+import heapq
+import logging
+import random
+import signal
+import sqlite3
+import time
+from datetime import datetime
+
+DEFAULT_PROBE_INTERVAL = 300
+DEFAULT_REPORT_INTERVAL = 900
+DEFAULT_JITTER = 0.1
+# How often the scans table is polled for changes (a single PRAGMA, so this is cheap).
+RELOAD_CHECK_INTERVAL = 15
+# How often new probe history is rolled up and retention applied.
+ROLLUP_INTERVAL = 60
+# Hosts falling due within this window are probed together in one engine run.
+BATCH_WINDOW = 1.0
+
+
+class Scheduler:
+    def __init__(self, monitor, reports=None, index=None, probe_interval=DEFAULT_PROBE_INTERVAL,
+                 report_interval=DEFAULT_REPORT_INTERVAL, jitter=DEFAULT_JITTER, debug=False):
+        """
+        Long-running scheduler for daemon mode.
+        Keeps `monitor`, `reports` and `index` resident and probes every active host on
+        its own schedule. Each host starts at a random offset within one interval and is
+        rescheduled with +/- `jitter` (a fraction of the interval), so probes stay spread
+        out instead of firing together. Reports are regenerated every `report_interval`
+        seconds. Active hosts are reloaded only when the set of scans changes or a loaded
+        scan expires.
+        """
+        self.debug = debug
+        self.monitor = monitor
+        self.reports = reports
+        self.index = index
+        self.probe_interval = probe_interval
+        self.report_interval = report_interval
+        self.jitter = jitter
+        self._queue = []
+        # host -> due time of its live queue entry; queue entries that don't match are stale.
+        self._due = {}
+        self._running = False
+        self._watch_conn = sqlite3.connect(monitor.db_path)
+        self._data_version = None
+        self._scans_signature = None
+
+    def _scans_changed(self):
+        """
+        PRAGMA data_version on a resident connection is a free check for commits from
+        other connections. Probe status updates commit too, so on a bump we compare a
+        signature of the scan set (rows, ids, finished flags, durations) before reloading.
+        """
+        version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        signature = self._watch_conn.execute("""
+            SELECT COUNT(*), MAX(id), TOTAL(id * (finished + 1)), TOTAL(duration), MAX(start_time)
+            FROM scans
+        """).fetchone()
+        changed = signature != self._scans_signature
+        self._scans_signature = signature
+        return changed
+
+    def _next_delay(self):
+        spread = self.probe_interval * self.jitter
+        return max(1.0, self.probe_interval + random.uniform(-spread, spread))
+
+    def reload_hosts(self, force=False):
+        """Reload active hosts when the scans table changed or a scan is due to expire."""
+        expired = self.monitor.next_expiry is not None and datetime.now() >= self.monitor.next_expiry
+        if not (self._scans_changed() or force or expired):
+            return
+        hosts = self.monitor.load_active_hosts()
+        self.monitor.hosts = hosts
+        # Expired scans archived by the reload change the signature; absorb that here.
+        self._scans_changed()
+        now = time.monotonic()
+        added = [host for host in hosts if host not in self._due]
+        for host in added:
+            self._schedule(host, now + random.uniform(0, self.probe_interval))
+        # Removed hosts are dropped lazily when their entry comes off the queue.
+        for host in set(self._due) - set(hosts):
+            del self._due[host]
+        logging.info("Scheduler: %d active hosts (%d newly scheduled).", len(hosts), len(added))
+
+    def _schedule(self, host, due):
+        self._due[host] = due
+        heapq.heappush(self._queue, (due, host))
+
+    def run_due_probes(self):
+        """Probe every host that is due (plus any falling due within BATCH_WINDOW)."""
+        now = time.monotonic()
+        due = []
+        while self._queue and self._queue[0][0] <= now + BATCH_WINDOW:
+            due_at, host = heapq.heappop(self._queue)
+            if self._due.get(host) == due_at:
+                due.append(host)
+        if not due:
+            return
+        # check-host submission and polling run on the monitor's worker thread, not here.
+        self.monitor.probe_hosts(due, background=True)
+        now = time.monotonic()
+        for host in due:
+            if host in self._due:
+                self._schedule(host, now + self._next_delay())
+
+    def run_reports(self):
+        """Regenerate reports (unless probe-only) and publish whatever changed since the last cycle."""
+        if self.reports is None:
+            self.monitor.publish()
+            return
+        report_file = self.reports.generate()
+        if self.index is not None:
+            self.index.update(report_file, {"display_time": "N/A"})
+        self.monitor.publish([self.reports.output_path], "Update site data and report after monitoring")
+
+    def stop(self, *_):
+        logging.info("Scheduler: stop requested.")
+        self._running = False
+
+    def run_forever(self):
+        """Run until SIGINT/SIGTERM."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self._running = True
+        self.reload_hosts(force=True)
+        now = time.monotonic()
+        next_reload_check = now + RELOAD_CHECK_INTERVAL
+        next_report = now + self.report_interval
+        next_rollup = now + ROLLUP_INTERVAL
+        logging.info("Scheduler started: probe every %ss (jitter %.0f%%), reports every %ss.",
+                     self.probe_interval, self.jitter * 100, self.report_interval)
+        try:
+            while self._running:
+                self.run_due_probes()
+                now = time.monotonic()
+                if now >= next_reload_check:
+                    self.reload_hosts()
+                    next_reload_check = now + RELOAD_CHECK_INTERVAL
+                if now >= next_rollup:
+                    self.monitor.timeseries.maintain()
+                    next_rollup = now + ROLLUP_INTERVAL
+                if now >= next_report:
+                    self.run_reports()
+                    next_report = time.monotonic() + self.report_interval
+                wake_at = min(next_reload_check, next_report, next_rollup)
+                if self._queue:
+                    wake_at = min(wake_at, self._queue[0][0])
+                time.sleep(max(0.0, min(wake_at - time.monotonic(), RELOAD_CHECK_INTERVAL)))
+        finally:
+            self._watch_conn.close()
+            if self.reports:
+                self.reports.close()
+            self.monitor.close()
+            logging.info("Scheduler stopped.")
@@ -0,0 +1,51 @@
+"""
+Shared Jinja environment for everything that renders templates/ (reports, details pages,
+the index page).
+
+Templates are compiled once per process and kept in the environment's template cache;
+the compiled bytecode is also cached on disk (JINJA_CACHE_DIR, default: a per-user
+directory under the system temp dir), so a new process skips the parse/compile step too.
+Template files are not re-checked for changes on every lookup unless
+TEMPLATE_AUTO_RELOAD=1 (useful while editing templates). A long-running process would
+otherwise keep serving the templates it first loaded, so --daemon turns the check on
+(enable_auto_reload); one-shot runs load them fresh anyway.
+"""
+import os
+import threading
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates")
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR")
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "0") == "1"
+
+_environment = None
+_lock = threading.Lock()
+
+
+def get_environment():
+    """The process-wide Jinja Environment (created on first use)."""
+    global _environment
+    with _lock:
+        if _environment is None:
+            if JINJA_CACHE_DIR:
+                os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+            _environment = Environment(
+                loader=FileSystemLoader(TEMPLATE_DIR),
+                bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR) if JINJA_CACHE_DIR else FileSystemBytecodeCache(),
+                auto_reload=TEMPLATE_AUTO_RELOAD,
+            )
+        return _environment
+
+
+def get_template(name):
+    """Compiled template `name` from templates/ (compiled at most once per process)."""
+    return get_environment().get_template(name)
+
+
+def enable_auto_reload():
+    """Re-check template files on every lookup from now on (daemon mode)."""
+    global TEMPLATE_AUTO_RELOAD
+    with _lock:
+        TEMPLATE_AUTO_RELOAD = True
+        if _environment is not None:
+            _environment.auto_reload = True
@@ -0,0 +1,115 @@
+import logging
+import os
+import db
+
+# Rollup resolutions: name -> strftime pattern of the bucket start.
+RESOLUTIONS = {
+    "1m": "%Y-%m-%d %H:%M:00",
+    "1h": "%Y-%m-%d %H:00:00",
+    "1d": "%Y-%m-%d 00:00:00",
+}
+# Retention in days for raw checks and each rollup resolution (None keeps rows forever).
+RAW_RETENTION_DAYS = int(os.getenv("CHECKS_RETENTION_DAYS", "7"))
+ROLLUP_RETENTION_DAYS = {"1m": 7, "1h": 90, "1d": None}
+
+
+class TimeSeries:
+    def __init__(self, db_path, debug=False):
+        """
+        Append-only probe history in data.db.
+        Every probe result is appended to `checks`; rollup() folds new rows into
+        `check_rollups` (per scan, per 1m/1h/1d bucket: up/down counts and latency
+        sum/count/min/max) and advances a watermark so each raw row is aggregated once.
+        prune() drops raw rows and rollups past their retention; raw rows are only
+        pruned after they have been rolled up.
+        """
+        self.debug = debug
+        self.db_path = db_path
+
+    @staticmethod
+    def append(conn, results, check_time):
+        """
+        Append one `checks` row per probe result for every unfinished scan of the host.
+        Runs on the caller's connection so it shares the transaction of the status update.
+        """
+        conn.executemany("""
+            INSERT INTO checks (scan_id, result, response_time, check_time)
+            SELECT id, ?, ?, ? FROM scans WHERE domain = ? AND finished = 0
+        """, [(r["status"], (r.get("timings") or {}).get("total_ms"), check_time, r["host"]) for r in results])
+
+    def rollup(self):
+        """Aggregate checks added since the last rollup into every resolution. Returns rows consumed."""
+        try:
+            with db.transaction(self.db_path) as conn:
+                row = conn.execute("SELECT last_check_id FROM rollup_state WHERE name = 'checks'").fetchone()
+                watermark = row[0] if row else 0
+                high = conn.execute("SELECT MAX(id) FROM checks").fetchone()[0]
+                if high is None or high <= watermark:
+                    return 0
+                for resolution, pattern in RESOLUTIONS.items():
+                    conn.execute("""
+                        INSERT INTO check_rollups (scan_id, resolution, bucket, up_count, down_count,
+                                                   latency_sum, latency_count, latency_min, latency_max)
+                        SELECT scan_id, ?, strftime(?, check_time),
+                               SUM(result = 'Up'), SUM(result IS NOT 'Up'),
+                               TOTAL(response_time), COUNT(response_time), MIN(response_time), MAX(response_time)
+                        FROM checks
+                        WHERE id > ? AND id <= ?
+                        GROUP BY scan_id, strftime(?, check_time)
+                        ON CONFLICT(scan_id, resolution, bucket) DO UPDATE SET
+                            up_count = up_count + excluded.up_count,
+                            down_count = down_count + excluded.down_count,
+                            latency_sum = latency_sum + excluded.latency_sum,
+                            latency_count = latency_count + excluded.latency_count,
+                            latency_min = MIN(COALESCE(latency_min, excluded.latency_min), COALESCE(excluded.latency_min, latency_min)),
+                            latency_max = MAX(COALESCE(latency_max, excluded.latency_max), COALESCE(excluded.latency_max, latency_max))
+                    """, (resolution, pattern, watermark, high, pattern))
+                conn.execute("INSERT OR REPLACE INTO rollup_state (name, last_check_id) VALUES ('checks', ?)", (high,))
+            logging.debug("Rolled up checks %d..%d", watermark + 1, high)
+            return high - watermark
+        except Exception as e:
+            logging.error("Failed to roll up checks: %s", e)
+            return 0
+
+    def prune(self):
+        """Delete raw checks and rollups older than their retention."""
+        try:
+            with db.transaction(self.db_path) as conn:
+                raw = conn.execute("""
+                    DELETE FROM checks
+                    WHERE check_time < datetime('now', 'localtime', ?)
+                      AND id <= COALESCE((SELECT last_check_id FROM rollup_state WHERE name = 'checks'), 0)
+                """, (f"-{RAW_RETENTION_DAYS} days",)).rowcount
+                rollups = 0
+                for resolution, days in ROLLUP_RETENTION_DAYS.items():
+                    if days is None:
+                        continue
+                    rollups += conn.execute("""
+                        DELETE FROM check_rollups
+                        WHERE resolution = ? AND bucket < datetime('now', 'localtime', ?)
+                    """, (resolution, f"-{days} days")).rowcount
+            if raw or rollups:
+                logging.info("Pruned %d raw checks and %d rollup buckets past retention.", raw, rollups)
+        except Exception as e:
+            logging.error("Failed to prune checks: %s", e)
+
+    def maintain(self):
+        """Roll up new checks, then apply retention."""
+        self.rollup()
+        self.prune()
+
+    def buckets(self, scan_id, resolution="1h", since=None):
+        """Rollup buckets for one scan, oldest first, as dicts (latency_avg is None without latency samples)."""
+        sql = """
+            SELECT bucket, up_count, down_count, latency_sum, latency_count, latency_min, latency_max
+            FROM check_rollups WHERE scan_id = ? AND resolution = ?
+        """
+        params = [scan_id, resolution]
+        if since:
+            sql += " AND bucket >= ?"
+            params.append(since)
+        rows = db.query(self.db_path, sql + " ORDER BY bucket", params)
+        return [{"bucket": bucket, "up": up, "down": down,
+                 "latency_avg": round(total / count, 2) if count else None,
+                 "latency_min": low, "latency_max": high}
+                for bucket, up, down, total, count, low, high in rows]
@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# The scripts import each other by bare module name (they run from scripts/).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import checkhost  # noqa: E402
+import db  # noqa: E402
+import nodes  # noqa: E402
+from probe_engine import ProbeEngine  # noqa: E402
+
+
+@pytest.fixture
+def http_server():
+    """Start a local ThreadingHTTPServer for a handler class; returns its base URL."""
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def engine():
+    engine = ProbeEngine(concurrency=2, use_icmp_socket=False)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def client(request, tmp_path, monkeypatch):
+    """A CheckHostClient on a fresh checkhost.db; storage mode "normalized" unless parametrized (indirect)."""
+    monkeypatch.setattr(nodes, "_index", nodes.NodeIndex(path=str(tmp_path / "node_index.json")))
+    path = str(tmp_path / "checkhost.db")
+    client = checkhost.CheckHostClient(db_path=path, storage_mode=getattr(request, "param", "normalized"))
+    yield client
+    db.close(path)
@@ -0,0 +1,63 @@
+"""Moving expired scans from data.db to archive.db (Monitoring._archive_scans)."""
+from datetime import datetime
+
+import pytest
+
+import db
+import migrations
+from monitoring import Monitoring
+
+NOW = datetime(2026, 1, 2, 12, 0, 0)
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    # Only the two database paths are needed; skip probing / check-host setup.
+    monitor = Monitoring.__new__(Monitoring)
+    monitor.db_path = str(tmp_path / "data.db")
+    monitor.archive_path = str(tmp_path / "archive.db")
+    for path in (monitor.db_path, monitor.archive_path):
+        migrations.migrate(path, "data")
+    yield monitor
+    for path in (monitor.db_path, monitor.archive_path):
+        db.close(path)
+        migrations.forget(path)
+
+
+def add_scan(path, scan_id, domain, start_time="2026-01-01 00:00:00", status="Up"):
+    with db.transaction(path) as conn:
+        conn.execute("INSERT INTO scans (id, domain, duration, start_time, status) VALUES (?, ?, 1, ?, ?)",
+                     (scan_id, domain, start_time, status))
+
+
+def test_expired_scans_move_to_archive(monitor):
+    add_scan(monitor.db_path, 1, "old.example")
+    add_scan(monitor.db_path, 2, "new.example", start_time="2026-01-02 11:30:00")
+
+    assert monitor.archive_expired(NOW) == 1
+    assert db.query(monitor.db_path, "SELECT domain FROM scans") == [("new.example",)]
+    assert db.query(monitor.archive_path, "SELECT id, domain, finished FROM scans") == [(1, "old.example", 1)]
+
+
+def test_interrupted_move_is_completed_without_overwriting(monitor):
+    # A crash between the archive commit and the delete leaves the scan in both files.
+    add_scan(monitor.db_path, 1, "old.example", status="Down")
+    add_scan(monitor.archive_path, 1, "old.example", status="Up")
+
+    assert monitor.archive_expired(NOW) == 1
+    assert db.query(monitor.db_path, "SELECT COUNT(*) FROM scans") == [(0,)]
+    assert db.query(monitor.archive_path, "SELECT id, status FROM scans") == [(1, "Up")]
+
+
+def test_colliding_id_of_another_scan_moves_to_duplicates_once(monitor):
+    add_scan(monitor.db_path, 1, "old.example")
+    add_scan(monitor.archive_path, 1, "other.example", start_time="2025-12-01 00:00:00")
+
+    assert monitor.archive_expired(NOW) == 0
+    assert db.query(monitor.db_path, "SELECT COUNT(*) FROM scans") == [(0,)]
+    assert db.query(monitor.db_path, "SELECT domain, start_time FROM duplicates") == [
+        ("old.example", "2026-01-01 00:00:00")]
+    assert db.query(monitor.archive_path, "SELECT domain FROM scans") == [("other.example",)]
+    # Resolved: the next run has nothing left to report.
+    assert monitor.archive_expired(NOW) == 0
+    assert db.query(monitor.db_path, "SELECT COUNT(*) FROM duplicates") == [(1,)]
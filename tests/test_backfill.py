@@ -0,0 +1,51 @@
+"""Checkpointing of Backfill.run when a backfill is interrupted."""
+import pytest
+
+import backfill
+import db
+import migrations
+from reports_module import Reports
+
+
+@pytest.fixture
+def reports(tmp_path):
+    reports = Reports(db_path=str(tmp_path / "data.db"), archive_path=str(tmp_path / "archive.db"),
+                      output_path=str(tmp_path / "report.html"), details_dir=str(tmp_path / "details"),
+                      checkhost_path=str(tmp_path / "checkhost.db"))
+    # No details repo to check out.
+    reports.sync_details = lambda: False
+    migrations.migrate(reports.archive_path, "data")
+    with db.transaction(reports.archive_path) as conn:
+        conn.executemany("""
+            INSERT INTO scans (id, domain, duration, start_time, last_scan_time, finished)
+            VALUES (?, ?, 1, '2026-01-01 00:00:00', '2026-01-01 01:00:00', 1)
+        """, [(1, "a.example"), (2, "b.example"), (3, "c.example")])
+    yield reports
+    for path in (reports.db_path, reports.archive_path, reports.checkhost_path):
+        db.close(path)
+        migrations.forget(path)
+
+
+def test_each_finished_scan_is_checkpointed_before_the_next(reports, monkeypatch):
+    committed = {}
+
+    def fake_backfill_scan(scan):
+        # What a hard kill at this point would leave behind.
+        committed[scan[0]] = sorted(job.checkpoints())
+        if scan[0] == 3:
+            raise KeyboardInterrupt
+        return scan[0], backfill.scan_fingerprint(scan, None), 0.0, None
+
+    monkeypatch.setattr(backfill, "init_worker", lambda paths, debug: None)
+    monkeypatch.setattr(backfill, "backfill_scan", fake_backfill_scan)
+    job = backfill.Backfill(reports, workers=1)
+
+    # Ordered by last_scan_time DESC, id: scans 1 and 2 finish before 3 is interrupted.
+    with pytest.raises(KeyboardInterrupt):
+        job.run(since="2026-01-01", until="2026-01-01")
+    assert committed == {1: [], 2: [1], 3: [1, 2]}
+
+    monkeypatch.setattr(backfill, "backfill_scan",
+                        lambda scan: (scan[0], backfill.scan_fingerprint(scan, None), 0.0, None))
+    stats = job.run(since="2026-01-01", until="2026-01-01")
+    assert (stats["skipped"], stats["done"]) == (2, 1)
@@ -0,0 +1,76 @@
+"""Export / rebuild round trip of change-log segments (changelog.py)."""
+import os
+
+import pytest
+
+import changelog
+import db
+import migrations
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = str(tmp_path / "data.db")
+    migrations.migrate(path, "data")
+    log = changelog.ChangeLog(path, "data", segments_dir=str(tmp_path / "changelog"))
+    log.enable()
+    yield log
+    db.close(path)
+    db.close(path + ".rebuild")
+    migrations.forget(path)
+
+
+def insert_scan(path, domain):
+    with db.transaction(path) as conn:
+        return conn.execute("INSERT INTO scans (domain, duration) VALUES (?, 1)", (domain,)).lastrowid
+
+
+def test_rebuild_restores_rows(log):
+    insert_scan(log.db_path, "a.example")
+    insert_scan(log.db_path, "b.example")
+    log.export()
+    with db.transaction(log.db_path) as conn:
+        conn.execute("UPDATE scans SET status = 'Up' WHERE domain = 'a.example'")
+        conn.execute("DELETE FROM scans WHERE domain = 'b.example'")
+    log.export()
+
+    assert log.rebuild() == 2
+    assert db.query(log.db_path, "SELECT domain, status FROM scans") == [("a.example", "Up")]
+
+
+def test_rebuild_keeps_autoincrement_counters(log):
+    # Like archiving: the rows leave data.db before any segment has recorded them,
+    # their ids must stay used.
+    ids = [insert_scan(log.db_path, f"site{i}.example") for i in range(3)]
+    with db.transaction(log.db_path) as conn:
+        conn.execute("DELETE FROM scans")
+    log.export()
+
+    log.rebuild()
+    assert db.query(log.db_path, "SELECT COUNT(*) FROM scans") == [(0,)]
+    assert insert_scan(log.db_path, "next.example") == max(ids) + 1
+
+
+def test_compaction_replaces_older_segments_with_a_snapshot(log, monkeypatch):
+    monkeypatch.setattr(changelog, "COMPACT_SEGMENTS", 3)
+    for i in range(5):
+        insert_scan(log.db_path, f"site{i}.example")
+        log.export()
+    with db.transaction(log.db_path) as conn:
+        conn.execute("DELETE FROM scans WHERE domain = 'site0.example'")
+    log.export()
+
+    assert len(log._segments()) <= 3
+    log.rebuild()
+    assert db.query(log.db_path, "SELECT domain FROM scans ORDER BY id") == [
+        (f"site{i}.example",) for i in range(1, 5)
+    ]
+    assert insert_scan(log.db_path, "next.example") == 6
+
+
+def test_segments_of_overlapping_runs_get_distinct_names(log, monkeypatch):
+    monkeypatch.delenv("GITHUB_RUN_ID", raising=False)
+    first = log._segment_path(1)
+    second = log._segment_path(1)
+    assert first != second
+    assert log._segment_number(os.path.basename(first)) == 1
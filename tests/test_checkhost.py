@@ -0,0 +1,115 @@
+"""run_batch against a local stand-in for the check-host.net API (CHECKHOST_API)."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import checkhost
+import db
+
+NODES = {"de1.node.check-host.net": ["de", "Germany", "Frankfurt"],
+         "us1.node.check-host.net": ["us", "USA", "New York"]}
+INITIATE_DELAY = 0.2
+
+
+class StandIn:
+    """check-http / check-result endpoints; hosts named "slow*" never get an answer from us1."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.polls = {}
+
+    def initiate(self, host):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(INITIATE_DELAY)
+        with self.lock:
+            self.in_flight -= 1
+        return {"ok": 1, "request_id": f"req-{host}", "nodes": NODES}
+
+    def result(self, request_id):
+        with self.lock:
+            self.polls[request_id] = self.polls.get(request_id, 0) + 1
+            polls = self.polls[request_id]
+        answered = [[1, 0.12, "OK", "200", "203.0.113.1"]]
+        done = polls >= 2 and not request_id.startswith("req-slow")
+        return {"de1.node.check-host.net": answered, "us1.node.check-host.net": answered if done else None}
+
+
+@pytest.fixture
+def api(http_server, monkeypatch):
+    stand_in = StandIn()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/check-http":
+                body = stand_in.initiate(parse_qs(url.query)["host"][0])
+            elif url.path.startswith("/check-result/"):
+                body = stand_in.result(url.path.rsplit("/", 1)[1])
+            else:
+                self.send_error(404)
+                return
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setattr(checkhost, "CHECKHOST_API", http_server(Handler))
+    monkeypatch.setattr(checkhost, "POLL_INITIAL_DELAY", 0.05)
+    monkeypatch.setattr(checkhost, "POLL_MAX_DELAY", 0.1)
+    return stand_in
+
+
+@pytest.fixture(autouse=True)
+def unlimited(api, client):
+    # After `api`: the client reads CHECKHOST_API when it is created.
+    client.rate_limiter = checkhost.TokenBucket(0, 1)
+
+
+def test_run_batch_initiates_in_parallel_and_stores_results(api, client):
+    hosts = [f"site{i}.example" for i in range(4)]
+    started = time.monotonic()
+    initiated = client.run_batch(hosts, concurrency=4, deadline=5)
+    elapsed = time.monotonic() - started
+
+    assert sorted(initiated) == hosts
+    assert api.max_in_flight > 1
+    # Four sequential initiations alone would take 4 * INITIATE_DELAY.
+    assert elapsed < 4 * INITIATE_DELAY
+    meta = db.query(client.db_path, "SELECT domain, checkhost_id, summary_up, summary_down FROM scan_meta ORDER BY domain")
+    assert meta == [(host, f"req-{host}", 2, 0) for host in hosts]
+    rows = db.query(client.db_path, "SELECT call_type, COUNT(*) FROM scan_results GROUP BY call_type ORDER BY 1")
+    assert rows == [("initiate", 4), ("result", 4)]
+    assert db.query(client.db_path, "SELECT COUNT(*) FROM scan_nodes WHERE ok = 1") == [(8,)]
+
+
+def test_run_batch_keeps_partial_result_at_deadline(api, client):
+    started = time.monotonic()
+    initiated = client.run_batch(["slow.example", "fast.example"], concurrency=2, deadline=0.5)
+    elapsed = time.monotonic() - started
+
+    assert sorted(initiated) == ["fast.example", "slow.example"]
+    assert elapsed < INITIATE_DELAY + 0.5 + 0.5
+    assert api.polls["req-slow.example"] > api.polls["req-fast.example"]
+    slow_nodes = db.query(client.db_path, "SELECT node, ok FROM scan_nodes WHERE local_scan_id = ? ORDER BY node",
+                          (initiated["slow.example"],))
+    assert slow_nodes == [("de1", 1), ("us1", None)]
+    assert db.query(client.db_path, "SELECT COUNT(*) FROM scan_results WHERE call_type = 'result'") == [(2,)]
+
+
+def test_token_bucket_starts_with_at_least_one_token():
+    bucket = checkhost.TokenBucket(1, 0)
+    assert bucket.tokens == 1
+    assert bucket.acquire() == 0.0
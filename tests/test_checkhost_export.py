@@ -0,0 +1,49 @@
+"""Streaming export and removal of a domain's check-host rows (export_and_remove_domain_data)."""
+import json
+
+import pytest
+
+import db
+
+RESULT = {"de1.node.check-host.net": [[1, 0.12, "OK", "200", "203.0.113.1"]]}
+
+
+pytestmark = pytest.mark.parametrize("client", ["raw", "normalized"], indirect=True)
+
+
+@pytest.fixture(autouse=True)
+def scans(client):
+    for host in ("a.example", "a.example", "b.example"):
+        local_id = client.store_initiated([(host, {"request_id": f"req-{host}", "nodes": {}})])[host]
+        client.store_result(local_id, RESULT)
+
+
+def test_json_export_removes_only_the_domain(client, tmp_path):
+    output = str(tmp_path / "a.json")
+    assert client.export_and_remove_domain_data("a.example", output) == output
+
+    with open(output, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["domain"] == "a.example"
+    assert [scan["checkhost_id"] for scan in data["local_ids"]] == ["req-a.example", "req-a.example"]
+    for scan in data["local_ids"]:
+        assert [r["call_type"] for r in scan["scan_results"]] == ["initiate", "result"]
+        assert scan["scan_results"][1]["response"] == RESULT
+    assert db.query(client.db_path, "SELECT DISTINCT domain FROM scan_meta") == [("b.example",)]
+    assert db.query(client.db_path, "SELECT COUNT(*) FROM scan_results") == [(2,)]
+    # Nothing left to export the second time.
+    assert client.export_and_remove_domain_data("a.example", output) is None
+
+
+def test_ndjson_export_writes_one_line_per_scan(client, tmp_path):
+    output = str(tmp_path / "b.ndjson")
+    client.export_and_remove_domain_data("b.example", output, fmt="ndjson")
+
+    with open(output, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]["domain"] == "b.example"
+    assert len(lines) == 2
+    assert lines[1]["scan_results"][1]["response"] == RESULT
+    assert lines[1]["nodes"] == ([] if client.storage_mode == "raw" else
+                                 [{"node": "de1", "ok": 1, "latency": 0.12, "status_code": 200,
+                                   "address": "203.0.113.1"}])
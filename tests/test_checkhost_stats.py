@@ -0,0 +1,32 @@
+"""Per-scan node aggregates (checkhost.compute_node_stats)."""
+import checkhost
+
+
+def test_compute_node_stats():
+    rows = [("de1", 1, 0.1, 200, None), ("de2", 1, 0.3, 200, None), ("us1", 1, 0.2, 301, None),
+            ("us2", 0, 3.0, None, None), ("fr1", None, None, None, None)]
+    countries = {"de1.node.check-host.net": "DE", "de2.node.check-host.net": "DE",
+                 "us1.node.check-host.net": "US", "us2.node.check-host.net": "US", "fr1": "fr"}
+
+    assert checkhost.compute_node_stats(rows, countries) == {
+        "latency_min": 0.1,
+        "latency_median": 0.2,
+        "latency_p95": 0.3,
+        "latency_max": 0.3,
+        "status_counts": {"200": 2, "301": 1},
+        "country_up_ratio": {"de": 1.0, "fr": 0.0, "us": 0.5},
+    }
+
+
+def test_compute_node_stats_without_answers():
+    stats = checkhost.compute_node_stats([("de1", None, None, None, None)], {"de1": "de"})
+    assert (stats["latency_min"], stats["latency_median"], stats["latency_p95"], stats["latency_max"]) == \
+        (None, None, None, None)
+    assert stats["status_counts"] == {}
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 21))
+    assert checkhost._percentile(values, 50) == 10
+    assert checkhost._percentile(values, 95) == 19
+    assert checkhost._percentile([7], 95) == 7
@@ -0,0 +1,33 @@
+"""Normalized storage of check-host payloads (CHECKHOST_STORAGE=normalized)."""
+import checkhost
+import db
+
+RESULT = {
+    "de1.node.check-host.net": [[1, 0.12, "OK", "200", "203.0.113.1"]],
+    "us1.node.check-host.net": [[0, 3.0, "Connection timed out", None, None]],
+    "fr1.node.check-host.net": None,
+}
+
+
+def test_normalize_and_denormalize_round_trip():
+    rows = checkhost.normalize_result(RESULT)
+    assert sorted(rows) == [("de1", 1, 0.12, 200, "203.0.113.1"), ("fr1", None, None, None, None),
+                            ("us1", 0, 3.0, None, None)]
+    assert checkhost.denormalize_result(rows) == {
+        "de1.node.check-host.net": [[1, 0.12, None, "200", "203.0.113.1"]],
+        "us1.node.check-host.net": [[0, 3.0, None, None, None]],
+        "fr1.node.check-host.net": None,
+    }
+
+
+def test_normalized_mode_stores_node_rows_and_compressed_payload(client):
+    local_id = client.store_initiated([("a.example", {"request_id": "req-1", "nodes": {}})])["a.example"]
+    client.store_result(local_id, RESULT)
+
+    assert db.query(client.db_path, "SELECT node, ok, latency, status_code FROM scan_nodes ORDER BY node") == [
+        ("de1", 1, 0.12, 200), ("fr1", None, None, None), ("us1", 0, 3.0, None)]
+    ((response, blob),) = db.query(client.db_path,
+                                   "SELECT response, response_blob FROM scan_results WHERE call_type = 'result'")
+    assert response is None
+    assert checkhost.unpack_response(blob) == RESULT
+    assert client.process_scan(local_id) == (1, 2)
@@ -0,0 +1,57 @@
+"""Shared per-file connections and transactions (db.py)."""
+import os
+import threading
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "test.db")
+    with db.transaction(path) as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield path
+    db.close(path)
+
+
+def test_one_wal_connection_per_file(path, tmp_path):
+    conn = db.connect(path)
+    assert db.connect(str(tmp_path / "." / "test.db")) is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_transaction_rolls_back_on_error(path):
+    with pytest.raises(RuntimeError):
+        with db.transaction(path) as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('lost')")
+            raise RuntimeError("boom")
+    with db.transaction(path) as conn:
+        conn.execute("INSERT INTO items (name) VALUES ('kept')")
+    assert db.query(path, "SELECT name FROM items") == [("kept",)]
+
+
+def test_transactions_from_threads_are_serialized(path):
+    def writer(n):
+        for i in range(50):
+            with db.transaction(path) as conn:
+                count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+                conn.execute("INSERT INTO items (id, name) VALUES (?, ?)", (count + 1, f"{n}-{i}"))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # A read-then-write race would have reused an id and raised in some thread.
+    assert db.query(path, "SELECT COUNT(*), MAX(id) FROM items") == [(200, 200)]
+
+
+def test_close_folds_the_wal_into_the_file(path):
+    with db.transaction(path) as conn:
+        conn.execute("INSERT INTO items (name) VALUES ('a')")
+    db.close(path)
+    assert not os.path.exists(path + "-wal") or os.path.getsize(path + "-wal") == 0
+    # Reopened on the next use.
+    assert db.query(path, "SELECT name FROM items") == [("a",)]
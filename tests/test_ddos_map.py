@@ -0,0 +1,29 @@
+"""Least-recently-used cleanup of the DDoS map cache (ddos_map.prune_cache)."""
+import os
+
+import ddos_map
+
+
+def write(path, size, mtime):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_removes_least_recently_used_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(ddos_map, "MAP_CACHE_DIR", str(tmp_path))
+    for name, mtime in (("ddos_old.gif", 100), ("base_mid.png", 200), ("ddos_new.gif", 300)):
+        write(str(tmp_path / name), 10, mtime)
+    write(str(tmp_path / "ddos_other.gif.123.tmp"), 10, 50)
+
+    assert ddos_map.prune_cache(max_bytes=20) == 1
+    assert sorted(os.listdir(tmp_path)) == ["base_mid.png", "ddos_new.gif", "ddos_other.gif.123.tmp"]
+
+
+def test_prune_keeps_the_entry_just_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(ddos_map, "MAP_CACHE_DIR", str(tmp_path))
+    write(str(tmp_path / "ddos_new.gif"), 30, 100)
+    write(str(tmp_path / "base_old.png"), 10, 200)
+
+    assert ddos_map.prune_cache(keep=str(tmp_path / "ddos_new.gif"), max_bytes=20) == 1
+    assert os.listdir(tmp_path) == ["ddos_new.gif"]
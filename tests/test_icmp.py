@@ -0,0 +1,97 @@
+"""Echo reply parsing and request matching of the in-process ICMP prober (icmp.py)."""
+import asyncio
+import socket
+import struct
+
+import icmp
+from icmp import IcmpProber
+
+SOURCE = "192.0.2.1"
+
+
+class FakeSocket:
+    """Non-blocking ICMP socket stand-in: recvfrom() hands out the queued packets."""
+
+    def __init__(self, sock_type=socket.SOCK_DGRAM, port=4242):
+        self.type = sock_type
+        self.port = port
+        self.packets = []
+        self.closed = False
+
+    def getsockname(self):
+        return ("0.0.0.0", self.port)
+
+    def recvfrom(self, size):
+        if not self.packets:
+            raise BlockingIOError
+        return self.packets.pop(0), (SOURCE, 0)
+
+    def setblocking(self, flag):
+        pass
+
+    def fileno(self):
+        return -1
+
+    def close(self):
+        self.closed = True
+
+
+def echo(icmp_type, ident, seq, ip_header=False):
+    packet = struct.pack("!BBHHH", icmp_type, 0, 0, ident, seq) + b"check-it"
+    if ip_header:
+        packet = bytes([0x45]) + bytes(19) + packet
+    return packet
+
+
+def test_parse_reply():
+    assert IcmpProber.parse_reply(echo(icmp.ICMP_ECHO_REPLY, 7, 3)) == (7, 3)
+    assert IcmpProber.parse_reply(echo(icmp.ICMP_ECHO_REPLY, 7, 3, ip_header=True)) == (7, 3)
+    assert IcmpProber.parse_reply(echo(icmp.ICMP_ECHO_REQUEST, 7, 3)) is None
+    assert IcmpProber.parse_reply(b"\x00\x00") is None
+
+
+def test_reply_ident_follows_the_socket_kind(monkeypatch):
+    monkeypatch.setattr(icmp.platform, "system", lambda: "Linux")
+    assert IcmpProber(FakeSocket(port=4242))._reply_ident() == 4242
+    raw = IcmpProber(FakeSocket(socket.SOCK_RAW))
+    assert raw._reply_ident() == raw.ident
+    monkeypatch.setattr(icmp.platform, "system", lambda: "Darwin")
+    darwin = IcmpProber(FakeSocket(port=4242))
+    assert darwin._reply_ident() == darwin.ident
+
+
+def test_replies_resolve_only_their_own_request(monkeypatch):
+    monkeypatch.setattr(icmp.platform, "system", lambda: "Linux")
+    sock = FakeSocket(port=4242)
+    prober = IcmpProber(sock)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        mine, other = loop.create_future(), loop.create_future()
+        prober._pending[(4242, 1, SOURCE)] = mine
+        prober._pending[(4242, 2, SOURCE)] = other
+        sock.packets = [echo(icmp.ICMP_ECHO_REPLY, 9999, 2), echo(icmp.ICMP_ECHO_REPLY, 4242, 1, ip_header=True)]
+        prober._on_readable()
+        return mine.done(), other.done()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_open_falls_back_when_the_loop_cannot_watch_sockets(monkeypatch):
+    sock = FakeSocket()
+
+    async def scenario():
+        # Like the Proactor event loop on Windows.
+        def add_reader(*args):
+            raise NotImplementedError
+
+        monkeypatch.setattr(asyncio.get_running_loop(), "add_reader", add_reader)
+        # Patched only inside the running loop: the loop itself needs real sockets.
+        monkeypatch.setattr(icmp.socket, "socket", lambda *args: sock)
+        try:
+            return IcmpProber.open()
+        finally:
+            monkeypatch.undo()
+
+    assert asyncio.run(scenario()) is None
+    assert sock.closed
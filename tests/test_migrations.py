@@ -0,0 +1,67 @@
+"""Versioned schema migrations keyed off PRAGMA user_version (migrations.py)."""
+import sqlite3
+
+import pytest
+
+import db
+import migrations
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "data.db")
+    yield path
+    db.close(path)
+    migrations.forget(path)
+
+
+def user_version(path):
+    return db.query(path, "PRAGMA user_version")[0][0]
+
+
+def test_fresh_database_gets_every_step(path):
+    assert migrations.migrate(path, "data") == len(migrations.SCHEMAS["data"])
+    assert user_version(path) == len(migrations.SCHEMAS["data"])
+    indexes = {row[0] for row in db.query(path, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_scans_domain", "idx_scans_finished_last_scan", "idx_checks_check_time",
+            "idx_scans_last_scan_time"} <= indexes
+
+
+def test_unversioned_database_is_upgraded_in_place(path):
+    # A file created by the former setup_db.py: no user_version, scans without the later columns.
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE scans (id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT, protocol TEXT, "
+                 "duration INTEGER, finished INTEGER DEFAULT 0, start_time TIMESTAMP, last_scan_time TIMESTAMP)")
+    conn.execute("INSERT INTO scans (domain, duration) VALUES ('a.example', 2)")
+    conn.commit()
+    conn.close()
+
+    migrations.migrate(path, "data")
+    columns = {row[1] for row in db.query(path, "PRAGMA table_info(scans)")}
+    assert {"status", "total_scans", "details_fingerprint"} <= columns
+    assert db.query(path, "SELECT domain, duration, total_scans FROM scans") == [("a.example", 2, 0)]
+
+
+def test_failed_step_leaves_the_file_untouched(path, monkeypatch):
+    def create(conn):
+        conn.execute("CREATE TABLE first (id INTEGER)")
+
+    def fail(conn):
+        raise sqlite3.OperationalError("boom")
+
+    monkeypatch.setitem(migrations.SCHEMAS, "test", [create, fail])
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(path, "test")
+    assert user_version(path) == 0
+    assert db.query(path, "SELECT name FROM sqlite_master WHERE name = 'first'") == []
+
+    # Fixed and run again, every step is applied.
+    monkeypatch.setitem(migrations.SCHEMAS, "test", [create, lambda conn: None])
+    assert migrations.migrate(path, "test") == 2
+    assert user_version(path) == 2
+
+
+def test_current_database_is_checked_once_per_process(path, monkeypatch):
+    migrations.migrate(path, "data")
+    monkeypatch.setattr(db, "transaction", None)
+    assert migrations.migrate(path, "data") == len(migrations.SCHEMAS["data"])
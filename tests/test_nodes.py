@@ -0,0 +1,42 @@
+"""The persisted check-host node / country index (nodes.py)."""
+import sys
+import types
+
+import nodes
+from nodes import NodeIndex
+
+
+def test_learned_nodes_persist_across_instances(tmp_path):
+    path = str(tmp_path / "node_index.json")
+    index = NodeIndex(path=path)
+    index.learn({"uk1.node.check-host.net": "GB"})
+
+    reloaded = NodeIndex(path=path)
+    assert reloaded.node_country("uk1") == "gb"
+    assert reloaded.node_coords("uk1.node.check-host.net") == nodes.COUNTRY_COORDS["gb"]
+    # Unlearned nodes fall back to their name prefix.
+    assert reloaded.node_country("de4.node.check-host.net") == "de"
+
+
+def test_country_names_are_resolved_once(tmp_path, monkeypatch):
+    searches = []
+
+    def search_fuzzy(name):
+        searches.append(name)
+        if name == "Atlantis":
+            raise LookupError(name)
+        return [types.SimpleNamespace(alpha_2="RU")]
+
+    monkeypatch.setitem(sys.modules, "pycountry",
+                        types.SimpleNamespace(countries=types.SimpleNamespace(search_fuzzy=search_fuzzy)))
+    path = str(tmp_path / "node_index.json")
+    index = NodeIndex(path=path)
+
+    for _ in range(2):
+        assert index.resolve_country("Russian Federation") == "ru"
+        assert index.resolve_country("Atlantis") is None
+    assert searches == ["Russian Federation", "Atlantis"]
+    # Hits and misses are persisted, so a new process does not search again either.
+    assert NodeIndex(path=path).resolve_country("russian federation") == "ru"
+    assert NodeIndex(path=path).resolve_country("Atlantis") is None
+    assert len(searches) == 2
@@ -0,0 +1,32 @@
+"""Bounded, failure-isolated probe batches (ProbeEngine.run)."""
+import asyncio
+
+import pytest
+
+import probes
+from probes import Target
+
+
+def test_engine_bounds_concurrency_and_isolates_failures(engine, monkeypatch):
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    class SlowProbe:
+        def __init__(self, engine):
+            pass
+
+        async def probe(self, target, addresses):
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            await asyncio.sleep(0.05)
+            state["in_flight"] -= 1
+            if target.path == "/boom":
+                raise RuntimeError("probe crashed")
+            return "Up", "fine", {}
+
+    monkeypatch.setitem(probes.PROBES, "slow", SlowProbe)
+    targets = {f"h{i}": Target("127.0.0.1", "slow", None, "/boom" if i == 2 else "/") for i in range(5)}
+    results = engine.run(list(targets), targets)
+
+    assert state["max_in_flight"] == 2
+    assert [r["status"] for r in results] == ["Up", "Up", "Down", "Up", "Up"]
+    assert results[2]["details"] == "probe crashed"
@@ -0,0 +1,65 @@
+"""Probe targets and the HTTP probe (probes.py)."""
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import probes
+from probes import Target, parse_target
+
+
+@pytest.mark.parametrize("domain, protocol, url, expected", [
+    ("example.com", None, None, Target("example.com", "tcp", 80, "/")),
+    ("example.com", None, "https://example.com/health?full=1", Target("example.com", "https", 443, "/health?full=1")),
+    ("example.com", "http", "example.com:8080/status", Target("example.com", "http", 8080, "/status")),
+    ("example.com", "icmp", "https://example.com", Target("example.com", "icmp", None, "/")),
+    ("example.com", "gopher", None, Target("example.com", "tcp", 80, "/")),
+])
+def test_parse_target(domain, protocol, url, expected):
+    assert parse_target(domain, protocol, url) == expected
+
+
+@pytest.fixture
+def server(http_server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/chunked":
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self.wfile.write(b"5\r\nhello\r\n0\r\n\r\n")
+                return
+            body = b"fine"
+            self.send_response({"/error": 500, "/missing": 404}.get(self.path, 200))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return int(http_server(Handler).rsplit(":", 1)[1])
+
+
+def test_http_probe_parses_responses_and_reuses_connections(server, engine):
+    targets = {name: Target("127.0.0.1", "http", server, path)
+               for name, path in (("ok", "/ok"), ("chunked", "/chunked"), ("error", "/error"))}
+    first = engine.run(list(targets), targets)
+    second = engine.run(list(targets), targets)
+
+    for results in (first, second):
+        assert [(r["host"], r["status"]) for r in results] == [("ok", "Up"), ("chunked", "Up"), ("error", "Down")]
+    assert first[0]["details"].startswith("HTTP 200 OK, TTFB")
+    assert first[2]["details"].startswith("HTTP 500")
+    assert {"ttfb_ms", "total_ms"} <= set(first[0]["timings"])
+    # Every response was fully drained, so the second run goes over the pooled connections.
+    assert engine.http_pool.stats["reused"] >= 3
+
+
+def test_http_client_errors_count_as_down_unless_configured(server, engine, monkeypatch):
+    targets = {"missing": Target("127.0.0.1", "http", server, "/missing")}
+    assert [r["status"] for r in engine.run(list(targets), targets)] == ["Down"]
+
+    monkeypatch.setattr(probes, "HTTP_DOWN_STATUS", 500)
+    assert [r["status"] for r in engine.run(list(targets), targets)] == ["Up"]
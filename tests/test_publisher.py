@@ -0,0 +1,129 @@
+"""GitHubPublisher.publish against a local mock of the Git Data API."""
+import base64
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import publisher as publisher_module
+from publisher import GitHubPublisher
+
+PREFIX = "/repos/owner/repo/"
+
+
+class MockGitHub:
+    """Branch "main" at commit head1 / tree tree1; `remote` holds the tree's {path: blob sha}."""
+
+    def __init__(self):
+        self.requests = []
+        self.remote = {}
+
+    def handle(self, method, path, payload):
+        self.requests.append((method, path, payload))
+        if method == "GET" and path == "git/ref/heads/main":
+            return {"object": {"sha": "head1"}}
+        if method == "GET" and path == "git/commits/head1":
+            return {"tree": {"sha": "tree1"}}
+        if method == "GET" and path == "git/trees/tree1?recursive=1":
+            return {"tree": [{"path": p, "type": "blob", "sha": sha} for p, sha in self.remote.items()]}
+        if method == "POST" and path == "git/blobs":
+            return {"sha": "blob1"}
+        if method == "POST" and path == "git/trees":
+            return {"sha": "tree2"}
+        if method == "POST" and path == "git/commits":
+            return {"sha": "commit2"}
+        if method == "PATCH" and path == "git/refs/heads/main":
+            return {"ref": "refs/heads/main", "object": {"sha": payload["sha"]}}
+        return None
+
+
+@pytest.fixture
+def api(http_server):
+    mock = MockGitHub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length)) if length else None
+            body = mock.handle(self.command, self.path[len(PREFIX):], payload) \
+                if self.path.startswith(PREFIX) else None
+            if body is None:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _reply
+
+        def log_message(self, *args):
+            pass
+
+    mock.url = http_server(Handler)
+    return mock
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "report.html").write_bytes(b"<html>report</html>")
+    return tmp_path
+
+
+def publisher_for(api, site):
+    return GitHubPublisher(token="token", owner="owner", repo="repo", branch="main", api_base=api.url,
+                           repo_root=str(site), manifest_path=str(site / "manifest.json"))
+
+
+def test_manifest_hit_sends_no_request(api, site):
+    publisher = publisher_for(api, site)
+    report = str(site / "report.html")
+    publisher.save_manifest({"report.html": publisher.file_digest(report)})
+
+    assert publisher.publish([report], "update") == {"files": 0, "bytes": 0, "commit": None}
+    assert api.requests == []
+
+
+def test_remote_blob_match_updates_manifest_without_upload(api, site):
+    publisher = publisher_for(api, site)
+    report = str(site / "report.html")
+    api.remote["report.html"] = GitHubPublisher.blob_id((site / "report.html").read_bytes())
+
+    assert publisher.publish([report], "update") == {"files": 0, "bytes": 0, "commit": None}
+    assert [method for method, _, _ in api.requests] == ["GET", "GET", "GET"]
+    assert publisher.load_manifest() == {"report.html": publisher.file_digest(report)}
+
+
+def test_changed_file_is_committed_once(api, site):
+    publisher = publisher_for(api, site)
+    report = str(site / "report.html")
+    api.remote["report.html"] = "0" * 40
+
+    assert publisher.publish([report], "update") == {"files": 1, "bytes": 19, "commit": "commit2"}
+    assert [(method, path) for method, path, _ in api.requests] == [
+        ("GET", "git/ref/heads/main"),
+        ("GET", "git/commits/head1"),
+        ("GET", "git/trees/tree1?recursive=1"),
+        ("POST", "git/blobs"),
+        ("POST", "git/trees"),
+        ("POST", "git/commits"),
+        ("PATCH", "git/refs/heads/main"),
+    ]
+    blob, tree, commit, ref = (payload for _, _, payload in api.requests[3:])
+    assert base64.b64decode(blob["content"]) == b"<html>report</html>"
+    assert tree == {"base_tree": "tree1",
+                    "tree": [{"path": "report.html", "mode": "100644", "type": "blob", "sha": "blob1"}]}
+    assert commit == {"message": "update", "tree": "tree2", "parents": ["head1"]}
+    assert ref == {"sha": "commit2"}
+    assert publisher.load_manifest() == {"report.html": publisher.file_digest(report)}
+
+
+def test_disabled_publisher_sends_no_request(api, site, monkeypatch):
+    monkeypatch.setattr(publisher_module, "ENABLED", False)
+    publisher = publisher_for(api, site)
+
+    assert publisher.publish([str(site / "report.html")], "update") == {"files": 0, "bytes": 0, "commit": None}
+    assert api.requests == []
+    assert publisher.load_manifest() == {}
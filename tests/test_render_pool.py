@@ -0,0 +1,32 @@
+"""Parallel chart rendering and per-job failure reporting (render_pool.py)."""
+import os
+
+import pytest
+
+import charts_module
+from render_pool import RenderPool
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_jobs_render_and_failures_stay_per_job(tmp_path, workers):
+    pool = RenderPool(workers=workers)
+    for name in ("a", "b"):
+        pool.submit(f"pie:{name}", charts_module.pie_chart_svg, 70, 30, str(tmp_path / f"{name}.svg"))
+    pool.submit("pie:missing", charts_module.pie_chart_svg, 70, 30, str(tmp_path / "no" / "such" / "dir.svg"))
+    try:
+        assert pool.run() == 1
+    finally:
+        pool.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["a.svg", "b.svg"]
+    assert [(label, error is None) for label, _, error in pool.timings] == [
+        ("pie:a", True), ("pie:b", True), ("pie:missing", False)]
+    assert pool.jobs == []
+
+
+def test_inline_jobs_are_timed_like_pool_jobs(tmp_path):
+    pool = RenderPool(workers=2)
+    assert pool.run_inline("pie:a", charts_module.pie_chart_svg, 50, 50, str(tmp_path / "a.svg"))
+    assert pool.run() == 0
+    assert [label for label, _, _ in pool.timings] == ["pie:a"]
+    assert pool._executor is None
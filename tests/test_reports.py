@@ -0,0 +1,112 @@
+"""Timeline aggregation of check-host scans, the details checkout and completed-scan details of Reports."""
+import json
+import os
+import subprocess
+from datetime import datetime
+
+import pytest
+
+import db
+import migrations
+from reports_module import Reports
+
+
+@pytest.fixture
+def reports(tmp_path):
+    reports = Reports(db_path=str(tmp_path / "data.db"), archive_path=str(tmp_path / "archive.db"),
+                      output_path=str(tmp_path / "report.html"), details_dir=str(tmp_path / "details"),
+                      checkhost_path=str(tmp_path / "checkhost.db"))
+    migrations.migrate(reports.checkhost_path, "checkhost")
+    yield reports
+    db.close(reports.checkhost_path)
+    migrations.forget(reports.checkhost_path)
+
+
+def add_scans(path, domain, scans):
+    """One point-in-time scan_meta row per (time, up, down), like the check-host client writes."""
+    with db.transaction(path) as conn:
+        conn.executemany("""
+            INSERT INTO scan_meta (domain, first_scan, last_scan, summary_up, summary_down)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(domain, when, when, up, down) for when, up, down in scans])
+
+
+def ms(when):
+    return int(datetime.strptime(when, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+
+def test_scans_minutes_apart_merge_per_status(reports):
+    # Spaced like the scheduled CI runs: one scan every ~20 minutes.
+    add_scans(reports.checkhost_path, "a.example", [
+        ("2026-01-01 10:00:00", 40, 2),
+        ("2026-01-01 10:20:00", 41, 1),
+        ("2026-01-01 10:45:00", 39, 3),
+        ("2026-01-01 11:05:00", 1, 45),
+        ("2026-01-01 11:25:00", 0, 47),
+        ("2026-01-01 11:50:00", 44, 0),
+    ])
+
+    assert reports.fetch_timeline_by_host() == {"a.example": [
+        {"host": "a.example", "status": "Up", "start": ms("2026-01-01 10:00:00"), "end": ms("2026-01-01 10:45:00")},
+        {"host": "a.example", "status": "Down", "start": ms("2026-01-01 11:05:00"), "end": ms("2026-01-01 11:25:00")},
+        {"host": "a.example", "status": "Up", "start": ms("2026-01-01 11:50:00"), "end": ms("2026-01-01 11:50:00")},
+    ]}
+
+
+def test_gap_longer_than_merge_window_splits_segment(reports):
+    add_scans(reports.checkhost_path, "a.example", [
+        ("2026-01-01 10:00:00", 40, 0),
+        ("2026-01-01 10:20:00", 40, 0),
+        ("2026-01-01 14:00:00", 40, 0),
+    ])
+    add_scans(reports.checkhost_path, "b.example", [("2026-01-01 10:10:00", 0, 40)])
+
+    timeline = reports.fetch_timeline_by_host()
+    assert [(s["start"], s["end"]) for s in timeline["a.example"]] == [
+        (ms("2026-01-01 10:00:00"), ms("2026-01-01 10:20:00")),
+        (ms("2026-01-01 14:00:00"), ms("2026-01-01 14:00:00")),
+    ]
+    assert [s["status"] for s in timeline["b.example"]] == ["Down"]
+
+
+def test_sync_details_checks_out_published_details(reports, tmp_path, monkeypatch):
+    remote = str(tmp_path / "remote.git")
+    source = str(tmp_path / "source")
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run([*git, "init", "-q", "--bare", remote], check=True)
+    os.makedirs(os.path.join(source, "2026", "01", "01", "a.example"))
+    with open(os.path.join(source, "2026", "01", "01", "a.example", "details.html"), "w") as f:
+        f.write("published")
+    subprocess.run([*git, "init", "-q", source], check=True)
+    subprocess.run([*git, "-C", source, "checkout", "-q", "-b", "master"], check=True)
+    subprocess.run([*git, "-C", source, "add", "."], check=True)
+    subprocess.run([*git, "-C", source, "commit", "-q", "-m", "publish"], check=True)
+    subprocess.run([*git, "-C", source, "push", "-q", remote, "master"], check=True)
+    monkeypatch.setattr(reports, "details_remote", lambda: remote)
+
+    assert reports.sync_details()
+    with open(os.path.join(reports.details_dir, "2026", "01", "01", "a.example", "details.html")) as f:
+        assert f.read() == "published"
+    # Once details_dir has history it is left alone.
+    monkeypatch.setattr(reports, "details_remote", lambda: None)
+    assert reports.sync_details()
+
+
+def test_completed_scan_reuses_earlier_checkhost_export(reports, monkeypatch):
+    # The rows were exported (and removed from checkhost.db) by an earlier run.
+    scan = (7, "2026-01-01 10:00:00", "Down", "a.example", 4, 3, 1, "2026-01-01 11:00:00", "", 60, 100)
+    dir_path = os.path.join(reports.details_dir, "2026", "01", "01", "a.example")
+    os.makedirs(dir_path)
+    with open(os.path.join(dir_path, "a.example-checkhost.json"), "w") as f:
+        f.write("{}")
+    rendered = []
+    monkeypatch.setattr(reports, "render", lambda chart, key, func, *args: rendered.append((chart, args[0])))
+    monkeypatch.setattr(reports, "write_history", lambda unique_id, path: (None, None))
+    monkeypatch.setattr(reports, "generate_details_html", lambda path, summary: None)
+    monkeypatch.setattr(reports, "update_details_path_in_db", lambda *args: None)
+
+    reports.store_completed_scan_details(scan, timeline_data=[], export=True)
+
+    assert rendered[0] == ("timeline", os.path.join(dir_path, "a.example-checkhost.json"))
+    with open(os.path.join(dir_path, "report.json")) as f:
+        assert "a.example-checkhost.json" in json.load(f)["extra_json_files"]
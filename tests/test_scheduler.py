@@ -0,0 +1,77 @@
+"""Daemon scheduling: the due-time heap and reloading hosts on scan changes (scheduler.py)."""
+import time
+
+import pytest
+
+import db
+import migrations
+from scheduler import Scheduler
+
+
+class FakeMonitor:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.next_expiry = None
+        self.hosts = []
+        self.loads = 0
+        self.probed = []
+
+    def load_active_hosts(self):
+        self.loads += 1
+        return [row[0] for row in db.query(self.db_path, "SELECT domain FROM scans WHERE finished = 0 ORDER BY id")]
+
+    def probe_hosts(self, hosts, background=False):
+        self.probed.append(sorted(hosts))
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    path = str(tmp_path / "data.db")
+    migrations.migrate(path, "data")
+    scheduler = Scheduler(FakeMonitor(path), probe_interval=60, jitter=0)
+    yield scheduler
+    scheduler._watch_conn.close()
+    db.close(path)
+    migrations.forget(path)
+
+
+def add_scan(path, domain):
+    with db.transaction(path) as conn:
+        conn.execute("INSERT INTO scans (domain, duration) VALUES (?, 24)", (domain,))
+
+
+def test_hosts_reload_only_when_the_scan_set_changes(scheduler):
+    monitor = scheduler.monitor
+    add_scan(monitor.db_path, "a.example")
+    scheduler.reload_hosts(force=True)
+    assert (monitor.loads, monitor.hosts) == (1, ["a.example"])
+
+    scheduler.reload_hosts()
+    # A probe status update commits but leaves the scan set alone.
+    with db.transaction(monitor.db_path) as conn:
+        conn.execute("UPDATE scans SET status = 'Up'")
+    scheduler.reload_hosts()
+    assert monitor.loads == 1
+
+    add_scan(monitor.db_path, "b.example")
+    scheduler.reload_hosts()
+    assert (monitor.loads, monitor.hosts) == (2, ["a.example", "b.example"])
+    assert set(scheduler._due) == {"a.example", "b.example"}
+
+
+def test_only_due_hosts_are_probed_and_then_rescheduled(scheduler):
+    now = time.monotonic()
+    scheduler._schedule("due.example", now - 1)
+    scheduler._schedule("later.example", now + 30)
+    scheduler._schedule("removed.example", now - 1)
+    # Rescheduled before it came due: the older heap entry is stale.
+    scheduler._schedule("moved.example", now - 1)
+    scheduler._schedule("moved.example", now + 30)
+    del scheduler._due["removed.example"]
+
+    scheduler.run_due_probes()
+
+    assert scheduler.monitor.probed == [["due.example"]]
+    assert scheduler._due["due.example"] >= now + 59
+    scheduler.run_due_probes()
+    assert scheduler.monitor.probed == [["due.example"]]
@@ -0,0 +1,30 @@
+"""The probe path does not import the plotting stack (lazy imports, see bench_startup.py)."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bench_startup
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(bench_startup.__file__))
+# Records every attempt to import a heavy module, so the check holds whether or not it is installed.
+PROBE = """
+import sys
+attempts = set()
+class Recorder:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in {heavy!r}:
+            attempts.add(name.split(".")[0])
+        return None
+sys.meta_path.insert(0, Recorder())
+import {module}
+print(" ".join(sorted(attempts)))
+"""
+
+
+@pytest.mark.parametrize("module", bench_startup.DEFAULT_MODULES)
+def test_entry_point_imports_no_heavy_modules(module):
+    result = subprocess.run([sys.executable, "-c", PROBE.format(heavy=set(bench_startup.HEAVY_MODULES), module=module)],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
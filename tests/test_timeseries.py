@@ -0,0 +1,62 @@
+"""Probe history rollups and retention (timeseries.py)."""
+import pytest
+
+import db
+import migrations
+from timeseries import TimeSeries
+
+
+@pytest.fixture
+def series(tmp_path):
+    path = str(tmp_path / "data.db")
+    migrations.migrate(path, "data")
+    yield TimeSeries(path)
+    db.close(path)
+    migrations.forget(path)
+
+
+def add_checks(path, checks):
+    with db.transaction(path) as conn:
+        conn.executemany("INSERT INTO checks (scan_id, result, response_time, check_time) VALUES (1, ?, ?, ?)",
+                         checks)
+
+
+def test_rollup_merges_into_existing_buckets(series):
+    add_checks(series.db_path, [("Up", 100.0, "2026-01-01 10:00:05"), ("Down", None, "2026-01-01 10:00:40")])
+    assert series.rollup() == 2
+    add_checks(series.db_path, [("Up", 50.0, "2026-01-01 10:00:50"), ("Up", 300.0, "2026-01-01 10:59:00")])
+    assert series.rollup() == 2
+    # Nothing new: the watermark keeps rows from being counted twice.
+    assert series.rollup() == 0
+
+    assert series.buckets(1, "1m") == [
+        {"bucket": "2026-01-01 10:00:00", "up": 2, "down": 1, "latency_avg": 75.0,
+         "latency_min": 50.0, "latency_max": 100.0},
+        {"bucket": "2026-01-01 10:59:00", "up": 1, "down": 0, "latency_avg": 300.0,
+         "latency_min": 300.0, "latency_max": 300.0},
+    ]
+    assert series.buckets(1, "1h") == [
+        {"bucket": "2026-01-01 10:00:00", "up": 3, "down": 1, "latency_avg": 150.0,
+         "latency_min": 50.0, "latency_max": 300.0},
+    ]
+
+
+def test_bucket_without_latency_takes_later_samples(series):
+    add_checks(series.db_path, [("Down", None, "2026-01-01 10:00:00")])
+    series.rollup()
+    add_checks(series.db_path, [("Up", 20.0, "2026-01-01 10:00:30")])
+    series.rollup()
+
+    (bucket,) = series.buckets(1, "1m")
+    assert (bucket["latency_min"], bucket["latency_max"], bucket["latency_avg"]) == (20.0, 20.0, 20.0)
+
+
+def test_prune_keeps_raw_checks_that_are_not_rolled_up(series):
+    add_checks(series.db_path, [("Up", 1.0, "2000-01-01 00:00:00")])
+    series.rollup()
+    add_checks(series.db_path, [("Up", 1.0, "2000-01-02 00:00:00")])
+
+    series.prune()
+    assert db.query(series.db_path, "SELECT check_time FROM checks") == [("2000-01-02 00:00:00",)]
+    # 1m and 1h buckets are past retention; daily rollups are kept forever.
+    assert db.query(series.db_path, "SELECT resolution FROM check_rollups") == [("1d",)]